@@ -2,56 +2,227 @@
 # File: app/app_state.py
 # =============================
 from __future__ import annotations
-from typing import List, Tuple
-from datetime import datetime, time, timedelta
+import functools
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 
 from .models import Task
 from . import storage
+from . import recurring
+from . import journal
+from . import dedup
+from . import oplog
+from . import encryption
+from . import settings as settings_mod
+from . import metrics
+from . import clock
+from .events import EventBus, TaskAdded, TaskRemoved, LedgerAppended, HistoryAppended, SettingsChanged
+
+
+def op_key(task: Task, event: str) -> str:
+    """Deterministic key of a task's ledger/history rows (see app.dedup)."""
+    key = f"{task.id}:{event}:{task.due_at or ''}"
+    return f"{key}#{task.revision}" if task.revision else key
+
+
+def row_key(row: dict) -> str:
+    """Identity of an existing history row (its key, else task/description + ts)."""
+    return row.get("key") or f"{row.get('task_id') or row.get('description', '')}@{row.get('ts', '')}"
+
+
+def _identifies_row(row: dict) -> bool:
+    return bool(row.get("key") or row.get("ts"))
+
+
+class _Operation:
+    """Writes and events collected while one AppState operation runs."""
+    __slots__ = ("id", "kind", "user", "ledger", "history", "tasks", "events", "before",
+                 "undoes", "undone")
+
+    def __init__(self, kind: str, user: bool, tasks: List[Task]) -> None:
+        self.id = oplog.new_op_id()
+        self.kind = kind
+        self.user = user  # a user action: the target of Ctrl+Z
+        self.ledger: List[dict] = []
+        self.history: List[dict] = []
+        self.tasks = False
+        self.events: List[Any] = []
+        self.before = {t.id: t.to_dict() for t in tasks}  # for the op log's task changes
+        self.undoes: Optional[str] = None
+        self.undone: List[int] = []
+
+    def log_entry(self, ledger: List[dict], history: List[dict], tasks: List[Task]) -> Optional[dict]:
+        """The app.oplog record of this operation (None if it changed nothing)."""
+        removed: Dict[str, dict] = {}
+        added: Dict[str, dict] = {}
+        if self.tasks:
+            after = {t.id: t for t in tasks}
+            removed = {i: d for i, d in self.before.items() if i not in after}
+            added = {i: t.to_dict() for i, t in after.items() if i not in self.before}
+        items = oplog.build_items(ledger, history, removed, added)
+        if not items:
+            return None
+        return {"op": self.id, "kind": self.kind, "ts": storage.now_iso(), "user": self.user,
+                "undoes": self.undoes, "undone": self.undone, "items": items}
+
+
+def _operation(kind: str, user: bool = True):
+    """Run the method as one journaled operation (see AppState._operation_scope)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(self: "AppState", *args, **kwargs):
+            with self._operation_scope(kind, user):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return deco
 
 
 class AppState:
-    def __init__(self) -> None:
-        self.settings = storage.load_settings()
-        self.tasks: List[Task] = storage.load_tasks()
-        self.balance: float = storage.compute_balance()
-        self._retro_process_overdue()
-        storage.purge_history_if_monday()
+    @metrics.timed("state.init")
+    def __init__(self, ctx: Optional[storage.StorageContext] = None) -> None:
+        """
+        State of one data directory: `ctx` (default: the active storage
+        context). Every method runs its storage calls against it, so
+        several AppStates can live in one process (app.profiles). An
+        encrypted directory must be unlocked first, or $TODO_GAMBLE_PASSPHRASE
+        set (app.encryption.LockedError otherwise).
+        """
+        # Subscribers added after construction only see later changes; the
+        # startup forfeit below is picked up by the initial render.
+        self.ctx = ctx or storage.current()
+        self.events = EventBus()
+        self._op_lock = threading.RLock()
+        self._local = threading.local()
+        self._redo: List[str] = []  # undo op ids, newest last (this session)
+        with storage.use(self.ctx):
+            encryption.ensure_unlocked(self.ctx)
+            self.recovered = journal.recover()  # finish anything a crash interrupted
+            self.settings: settings_mod.Settings = settings_mod.store(self.ctx).get()
+            self._window_times = self.settings.creation_window.times()
+            self._today_window: Optional[Tuple[date, Tuple[datetime, datetime]]] = None
+            self.tasks: List[Task] = storage.load_tasks()
+            self.templates = recurring.TemplateStore.load()
+            self.balance: float = storage.compute_balance()
+            self._retro_process_overdue()
+            storage.purge_history_if_monday()
+
+    # ---------- Writes (each publishes its change) ----------
+    @contextmanager
+    def _operation_scope(self, kind: str, user: bool = True) -> Iterator[_Operation]:
+        """
+        Collect the ledger/history/tasks writes of one logical operation and
+        commit them as a single journal record (app.journal), together with
+        its op log record (app.oplog); events are published once the record
+        is applied. Operations are serialized; a nested scope joins the
+        outer one. If the body raises, nothing is written.
+        """
+        with self._op_lock, storage.use(self.ctx):
+            op: Optional[_Operation] = getattr(self._local, "op", None)
+            if op is not None:
+                yield op
+                return
+            op = self._local.op = _Operation(kind, user, self.tasks)
+            try:
+                yield op
+            finally:
+                self._local.op = None
+            ledger, history = journal.commit(
+                op.kind, op.ledger, op.history, self.tasks if op.tasks else None,
+                log=lambda lg, hs: op.log_entry(lg, hs, self.tasks))
+            if user and kind not in ("undo", "redo") and (ledger or history or op.tasks):
+                self._redo.clear()  # a new action ends the redo chain
+        for e in ledger:
+            self.balance = e["balance"]
+            self.events.publish(LedgerAppended(e, e["balance"]))
+        for r in history:
+            self.events.publish(HistoryAppended(r))
+        for ev in op.events:
+            self.events.publish(ev)
+
+    def _append_ledger(self, entries: List[dict]) -> None:
+        with self._operation_scope("ledger") as op:
+            op.ledger.extend(entries)
+
+    def _append_history(self, rows: List[dict]) -> None:
+        with self._operation_scope("history") as op:
+            op.history.extend(rows)
+
+    def _save_tasks(self) -> None:
+        with self._operation_scope("tasks") as op:
+            op.tasks = True
+
+    def _publish(self, event: Any) -> None:
+        with self._operation_scope("event") as op:
+            op.events.append(event)
+
+    def _already_written(self, key: Optional[str]) -> bool:
+        return bool(key) and bool(self.ctx.run(dedup.index().seen, [key]))
+
+    def close(self) -> None:
+        """Flush deferred writes to disk (call on shutdown)."""
+        self.ctx.run(journal.checkpoint)
 
     # ---------- Settings ----------
+    @metrics.timed("state.update_settings")
+    def update_settings(self, changes: Dict[str, Any]) -> settings_mod.Settings:
+        """
+        Validate and save dotted-name changes ({"creation_window.start": "09:00"});
+        raises settings.SettingsError and saves nothing if any value is invalid.
+        """
+        with self._op_lock:
+            new = settings_mod.store(self.ctx).update(changes)
+            self._settings_loaded(new)
+            return new
+
+    def reload_settings(self) -> frozenset:
+        """
+        Pick up settings.json edits made outside this AppState (by hand, the
+        CLI, another process). A stat() when nothing changed, so it is called
+        on every tick. Returns the changed sections.
+        """
+        with self._op_lock:
+            return self._settings_loaded(settings_mod.store(self.ctx).get())
+
+    def _settings_loaded(self, new: settings_mod.Settings) -> frozenset:
+        sections = self.settings.changed(new)
+        if not sections:
+            return sections
+        self.settings = new
+        if "creation_window" in sections:
+            self._window_times = new.creation_window.times()
+            self._today_window = None
+        self.events.publish(SettingsChanged(sections, new))
+        return sections
+
     def set_window_times(self, start_hhmm: str, end_hhmm: str) -> None:
-        self.settings["creation_window"] = {"start": start_hhmm, "end": end_hhmm}
-        storage.save_settings(self.settings)
+        """Raises settings.SettingsError for a time that isn't HH:MM."""
+        self.update_settings({"creation_window.start": start_hhmm, "creation_window.end": end_hhmm})
 
     # ---------- Window helpers ----------
-    def _parse_hhmm(self, s: str) -> time:
-        hh, mm = map(int, s.split(":"))
-        return time(hour=hh, minute=mm)
-
     def window_today(self) -> Tuple[datetime, datetime]:
-        now = datetime.now()
-        start_t = self._parse_hhmm(self.settings["creation_window"]["start"])
-        end_t = self._parse_hhmm(self.settings["creation_window"]["end"])
-        start_dt = now.replace(hour=start_t.hour, minute=start_t.minute, second=0, microsecond=0)
-        end_dt = now.replace(hour=end_t.hour, minute=end_t.minute, second=0, microsecond=0)
-        # If end before start, assume crosses midnight — push end to next day
-        if end_dt <= start_dt:
-            end_dt = end_dt + timedelta(days=1)
-        return start_dt, end_dt
+        # Asked for several times per tick; recomputed on a new day or a settings change
+        today = clock.today()
+        cached = self._today_window
+        if cached is None or cached[0] != today:
+            cached = self._today_window = (today, self.window_for(clock.now()))
+        return cached[1]
 
     def in_creation_window(self, at: datetime | None = None) -> bool:
-        at = at or datetime.now()
+        at = at or clock.now()
         start_dt, end_dt = self.window_today()
         # If at < start but yesterday's window crosses midnight, adjust
         if at < start_dt and (end_dt - start_dt) > timedelta(hours=12):
             # Recompute using yesterday's start
             y = at - timedelta(days=1)
             start_dt = y.replace(hour=start_dt.hour, minute=start_dt.minute, second=0, microsecond=0)
-            end_dt = start_dt + (end_dt - (datetime.now().replace(hour=start_dt.hour, minute=start_dt.minute, second=0, microsecond=0)))
+            end_dt = start_dt + (end_dt - (clock.now().replace(hour=start_dt.hour, minute=start_dt.minute, second=0, microsecond=0)))
         return start_dt <= at <= end_dt
     def window_for(self, base_date: datetime) -> Tuple[datetime, datetime]:
         """Creation window for a specific calendar day (local time)."""
-        start_t = self._parse_hhmm(self.settings["creation_window"]["start"])
-        end_t = self._parse_hhmm(self.settings["creation_window"]["end"])
+        start_t, end_t = self._window_times
         start_dt = base_date.replace(hour=start_t.hour, minute=start_t.minute, second=0, microsecond=0)
         end_dt = base_date.replace(hour=end_t.hour, minute=end_t.minute, second=0, microsecond=0)
         if end_dt <= start_dt:
@@ -60,46 +231,135 @@ class AppState:
 
     # ---------- Task lifecycle ----------
     def add_task(self, description: str, buy_in: float, payout: float) -> Task:
-        if not description.strip():
-            raise ValueError("Description is required")
+        return self.add_tasks([{"description": description, "buy_in": buy_in, "payout": payout}])[0]
+
+    @metrics.timed("state.add_tasks")
+    @_operation("add_tasks")
+    def add_tasks(self, specs: Iterable[dict]) -> List[Task]:
+        """
+        Create several tasks at once. Every spec ({description, buy_in, payout})
+        is validated before anything is written; then tasks.json is saved once.
+        """
+        specs = list(specs)
         if not self.in_creation_window():
             raise PermissionError("Task creation is only allowed during the creation window.")
 
-        now = datetime.now()
+        now = clock.now()
         # compute NEXT day's window end
         next_day = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
         _, next_end = self.window_for(next_day)
 
-        t = Task.new(description, buy_in, payout,
-                    due_at=next_end.isoformat(),
-                    created_at=now.isoformat())
-        self.tasks.append(t)
-        storage.save_tasks(self.tasks)
-        return t
+        new_tasks: List[Task] = []
+        for n, spec in enumerate(specs, start=1):
+            where = f" (task {n})" if len(specs) > 1 else ""
+            description = str(spec.get("description") or "")
+            if not description.strip():
+                raise ValueError(f"Description is required{where}")
+            try:
+                buy_in = float(spec["buy_in"])
+                payout = float(spec["payout"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Buy-in and Payout must be numbers{where}")
+            new_tasks.append(Task.new(description, buy_in, payout,
+                                      due_at=next_end.isoformat(),
+                                      created_at=now.isoformat()))
+        if new_tasks:
+            self.tasks.extend(new_tasks)
+            self._save_tasks()
+            for t in new_tasks:
+                self._publish(TaskAdded(t))
+        return new_tasks
 
 
+    @metrics.timed("state.materialize_recurring")
+    def materialize_recurring(self, at: datetime | None = None) -> List[Task]:
+        """
+        Create today's instances of every due recurring template (one
+        tasks.json save, one templates.json save). Does nothing outside the
+        creation window; idempotent per (template, date).
+        """
+        now = at or clock.now()
+        if not self.in_creation_window(now):
+            return []
+        today = now.date()
+        due = self.templates.due(today)
+        if not due:
+            return []
+        try:
+            next_day = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            _, next_end = self.window_for(next_day)
+            with self._operation_scope("materialize_recurring", user=False):
+                existing = {t.source for t in self.tasks if t.source}
+                new_tasks: List[Task] = []
+                for tpl in due:
+                    # A template that was due on a missed day only catches up to today
+                    on = recurring.Rule.parse(tpl.rule).next_on_or_after(today, date.fromisoformat(tpl.start))
+                    if on != today or tpl.key(today) in existing:
+                        continue
+                    t = Task.new(tpl.description, tpl.buy_in, tpl.payout,
+                                 due_at=next_end.isoformat(),
+                                 created_at=now.isoformat(),
+                                 source=tpl.key(today))
+                    new_tasks.append(t)
+                    self._publish(TaskAdded(t))
+                if new_tasks:
+                    self.tasks.extend(new_tasks)
+                    self._save_tasks()
+            # tasks.json is committed first: if templates.json is not saved, the source keys stop a repeat
+            for tpl in due:
+                tpl.advance(today)
+            self.templates.save()
+        finally:
+            self.templates.reschedule(due)
+        return new_tasks
+
     def complete_task(self, task_id: str) -> None:
-        for i, t in enumerate(self.tasks):
-            if t.id == task_id:
-                t.status = "completed"
-                self.balance = storage.append_ledger_entry({
-                    "type": "payout",
-                    "task_id": t.id,
-                    "description": t.description,
-                    "amount": float(t.payout),
-                })
-                storage.append_history({
-                    "event": "completed",
-                    "task_id": t.id,
-                    "description": t.description,
-                    "buy_in": t.buy_in,
-                    "payout": t.payout,
-                })
-                self.tasks.pop(i)
-                storage.save_tasks(self.tasks)
-                return
-        raise KeyError(f"Task not found: {task_id}")
+        self.complete_tasks([task_id])
 
+    @metrics.timed("state.complete_tasks")
+    @_operation("complete_tasks")
+    def complete_tasks(self, task_ids: Iterable[str]) -> List[Task]:
+        """
+        Complete several tasks with one ledger write, one history write and
+        one tasks.json save. Raises KeyError (and writes nothing) if any id
+        is unknown.
+        """
+        by_id = {t.id: t for t in self.tasks}
+        ids = list(dict.fromkeys(task_ids))
+        missing = [i for i in ids if i not in by_id]
+        if missing:
+            raise KeyError(f"Task not found: {', '.join(missing)}")
+        done = [by_id[i] for i in ids]
+        if not done:
+            return []
+        ledger, history = [], []
+        for t in done:
+            t.status = "completed"
+            ledger.append({
+                "type": "payout",
+                "key": op_key(t, "payout"),
+                "task_id": t.id,
+                "description": t.description,
+                "amount": float(t.payout),
+            })
+            history.append({
+                "event": "completed",
+                "key": op_key(t, "payout"),
+                "task_id": t.id,
+                "description": t.description,
+                "buy_in": t.buy_in,
+                "payout": t.payout,
+            })
+        self._append_ledger(ledger)
+        self._append_history(history)
+        done_ids = set(ids)
+        self.tasks = [t for t in self.tasks if t.id not in done_ids]
+        self._save_tasks()
+        for t in done:
+            self._publish(TaskRemoved(t.id, "completed"))
+        return done
+
+    @metrics.timed("state.delete_task")
     def delete_task(self, task_id: str) -> dict:
         """
         Delete a pending task.
@@ -107,17 +367,35 @@ class AppState:
         - Penalize (-0.5 * buy_in) if deleted during/after the next day's creation window.
         Returns: {'penalized': bool, 'penalty': float}
         """
-        now = datetime.now()
-        for i, t in enumerate(self.tasks):
-            if t.id != task_id or t.status != "pending":
-                continue
+        return self.delete_tasks([task_id])[0]
+
+    @metrics.timed("state.delete_tasks")
+    @_operation("delete_tasks")
+    def delete_tasks(self, task_ids: Iterable[str]) -> List[dict]:
+        """
+        Delete several pending tasks (same penalty rule as delete_task) with
+        one ledger write, one history write and one tasks.json save. Raises
+        KeyError (and writes nothing) if any id is unknown or not pending.
+        Returns one {'penalized', 'penalty'} dict per id, in order.
+        """
+        pending = {t.id: t for t in self.tasks if t.status == "pending"}
+        ids = list(dict.fromkeys(task_ids))
+        missing = [i for i in ids if i not in pending]
+        if missing:
+            raise KeyError(f"Task not found or not pending: {', '.join(missing)}")
+        if not ids:
+            return []
 
+        now = clock.now()
+        ledger, history, results = [], [], []
+        for task_id in ids:
+            t = pending[task_id]
             # Infer the 'creation day' from due_at (the window end of creation day)
             # due_at exists for pending tasks created via add_task
             if not t.due_at:
                 # fallback: if missing, treat as free before today’s window start, penalize otherwise
                 start_today, _ = self.window_today()
-                penalize = start_next <= now <= end_next
+                penalize = start_today <= now
             else:
                 try:
                     due = datetime.fromisoformat(t.due_at)
@@ -131,134 +409,132 @@ class AppState:
 
             if penalize:
                 penalty = round(-0.5 * float(t.buy_in), 2)
-                # ledger
-                self.balance = storage.append_ledger_entry({
+                ledger.append({
                     "type": "delete_penalty",
+                    "key": op_key(t, "delete"),
                     "task_id": t.id,
                     "description": t.description,
                     "amount": penalty,
                 })
-                # history
-                storage.append_history({
+                history.append({
                     "event": "deleted_penalty",
+                    "key": op_key(t, "delete"),
                     "task_id": t.id,
                     "description": t.description,
                     "buy_in": t.buy_in,
                     "payout": penalty,  # store penalty as negative payout for table display
                 })
-                result = {"penalized": True, "penalty": penalty}
+                results.append({"penalized": True, "penalty": penalty})
             else:
-                storage.append_history({
+                history.append({
                     "event": "deleted_free",
+                    "key": op_key(t, "delete"),
                     "task_id": t.id,
                     "description": t.description,
                     "buy_in": t.buy_in,
                     "payout": 0.0,
                 })
-                result = {"penalized": False, "penalty": 0.0}
-
-            # remove from active
+                results.append({"penalized": False, "penalty": 0.0})
             # mark as deleted to prevent future forfeits
             t.status = "deleted"
-            self.tasks[i] = t
-            # then actually remove from active list
-            self.tasks.pop(i)
-            storage.save_tasks(self.tasks)
-            return result
 
-        raise KeyError(f"Task not found or not pending: {task_id}")
+        if ledger:
+            self._append_ledger(ledger)
+        self._append_history(history)
+        gone = set(ids)
+        self.tasks = [t for t in self.tasks if t.id not in gone]
+        self._save_tasks()
+        for task_id in ids:
+            self._publish(TaskRemoved(task_id, "deleted"))
+        return results
 
+    @metrics.timed("state.forfeit_overdue")
+    @_operation("forfeit_overdue", user=False)
     def forfeit_overdue(self) -> int:
         """Forfeit tasks whose due_at <= now. Returns count forfeited."""
-        now = datetime.now().isoformat()
+        now = clock.now().isoformat()
         keep: List[Task] = []
-        forfeited = 0
+        gone: List[Task] = []
         for t in self.tasks:
             if t.status == "pending" and t.due_at and t.due_at <= now:
-                forfeited += 1
-                self.balance = storage.append_ledger_entry({
-                    "type": "forfeit",
-                    "task_id": t.id,
-                    "description": t.description,
-                    "amount": -float(t.buy_in),
-                })
-                storage.append_history({
-                    "event": "forfeited",
-                    "task_id": t.id,
-                    "description": t.description,
-                    "buy_in": t.buy_in,
-                    "payout": t.payout,
-                })
+                gone.append(t)
             else:
                 keep.append(t)
-        if forfeited:
+        if gone:
+            self._append_ledger([{
+                "type": "forfeit",
+                "key": op_key(t, "forfeit"),
+                "task_id": t.id,
+                "description": t.description,
+                "amount": -float(t.buy_in),
+            } for t in gone])
+            self._append_history([{
+                "event": "forfeited",
+                "key": op_key(t, "forfeit"),
+                "task_id": t.id,
+                "description": t.description,
+                "buy_in": t.buy_in,
+                "payout": t.payout,
+            } for t in gone])
             self.tasks = keep
-            storage.save_tasks(self.tasks)
-        return forfeited
+            self._save_tasks()
+            for t in gone:
+                self._publish(TaskRemoved(t.id, "forfeited"))
+        return len(gone)
 
     def _retro_process_overdue(self) -> None:
         # Called on startup to catch any tasks that missed their window while app was closed
         self.forfeit_overdue()
     
-    def record_purchase(self, description: str, amount: float) -> None:
-        """Subtracts from balance and logs to history as a 'purchase' event."""
-        if not description.strip():
-            raise ValueError("Description is required")
-        try:
-            amt = float(amount)
-        except Exception:
-            raise ValueError("Amount must be a number")
-        if amt <= 0:
-            raise ValueError("Purchase amount must be positive")
-
-        # Ledger: negative amount
-        self.balance = storage.append_ledger_entry({
-            "type": "purchase",
-            "description": description.strip(),
-            "amount": -amt,
-        })
-        # History: keep schema compatible with table (buy_in/payout columns)
-        storage.append_history({
-            "event": "purchase",
-            "description": description.strip(),
-            "buy_in": 0.0,
-            "payout": -amt,
-        })
-    
-        # ---------- Reverts / refunds ----------
-    def record_purchase(self, description: str, amount: float) -> None:
-        """(already added earlier)"""
+    # ---------- Purchases / reverts / refunds ----------
+    @metrics.timed("state.record_purchase")
+    @_operation("record_purchase")
+    def record_purchase(self, description: str, amount: float, key: Optional[str] = None) -> None:
+        """Subtract `amount` from the balance; `key` makes a retried request a no-op (default: unique)."""
         amt = float(amount)
         if amt <= 0:
             raise ValueError("Purchase amount must be positive.")
-        self.balance = storage.append_ledger_entry({
+        key = f"purchase:{key or uuid.uuid4().hex}"
+        self._append_ledger([{
             "type": "purchase",
+            "key": key,
             "description": description.strip(),
             "amount": -amt,
-        })
-        storage.append_history({
+        }])
+        self._append_history([{
             "event": "purchase",
+            "key": key,
             "description": description.strip(),
             "buy_in": 0.0,
             "payout": -amt,
-        })
+        }])
 
-    def revert_purchase(self, description: str, amount: float) -> None:
-        """Refund a prior purchase by adding a positive ledger entry and history row."""
+    @metrics.timed("state.revert_purchase")
+    @_operation("revert_purchase")
+    def revert_purchase(self, description: str, amount: float, source: Optional[dict] = None) -> None:
+        """
+        Refund a prior purchase by adding a positive ledger entry and history row.
+        `source` is the purchase's history row; refunding it twice is a no-op.
+        """
         amt = float(amount)
         if amt <= 0:
             raise ValueError("Amount must be positive.")
-        self.balance = storage.append_ledger_entry({
+        key = f"refund:{row_key(source)}" if source else None
+        if self._already_written(key):
+            return
+        self._append_ledger([{
             "type": "refund",
+            "key": key,
             "description": description.strip(),
             "amount": +amt,
-        })
-        storage.append_history({
+        }])
+        self._append_history([{
             "event": "refund",
+            "key": key,
             "description": description.strip(),
             "buy_in": 0.0,
             "payout": +amt,
-        })
+        }])
 
     def _restore_task(self, snapshot: dict) -> None:
         """Restore a task to 'pending' with a fresh due_at (end of today's window)."""
@@ -281,47 +557,205 @@ class AppState:
                 payout=float(snapshot["payout"]),
                 status="pending",
                 due_at=due,
+                revision=int(snapshot.get("revision", 0)) + 1,
             )
         self.tasks.append(t)
-        storage.save_tasks(self.tasks)
+        self._save_tasks()
+        self._publish(TaskAdded(t))
 
+    @metrics.timed("state.revert_completion")
+    @_operation("revert_completion")
     def revert_completion(self, task_snapshot: dict, restore: bool = True) -> None:
         """Reverse a completed task's payout; optionally restore the task."""
         payout = float(task_snapshot["payout"])
-        self.balance = storage.append_ledger_entry({
+        key = f"revert_completion:{row_key(task_snapshot)}" if _identifies_row(task_snapshot) else None
+        if self._already_written(key):
+            return  # reverted before: don't restore the task a second time
+        self._append_ledger([{
             "type": "revert_payout",
+            "key": key,
             "task_id": task_snapshot.get("id") or task_snapshot.get("task_id"),
             "description": task_snapshot["description"],
             "amount": -payout,
-        })
-        storage.append_history({
+        }])
+        self._append_history([{
             "event": "reverted_completion",
+            "key": key,
             "task_id": task_snapshot.get("id") or task_snapshot.get("task_id"),
             "description": task_snapshot["description"],
             "buy_in": float(task_snapshot["buy_in"]),
             "payout": float(task_snapshot["payout"]),
-        })
+        }])
         if restore:
             self._restore_task(task_snapshot)
 
+    @metrics.timed("state.revert_forfeit")
+    @_operation("revert_forfeit")
     def revert_forfeit(self, task_snapshot: dict, restore: bool = True) -> None:
         """Reverse a forfeit (give the buy-in back); optionally restore the task."""
         buy_in = float(task_snapshot["buy_in"])
-        self.balance = storage.append_ledger_entry({
+        key = f"revert_forfeit:{row_key(task_snapshot)}" if _identifies_row(task_snapshot) else None
+        if self._already_written(key):
+            return  # reverted before: don't restore the task a second time
+        self._append_ledger([{
             "type": "revert_forfeit",
+            "key": key,
             "task_id": task_snapshot.get("id") or task_snapshot.get("task_id"),
             "description": task_snapshot["description"],
             "amount": +buy_in,
-        })
-        storage.append_history({
+        }])
+        self._append_history([{
             "event": "reverted_forfeit",
+            "key": key,
             "task_id": task_snapshot.get("id") or task_snapshot.get("task_id"),
             "description": task_snapshot["description"],
             "buy_in": float(task_snapshot["buy_in"]),
             "payout": float(task_snapshot["payout"]),
-        })
+        }])
         if restore:
             self._restore_task(task_snapshot)
 
     
-   
\ No newline at end of file
+   
+    # ---------- Undo / redo (app.oplog) ----------
+    @metrics.timed("state.undo")
+    def undo(self, op_id: Optional[str] = None) -> Optional[str]:
+        """
+        Undo an operation (default: the newest user action not yet undone).
+        Returns the id of the undo operation, or None if there is nothing to undo.
+        """
+        with self._op_lock, storage.use(self.ctx):
+            op_id = op_id or oplog.index().last_undoable()
+            if op_id is None:
+                return None
+            undo_id = self._invert(op_id, None, "undo")
+            self._redo.append(undo_id)
+            return undo_id
+
+    @metrics.timed("state.redo")
+    def redo(self) -> Optional[str]:
+        """Redo the most recent undo of this session. Returns the redo op id or None."""
+        with self._op_lock, storage.use(self.ctx):
+            while self._redo:
+                undo_id = self._redo.pop()
+                if oplog.index().pending_items(undo_id):
+                    return self._invert(undo_id, None, "redo")
+            return None
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    @metrics.timed("state.revert_row")
+    def revert_row(self, row: dict) -> bool:
+        """
+        Undo the change behind one history row (looked up by its key in the
+        op log, so rows scrolled out of the table work too). Returns False if
+        the row predates the op log; raises ValueError if it was already
+        reverted or its task has moved on.
+        """
+        with self._op_lock, storage.use(self.ctx):
+            hit = oplog.index().find_row(row["key"]) if row.get("key") else None
+            if hit is None:
+                return False
+            op_id, i = hit
+            if i not in oplog.index().pending_items(op_id):
+                raise ValueError("This entry has already been reverted.")
+            self._invert(op_id, [i], "undo")
+        return True
+
+    def _invert(self, op_id: str, which: Optional[List[int]], kind: str) -> str:
+        """Write the inverse of the given (default: all remaining) items of op_id."""
+        rec = oplog.index().read(op_id)
+        if rec is None:
+            raise KeyError(f"Operation not found: {op_id}")
+        pending = set(oplog.index().pending_items(op_id))
+        chosen = [(i, rec["items"][i]) for i in (which if which is not None else range(len(rec["items"])))
+                  if i in pending]
+        if not chosen:
+            raise ValueError("Nothing left to undo in this operation.")
+        by_id = {t.id: t for t in self.tasks}
+        for _, it in chosen:
+            task = it.get("task")
+            if it.get("change") == "added" and task and task["id"] not in by_id:
+                raise ValueError(f"Can't undo: '{task['description']}' is no longer pending.")
+
+        _, end_today = self.window_today()
+        now = clock.now().isoformat()
+        with self._operation_scope(kind) as op:
+            op.undoes, op.undone = op_id, [i for i, _ in chosen]
+            ledger, history = [], []
+            for i, it in chosen:
+                key = f"undo:{op_id}:{i}"
+                if it.get("ledger"):
+                    ledger.append(oplog.inverse_ledger_row(it["ledger"], key))
+                if it.get("history"):
+                    history.append(oplog.inverse_history_row(it["history"], key))
+                task = it.get("task")
+                if not task:
+                    continue
+                if it["change"] == "removed" and task["id"] not in by_id:
+                    # Keep the original due_at unless it has already passed
+                    due = task.get("due_at")
+                    t = Task.from_dict({**task, "status": "pending",
+                                        "due_at": due if due and due > now else end_today.isoformat(),
+                                        "revision": int(task.get("revision", 0)) + 1})
+                    self.tasks.append(t)
+                    by_id[t.id] = t
+                    self._save_tasks()
+                    self._publish(TaskAdded(t))
+                elif it["change"] == "added" and task["id"] in by_id:
+                    t = by_id.pop(task["id"])
+                    self.tasks.remove(t)
+                    self._save_tasks()
+                    self._publish(TaskRemoved(t.id, "undone"))
+            if ledger:
+                self._append_ledger(ledger)
+            if history:
+                self._append_history(history)
+            return op.id
+
+    # ---------- Sync (app.sync) ----------
+    @metrics.timed("state.apply_remote")
+    def apply_remote(self, device: str, entries: List[dict], tombstones: Dict[str, int]) -> None:
+        """
+        Apply sync entries from another device as one operation (not a user
+        action, not exported again). Rows keep their key, so a change this
+        device already made is dropped (app.dedup). Tasks carry their
+        revision: a removal applies unless the task was restored here since,
+        an addition unless the task is present or was removed at that
+        revision or later. `tombstones` (task id -> revision) is updated.
+        """
+        with self._operation_scope("sync_import", user=False):
+            by_id = {t.id: t for t in self.tasks}
+            ledger, history = [], []
+            for e in entries:
+                origin = f"{device}:{e['s']}"
+                for it in e.get("items", []):
+                    if it.get("ledger"):
+                        ledger.append({**it["ledger"], "origin": origin})
+                    if it.get("history"):
+                        history.append({**it["history"], "origin": origin})
+                    task = it.get("task")
+                    if not task:
+                        continue
+                    tid, rev = task["id"], int(task.get("revision", 0))
+                    if it.get("change") == "removed":
+                        tombstones[tid] = max(rev, tombstones.get(tid, rev))
+                        t = by_id.get(tid)
+                        if t is not None and t.revision <= rev:
+                            del by_id[tid]
+                            self.tasks.remove(t)
+                            self._save_tasks()
+                            self._publish(TaskRemoved(tid, "synced"))
+                    elif it.get("change") == "added":
+                        if tid in by_id or tombstones.get(tid, -1) >= rev:
+                            continue
+                        t = Task.from_dict(task)
+                        self.tasks.append(t)
+                        by_id[tid] = t
+                        self._save_tasks()
+                        self._publish(TaskAdded(t))
+            if ledger:
+                self._append_ledger(ledger)
+            if history:
+                self._append_history(history)
@@ -0,0 +1,404 @@
+# =============================
+# File: app/chart.py
+# =============================
+"""
+Chart tab: running balance (top) and daily net (bottom) on a plain Canvas.
+
+Nothing is replayed on redraw. BalanceSeries keeps a min/max/last pyramid
+of the balance (BASE_BUCKET-second buckets, each level FANOUT times wider)
+plus per-day net totals. It is filled once from the columnar ledger
+sidecar (in an encrypted directory, from the ledger rows) when the tab
+is first shown, then extended with each
+LedgerAppended event. A redraw picks the level whose buckets are
+just narrower than a pixel and folds them into per-pixel min/max columns,
+so the work is bounded by the canvas width, not the ledger size.
+
+Drag to pan, mouse wheel to zoom around the cursor.
+"""
+from __future__ import annotations
+import bisect
+import threading
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from . import storage
+from . import metrics
+from . import clock
+
+BASE_BUCKET = 60  # seconds
+FANOUT = 4
+LEVELS = 14  # coarsest bucket ~ 60 * 4**13 s (about 128 years)
+MARGIN_L, MARGIN_R, MARGIN_T, MARGIN_B = 72, 12, 10, 22
+SPLIT = 0.65  # share of the plot height used by the balance line
+RANGES = (("1W", 7), ("1M", 30), ("3M", 91), ("1Y", 365), ("All", None))
+
+
+def _local_offset() -> int:
+    return clock.utc_offset()
+
+
+class _Level:
+    __slots__ = ("width", "starts", "mins", "maxs", "lasts")
+
+    def __init__(self, width: int) -> None:
+        self.width = width
+        self.starts: List[int] = []
+        self.mins: List[float] = []
+        self.maxs: List[float] = []
+        self.lasts: List[float] = []
+
+    def add(self, ts: int, value: float) -> None:
+        start = ts - ts % self.width
+        starts = self.starts
+        if starts and starts[-1] == start:
+            i = len(starts) - 1
+        elif not starts or starts[-1] < start:
+            starts.append(start)
+            self.mins.append(value)
+            self.maxs.append(value)
+            self.lasts.append(value)
+            return
+        else:  # out-of-order row: fold into its bucket (its `last` is left alone)
+            i = bisect.bisect_left(starts, start)
+            if i == len(starts) or starts[i] != start:
+                starts.insert(i, start)
+                self.mins.insert(i, value)
+                self.maxs.insert(i, value)
+                self.lasts.insert(i, value)
+                return
+            if value < self.mins[i]:
+                self.mins[i] = value
+            if value > self.maxs[i]:
+                self.maxs[i] = value
+            return
+        if value < self.mins[i]:
+            self.mins[i] = value
+        if value > self.maxs[i]:
+            self.maxs[i] = value
+        self.lasts[i] = value
+
+
+class BalanceSeries:
+    """Downsampled balance pyramid + daily net; append-only, O(LEVELS) per row."""
+
+    def __init__(self) -> None:
+        self.levels = [_Level(BASE_BUCKET * FANOUT ** k) for k in range(LEVELS)]
+        self.daily: Dict[int, float] = {}  # local day ordinal -> net
+        self.days: List[int] = []          # sorted keys of daily
+        self.count = 0
+        self.first_ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        self._offset = _local_offset()
+
+    def add(self, ts: int, balance: float, amount: float, levels: Optional[List[_Level]] = None) -> None:
+        for lvl in self.levels if levels is None else levels:
+            lvl.add(ts, balance)
+        day = (ts + self._offset) // 86400
+        if day not in self.daily:
+            bisect.insort(self.days, day)
+            self.daily[day] = 0.0
+        self.daily[day] += amount
+        self.count += 1
+        if self.first_ts is None or ts < self.first_ts:
+            self.first_ts = ts
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+
+    def columns(self, t0: float, t1: float, width: int) -> List[Optional[Tuple[float, float, float]]]:
+        """Per-pixel (min, max, last) over [t0, t1); None where there is no data."""
+        out: List[Optional[Tuple[float, float, float]]] = [None] * width
+        if width <= 0 or t1 <= t0:
+            return out
+        spp = (t1 - t0) / width
+        lvl = self.levels[0]
+        for cand in self.levels:
+            if cand.width > spp:
+                break
+            lvl = cand
+        starts = lvl.starts
+        i = bisect.bisect_left(starts, t0 - lvl.width + 1)
+        n = len(starts)
+        while i < n and starts[i] < t1:
+            x = int((max(starts[i], t0) - t0) / spp)
+            if x >= width:
+                break
+            lo, hi, last = lvl.mins[i], lvl.maxs[i], lvl.lasts[i]
+            cur = out[x]
+            if cur is not None:
+                lo, hi = min(lo, cur[0]), max(hi, cur[1])
+            out[x] = (lo, hi, last)
+            i += 1
+        return out
+
+    def value_before(self, t: float) -> Optional[float]:
+        """Balance carried into time t (last value of the bucket before it)."""
+        lvl = self.levels[0]
+        i = bisect.bisect_left(lvl.starts, t) - 1
+        return lvl.lasts[i] if i >= 0 else None
+
+    def daily_columns(self, t0: float, t1: float, width: int) -> List[float]:
+        """Daily net folded into pixel columns."""
+        out = [0.0] * max(width, 0)
+        if width <= 0 or t1 <= t0:
+            return out
+        spp = (t1 - t0) / width
+        d0 = int((t0 + self._offset) // 86400)
+        i = bisect.bisect_left(self.days, d0)
+        while i < len(self.days):
+            day = self.days[i]
+            t = day * 86400 - self._offset
+            if t >= t1:
+                break
+            x = int((max(t, t0) - t0) / spp)
+            if 0 <= x < width:
+                out[x] += self.daily[day]
+            i += 1
+        return out
+
+    @classmethod
+    def from_columns(cls, cols) -> "BalanceSeries":
+        """Build from an open columnar.LedgerColumns (rows in time order)."""
+        series = cls()
+        ts, bal = cols.balance_series()
+        cents = cols.cents
+        base = series.levels[:1]
+        for i in range(len(ts)):
+            series.add(int(ts[i]), float(bal[i]), cents[i] / 100.0, levels=base)
+        # Coarser levels are folded from the one below instead of row by row
+        for lower, upper in zip(series.levels, series.levels[1:]):
+            for j, start in enumerate(lower.starts):
+                ustart = start - start % upper.width
+                if upper.starts and upper.starts[-1] == ustart:
+                    upper.mins[-1] = min(upper.mins[-1], lower.mins[j])
+                    upper.maxs[-1] = max(upper.maxs[-1], lower.maxs[j])
+                    upper.lasts[-1] = lower.lasts[j]
+                else:
+                    upper.starts.append(ustart)
+                    upper.mins.append(lower.mins[j])
+                    upper.maxs.append(lower.maxs[j])
+                    upper.lasts.append(lower.lasts[j])
+        return series
+
+    @classmethod
+    def from_rows(cls, rows: List[dict]) -> "BalanceSeries":
+        """Build from parsed ledger rows (no columnar sidecar)."""
+        series = cls()
+        for row in rows:
+            try:
+                ts = int(datetime.fromisoformat(str(row.get("ts", ""))).timestamp())
+            except ValueError:
+                continue
+            series.add(ts, float(row.get("balance", 0.0)), float(row.get("amount", 0.0)))
+        return series
+
+
+class ChartView(ttk.Frame):
+    def __init__(self, master: tk.Misc) -> None:
+        super().__init__(master)
+        bar = ttk.Frame(self, padding=(12, 8))
+        bar.pack(fill=tk.X)
+        for label, days in RANGES:
+            ttk.Button(bar, text=label, width=5,
+                       command=lambda d=days: self.show_last(d)).pack(side=tk.LEFT, padx=(0, 4))
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(bar, textvariable=self.status_var).pack(side=tk.RIGHT)
+
+        self.canvas = tk.Canvas(self, background="white", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True, padx=12, pady=(0, 12))
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<ButtonPress-1>", self._on_press)
+        self.canvas.bind("<B1-Motion>", self._on_drag)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", self._on_wheel)  # X11 wheel
+        self.canvas.bind("<Button-5>", self._on_wheel)
+
+        self.series: Optional[BalanceSeries] = None
+        self.view: Optional[Tuple[float, float]] = None  # (t0, t1) epoch seconds
+        self._loading = False
+        self._stale = False
+        self._redraw_job = None
+        self._drag: Optional[Tuple[int, Tuple[float, float]]] = None
+
+    # ---------- Data ----------
+    def ensure_loaded(self) -> None:
+        if self.series is None and not self._loading:
+            self._load()
+
+    def reload(self) -> None:
+        """Rebuild after the ledger was rewritten (compaction, purge); no-op if never shown."""
+        if self.series is not None or self._loading:
+            self._load()
+
+    def _load(self) -> None:
+        """Build the series off the Tk thread."""
+        if self._loading:
+            self._stale = True
+            return
+        self._loading = True
+        self._stale = False
+        self.status_var.set("Loading…")
+        threading.Thread(target=self._load_worker, daemon=True).start()
+
+    def _load_worker(self) -> None:
+        from . import columnar
+        series = BalanceSeries()
+        try:
+            with metrics.timer("chart.load"):
+                columnar.sync()
+                cols = columnar.LedgerColumns.open()
+                if cols is not None:
+                    with cols:
+                        series = BalanceSeries.from_columns(cols)
+                elif storage.encrypted():
+                    series = BalanceSeries.from_rows(storage.read_ledger_since(0)[0])
+        except Exception:
+            pass
+        self.after(0, lambda: self._loaded(series))
+
+    def _loaded(self, series: BalanceSeries) -> None:
+        self._loading = False
+        self.series = series
+        if self._stale:  # rows were written while loading; they may be missing
+            self._load()
+            return
+        self.status_var.set(f"{series.count:,} ledger entries")
+        if self.view is None:
+            self.show_last(30)
+        else:
+            self.redraw()
+
+    def on_ledger_entry(self, entry: dict, balance: float) -> None:
+        """Extend the cached series with one appended ledger row (Tk thread)."""
+        if self._loading:
+            self._stale = True
+            return
+        if self.series is None:
+            return
+        dt = None
+        try:
+            dt = datetime.fromisoformat(str(entry.get("ts", "")))
+        except ValueError:
+            pass
+        ts = int(dt.timestamp()) if dt is not None else int(clock.now_aware().timestamp())
+        self.series.add(ts, float(balance), float(entry.get("amount", 0.0)))
+        self.status_var.set(f"{self.series.count:,} ledger entries")
+        if self.view is not None and self.view[0] <= ts and self.winfo_ismapped():
+            if ts >= self.view[1]:  # follow new rows when looking at the latest data
+                span = self.view[1] - self.view[0]
+                self.view = (ts + 60 - span, ts + 60)
+            self.redraw()
+
+    # ---------- View ----------
+    def show_last(self, days: Optional[int]) -> None:
+        s = self.series
+        end = clock.now_aware().timestamp()
+        end = max(end, s.last_ts or 0) + 60 if s is not None else end
+        if days is None:
+            start = (s.first_ts if s is not None and s.first_ts is not None else end - 86400) - 60
+        else:
+            start = end - days * 86400
+        self.view = (start, end)
+        self.redraw()
+
+    def _plot_box(self) -> Tuple[int, int, int, int]:
+        w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        return MARGIN_L, MARGIN_T, max(MARGIN_L + 1, w - MARGIN_R), max(MARGIN_T + 1, h - MARGIN_B)
+
+    def _on_press(self, event) -> None:
+        if self.view is not None:
+            self._drag = (event.x, self.view)
+
+    def _on_drag(self, event) -> None:
+        if self._drag is None:
+            return
+        x0, (t0, t1) = self._drag
+        left, _, right, _ = self._plot_box()
+        shift = (x0 - event.x) * (t1 - t0) / max(1, right - left)
+        self.view = (t0 + shift, t1 + shift)
+        self.redraw()
+
+    def _on_wheel(self, event) -> None:
+        if self.view is None:
+            return
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        factor = 0.8 if up else 1.25
+        t0, t1 = self.view
+        left, _, right, _ = self._plot_box()
+        frac = min(1.0, max(0.0, (event.x - left) / max(1, right - left)))
+        anchor = t0 + frac * (t1 - t0)
+        span = min(max((t1 - t0) * factor, 3600), 200 * 365 * 86400)
+        self.view = (anchor - frac * span, anchor + (1 - frac) * span)
+        self.redraw()
+
+    # ---------- Drawing ----------
+    def redraw(self) -> None:
+        """Coalesce redraw requests into one per idle cycle."""
+        if self._redraw_job is None:
+            self._redraw_job = self.after_idle(self._draw)
+
+    @metrics.timed("chart.draw")
+    def _draw(self) -> None:
+        self._redraw_job = None
+        c = self.canvas
+        c.delete("all")
+        if self.series is None or self.view is None:
+            return
+        left, top, right, bottom = self._plot_box()
+        width = right - left
+        t0, t1 = self.view
+        split = top + int((bottom - top) * SPLIT)
+
+        cols = self.series.columns(t0, t1, width)
+        carry = self.series.value_before(t0)
+        values = [v for col in cols if col is not None for v in col[:2]]
+        if carry is not None:
+            values.append(carry)
+        if values:
+            lo, hi = min(values), max(values)
+            if hi - lo < 1e-9:
+                lo, hi = lo - 1, hi + 1
+            def y_of(v: float) -> float:
+                return split - 6 - (v - lo) / (hi - lo) * (split - 6 - top)
+            pts: List[float] = []
+            if carry is not None:
+                pts += [left, y_of(carry)]
+            for x, col in enumerate(cols):
+                if col is None:
+                    continue
+                mn, mx, last = col
+                pts += [left + x, y_of(mx), left + x, y_of(mn), left + x, y_of(last)]
+            # The balance holds until the next row: extend the line up to now
+            x_now = min(right, left + (clock.now_aware().timestamp() - t0) * width / (t1 - t0))
+            if pts and x_now > pts[-2]:
+                pts += [x_now, pts[-1]]
+            if len(pts) >= 4:
+                c.create_line(*pts, fill="#1f6feb", width=1)
+            c.create_text(left - 6, top, text=f"${hi:,.0f}", anchor=tk.NE, fill="#555")
+            c.create_text(left - 6, split - 6, text=f"${lo:,.0f}", anchor=tk.E, fill="#555")
+
+        # Daily net bars
+        nets = self.series.daily_columns(t0, t1, width)
+        peak = max((abs(v) for v in nets), default=0.0)
+        zero = split + (bottom - split) / 2
+        c.create_line(left, zero, right, zero, fill="#ccc")
+        if peak > 0:
+            day_px = max(1, int(width * 86400 / (t1 - t0)) - 1)
+            scale = (bottom - split) / 2 / peak
+            for x, v in enumerate(nets):
+                if v:
+                    c.create_line(left + x, zero, left + x, zero - v * scale,
+                                  fill="#2da44e" if v > 0 else "#cf222e", width=min(day_px, 24))
+            c.create_text(left - 6, split, text=f"+{peak:,.0f}", anchor=tk.NE, fill="#555")
+            c.create_text(left - 6, bottom, text=f"-{peak:,.0f}", anchor=tk.SE, fill="#555")
+        c.create_line(left, split, right, split, fill="#eee")
+        c.create_rectangle(left, top, right, bottom, outline="#ccc")
+
+        # Time axis
+        for k in range(5):
+            t = t0 + (t1 - t0) * k / 4
+            fmt = "%Y-%m-%d" if t1 - t0 > 3 * 86400 else "%m-%d %H:%M"
+            anchor = tk.NW if k == 0 else tk.NE if k == 4 else tk.N
+            c.create_text(left + width * k / 4, bottom + 4, anchor=anchor, fill="#555",
+                          text=datetime.fromtimestamp(t).strftime(fmt))
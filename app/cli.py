@@ -0,0 +1,475 @@
+# =============================
+# File: app/cli.py
+# =============================
+"""
+Headless command line for scripting against the data store.
+
+    python -m app.cli [--json] [--data-dir DIR] <command> ...
+
+Uses AppState/storage directly; never imports tkinter or pystray. Batch
+commands (`add --stdin|--file`, `complete --stdin`, `delete --stdin`) validate every row first and
+write the ledger, history and tasks files once for the whole batch.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Iterable, List, Optional
+
+from . import storage
+from .app_state import AppState
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+
+
+class CliError(Exception):
+    """A user-facing failure; printed without a traceback."""
+
+
+# -------- Input / output helpers --------
+
+def _emit(args: argparse.Namespace, data: Any, text: str) -> None:
+    if args.json:
+        sys.stdout.write(json.dumps(data) + "\n")
+    else:
+        sys.stdout.write(text + ("\n" if text and not text.endswith("\n") else ""))
+
+
+def _read_specs(args: argparse.Namespace) -> List[dict]:
+    """Task specs from --file PATH or stdin (CSV, JSON array or JSON lines)."""
+    if args.file:
+        path = Path(args.file)
+        try:
+            text = path.read_text(encoding="utf-8-sig")
+        except OSError as e:
+            raise CliError(f"cannot read {path}: {e.strerror or e}")
+        fmt = args.format or {".csv": "csv", ".json": "json", ".jsonl": "json"}.get(path.suffix.lower())
+    else:
+        text, fmt = sys.stdin.read(), args.format
+    try:
+        return storage.parse_task_specs(text, fmt)
+    except ValueError as e:
+        raise CliError(f"{args.file or 'stdin'}: {e}")
+
+
+def _read_stdin_ids() -> List[str]:
+    """Task ids one per line (plain text) or as JSON records with an `id`."""
+    ids = []
+    for line in sys.stdin.read().splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            obj = json.loads(line)
+            line = obj.get("id") or obj.get("task_id") or ""
+        ids.append(line)
+    return ids
+
+
+def _resolve_ids(state: AppState, given: Iterable[str]) -> List[str]:
+    """Accept full ids or unique prefixes (like git short hashes)."""
+    ids = [t.id for t in state.tasks]
+    out = []
+    for g in given:
+        if g in ids:
+            out.append(g)
+            continue
+        matches = [i for i in ids if i.startswith(g)]
+        if len(matches) != 1:
+            raise CliError(f"{'Ambiguous' if matches else 'Unknown'} task id: {g}")
+        out.append(matches[0])
+    return out
+
+
+def _warn_if_app_running() -> None:
+    """The GUI keeps tasks in memory; writing behind its back can be overwritten."""
+    from . import single_instance
+    lock = single_instance.InstanceLock()
+    if lock.acquire():
+        lock.release()
+        return
+    print("warning: Todo Gamble is running; prefer `python -m app.single_instance` "
+          "so the app sees this change.", file=sys.stderr)
+
+
+def _ask_passphrase(prompt: str = "passphrase: ") -> Optional[str]:
+    """Passphrase from the terminal (None when not interactive)."""
+    if not sys.stdin.isatty():
+        return None
+    import getpass
+    return getpass.getpass(prompt)
+
+
+def _task_line(t) -> str:
+    return f"{t.id[:8]}  {t.buy_in:>8.2f}  {t.payout:>8.2f}  {t.due_at or '-':<25}  {t.description}"
+
+
+def _history_line(r: dict) -> str:
+    return (f"{r.get('ts', ''):<32}  {r.get('event', ''):<18}  "
+            f"{float(r.get('buy_in', 0.0)):>8.2f}  {float(r.get('payout', 0.0)):>8.2f}  "
+            f"{r.get('description', '')}")
+
+
+# -------- Commands --------
+
+def cmd_add(args: argparse.Namespace) -> int:
+    if args.stdin or args.file:
+        specs = _read_specs(args)
+    else:
+        if args.description is None or args.buy_in is None or args.payout is None:
+            raise CliError("add needs DESCRIPTION BUY_IN PAYOUT (or --stdin / --file)")
+        specs = [{"description": args.description, "buy_in": args.buy_in, "payout": args.payout}]
+    _warn_if_app_running()
+    state = AppState()
+    tasks = state.add_tasks(specs)
+    _emit(args, [t.to_dict() for t in tasks], "\n".join(f"added {t.id}  {t.description}" for t in tasks))
+    return EXIT_OK
+
+
+def cmd_complete(args: argparse.Namespace) -> int:
+    given = _read_stdin_ids() if args.stdin else args.ids
+    if not given:
+        raise CliError("complete needs at least one task id (or --stdin)")
+    _warn_if_app_running()
+    state = AppState()
+    done = state.complete_tasks(_resolve_ids(state, given))
+    _emit(args, {"completed": [t.id for t in done], "balance": round(state.balance, 2)},
+          "\n".join(f"completed {t.id}  +{t.payout:.2f}  {t.description}" for t in done)
+          + f"\nbalance {state.balance:,.2f}")
+    return EXIT_OK
+
+
+def cmd_delete(args: argparse.Namespace) -> int:
+    given = _read_stdin_ids() if args.stdin else args.ids
+    if not given:
+        raise CliError("delete needs at least one task id (or --stdin)")
+    _warn_if_app_running()
+    state = AppState()
+    ids = list(dict.fromkeys(_resolve_ids(state, given)))
+    results = [{"id": task_id, **res} for task_id, res in zip(ids, state.delete_tasks(ids))]
+    _emit(args, {"deleted": results, "balance": round(state.balance, 2)},
+          "\n".join(f"deleted {r['id']}" + (f"  penalty {r['penalty']:.2f}" if r["penalized"] else "")
+                    for r in results))
+    return EXIT_OK
+
+
+def cmd_undo(args: argparse.Namespace) -> int:
+    _warn_if_app_running()
+    state = AppState()
+    try:
+        undo_id = state.undo(args.op)
+    except (KeyError, ValueError) as e:
+        raise CliError(str(e).strip("'\""))
+    if undo_id is None:
+        raise CliError("nothing to undo")
+    _emit(args, {"undo": undo_id, "balance": round(state.balance, 2)},
+          f"undone (op {undo_id[:8]})\nbalance {state.balance:,.2f}")
+    return EXIT_OK
+
+
+def cmd_sync(args: argparse.Namespace) -> int:
+    from . import sync
+    if args.status or not args.path:
+        st = sync.status()
+        text = [f"device {st['device']}, exported through seq {st['exported_seq']}"
+                + (f", sync key {st['key']}" if st["key"] else "")]
+        text += [f"  from {d}: " + ", ".join(f"{a}-{b}" for a, b in r) for d, r in st["seen"].items()]
+        _emit(args, st, "\n".join(text))
+        return EXIT_OK
+    _warn_if_app_running()
+    new_passphrase = None
+    if args.new_passphrase:
+        new_passphrase = os.environ.get(sync.SYNC_PASSPHRASE_ENV) or _ask_passphrase("new sync passphrase: ")
+        if not new_passphrase:
+            raise CliError(f"no passphrase (set {sync.SYNC_PASSPHRASE_ENV} or run interactively)")
+        if not os.environ.get(sync.SYNC_PASSPHRASE_ENV) and _ask_passphrase("again: ") != new_passphrase:
+            raise CliError("passphrases don't match")
+    state = AppState()
+    try:
+        report = sync.sync(state, args.path, ask=lambda: _ask_passphrase("sync passphrase: "),
+                           new_passphrase=new_passphrase)
+    except (OSError, RuntimeError, ValueError) as e:
+        raise CliError(str(e))
+    text = [f"exported {report['exported']} segment(s), sent {report['uploaded']}, "
+            f"applied {report['applied']} change(s)", f"balance {state.balance:,.2f}"]
+    text += [f"skipped damaged segment: {e}" for e in report["errors"]]
+    _emit(args, {**report, "balance": round(state.balance, 2)}, "\n".join(text))
+    return EXIT_OK
+
+
+def cmd_encrypt(args: argparse.Namespace) -> int:
+    from . import encryption
+    _warn_if_app_running()
+    passphrase = os.environ.get(encryption.PASSPHRASE_ENV) or _ask_passphrase()
+    if not passphrase:
+        raise CliError(f"no passphrase (set {encryption.PASSPHRASE_ENV} or run interactively)")
+    if args.disable:
+        n = encryption.disable(passphrase)
+        _emit(args, {"encrypted": False, "bytes": n}, f"decrypted ({n:,} bytes rewritten)")
+        return EXIT_OK
+    if not encryption.is_encrypted() and not os.environ.get(encryption.PASSPHRASE_ENV):
+        if _ask_passphrase("again: ") != passphrase:
+            raise CliError("passphrases don't match")
+    n = encryption.enable(passphrase)
+    _emit(args, {"encrypted": True, "bytes": n}, f"encrypted ({n:,} bytes rewritten)")
+    return EXIT_OK
+
+
+def cmd_settings(args: argparse.Namespace) -> int:
+    # No AppState: a running app picks the change up from settings.json's stat
+    from . import settings
+    store = settings.store()
+    if args.key is not None:
+        if args.value is None:
+            raise CliError(f"settings set {args.key} needs a value")
+        store.update({args.key: settings.coerce(args.value)})
+    data = store.get().to_dict()
+    text = [f"{name} = {json.dumps(_setting(data, name))}" for name in sorted(settings.KNOWN)]
+    text += [f"warning: {p}" for p in store.problems]
+    _emit(args, {**data, "problems": store.problems}, "\n".join(text))
+    return EXIT_OK
+
+
+def _setting(data: dict, name: str) -> Any:
+    for part in name.split("."):
+        data = data.get(part) if isinstance(data, dict) else None
+    return data
+
+
+def cmd_list(args: argparse.Namespace) -> int:
+    # Read-only: AppState() would run the startup forfeit and Monday purge
+    tasks = storage.load_tasks()
+    _emit(args, [t.to_dict() for t in tasks],
+          "\n".join(_task_line(t) for t in tasks) or "no pending tasks")
+    return EXIT_OK
+
+
+def _template_line(t) -> str:
+    return f"{t.id[:8]}  {t.rule:<14} next {t.next}  {t.buy_in:>7.2f} -> {t.payout:<7.2f}  {t.description}"
+
+
+def cmd_recurring(args: argparse.Namespace) -> int:
+    from .recurring import Template, TemplateStore
+    if args.action == "run":
+        _warn_if_app_running()
+        state = AppState()
+        tasks = state.materialize_recurring()
+        _emit(args, [t.to_dict() for t in tasks],
+              "\n".join(f"added {t.id}  {t.description}" for t in tasks)
+              or ("nothing due" if state.in_creation_window() else "outside the creation window"))
+        return EXIT_OK
+    store = TemplateStore.load()
+    if args.action == "add":
+        t = store.add(Template.new(args.description, args.buy_in, args.payout, args.rule))
+        _emit(args, t.to_dict(), f"added {t.id}  {t.rule}  next {t.next}")
+    elif args.action == "remove":
+        t = store.remove(args.id)
+        _emit(args, t.to_dict(), f"removed {t.id}  {t.description}")
+    else:
+        templates = store.list()
+        _emit(args, [t.to_dict() for t in templates],
+              "\n".join(_template_line(t) for t in templates) or "no recurring templates")
+    return EXIT_OK
+
+
+def cmd_balance(args: argparse.Namespace) -> int:
+    bal = round(storage.compute_balance(), 2)
+    _emit(args, {"balance": bal}, f"{bal:.2f}")
+    return EXIT_OK
+
+
+def cmd_history(args: argparse.Namespace) -> int:
+    rows = storage.read_history(max_lines=args.limit)
+    if args.event:
+        rows = [r for r in rows if r.get("event") in args.event]
+    _emit(args, rows, "\n".join(_history_line(r) for r in rows))
+    return EXIT_OK
+
+
+def cmd_search(args: argparse.Namespace) -> int:
+    from .history_index import HistoryIndex
+    idx = HistoryIndex.load()
+    idx.refresh()
+    rows = idx.search(" ".join(args.query), limit=args.limit)
+    try:
+        idx.save()
+    except OSError:
+        pass  # read-only data dir: search still works, just re-indexes next time
+    _emit(args, rows, "\n".join(_history_line(r) for r in rows))
+    return EXIT_OK
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        n = storage.export_history(out, args.format, events=args.event, limit=args.limit,
+                                   workers=args.workers)
+    finally:
+        if args.out:
+            out.close()
+    if args.out:
+        print(f"exported {n} rows to {args.out}", file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_stats(args: argparse.Namespace) -> int:
+    if args.by_type:
+        from . import columnar
+        columnar.sync()
+        cols = columnar.LedgerColumns.open()
+        sums = cols.sum_by_type() if cols is not None else {}
+        _emit(args, sums, "\n".join(f"{t or '-':<16} {v:>12.2f}" for t, v in sums.items()))
+        return EXIT_OK
+    days = storage.ledger_daily_rollup(workers=args.workers)
+    rows = [{"day": day, **d} for day, d in list(days.items())[-args.days:]] if args.days > 0 else []
+    text = "\n".join(f"{r['day']}  {r['count']:>5}  {r['net']:>10.2f}  {r['balance']:>10.2f}" for r in rows)
+    _emit(args, rows, text)
+    return EXIT_OK
+
+
+def cmd_compact(args: argparse.Namespace) -> int:
+    _warn_if_app_running()
+    n = storage.compact_ledger(retain_days=args.days)
+    bal = round(storage.compute_balance(), 2)
+    _emit(args, {"lines": n, "balance": bal}, f"ledger compacted: {n} lines, balance {bal:.2f}")
+    return EXIT_OK
+
+
+def cmd_verify(args: argparse.Namespace) -> int:
+    report = storage.verify_ledger(workers=args.workers)
+    text = [f"{report['lines']} ledger lines, balance {report['balance']:.2f}"]
+    text += [f"line {e['line']}: {e['error']}" for e in report["errors"]]
+    _emit(args, report, "\n".join(text))
+    return EXIT_ERROR if report["errors"] else EXIT_OK
+
+
+# -------- Parser --------
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli",
+                                     description="Todo Gamble command line (no GUI).")
+    parser.add_argument("--json", action="store_true", help="machine-readable JSON output")
+    parser.add_argument("--data-dir", help=f"data directory (default {storage.APP_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("add", help="add a task (or many with --stdin)")
+    p.add_argument("description", nargs="?")
+    p.add_argument("buy_in", nargs="?", type=float)
+    p.add_argument("payout", nargs="?", type=float)
+    p.add_argument("--stdin", action="store_true",
+                   help="read {description, buy_in, payout} records (CSV, JSON array or JSON lines)")
+    p.add_argument("--file", metavar="PATH", help="read records from a .csv/.json/.jsonl file")
+    p.add_argument("--format", choices=("csv", "json"), help="record format (default: guessed)")
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser("complete", help="complete tasks by id or unique id prefix")
+    p.add_argument("ids", nargs="*")
+    p.add_argument("--stdin", action="store_true", help="read task ids from stdin")
+    p.set_defaults(func=cmd_complete)
+
+    p = sub.add_parser("delete", help="delete pending tasks (penalty rules apply)")
+    p.add_argument("ids", nargs="*")
+    p.add_argument("--stdin", action="store_true", help="read task ids from stdin")
+    p.set_defaults(func=cmd_delete)
+
+    p = sub.add_parser("undo", help="undo the last action (or a given operation)")
+    p.add_argument("--op", help="operation id to undo (default: the newest one)")
+    p.set_defaults(func=cmd_undo)
+
+    p = sub.add_parser("sync", help="sync with a shared folder or a .zip bundle")
+    p.add_argument("path", nargs="?", help="folder (any number of devices) or .zip (two devices)")
+    p.add_argument("--status", action="store_true", help="show this device's id and what it has applied")
+    p.add_argument("--new-passphrase", action="store_true",
+                   help="protect a new sync location with a passphrase shared by your devices "
+                        "(required when the data folder is encrypted)")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("encrypt", help="encrypt the data folder (needs the cryptography package)")
+    p.add_argument("--disable", action="store_true", help="decrypt back to plain files")
+    p.set_defaults(func=cmd_encrypt)
+
+    p = sub.add_parser("settings", help="show settings, or change one (validated; a running app reloads it)")
+    p.add_argument("key", nargs="?", help="dotted name, e.g. creation_window.start")
+    p.add_argument("value", nargs="?", help="new value (JSON for numbers/booleans/null)")
+    p.set_defaults(func=cmd_settings)
+
+    p = sub.add_parser("list", help="list pending tasks")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("recurring", help="manage recurring task templates")
+    rsub = p.add_subparsers(dest="action", required=True)
+    rsub.add_parser("list", help="list templates with their next occurrence")
+    rp = rsub.add_parser("add", help="add a template")
+    rp.add_argument("description")
+    rp.add_argument("buy_in", type=float)
+    rp.add_argument("payout", type=float)
+    rp.add_argument("--rule", default="daily",
+                    help="daily | weekdays | weekends | mon,wed,fri | 'every N days' (default daily)")
+    rp = rsub.add_parser("remove", help="remove a template by id or unique prefix")
+    rp.add_argument("id")
+    rsub.add_parser("run", help="create today's instances now (creation window only)")
+    p.set_defaults(func=cmd_recurring)
+
+    p = sub.add_parser("balance", help="print the current balance")
+    p.set_defaults(func=cmd_balance)
+
+    p = sub.add_parser("history", help="print recent history rows")
+    p.add_argument("--limit", type=int, default=50)
+    p.add_argument("--event", action="append", help="only these events (repeatable)")
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("search", help="search all retained history, e.g. 'gym forfeited last 30 days'")
+    p.add_argument("query", nargs="+")
+    p.add_argument("--limit", type=int, default=50)
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("export", help="export history as CSV or JSON lines")
+    p.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    p.add_argument("--out", help="output file (default stdout)")
+    p.add_argument("--limit", type=int, default=None, help="only the newest N rows")
+    p.add_argument("--event", action="append", help="only these events (repeatable)")
+    p.add_argument("--workers", type=int, help="scan processes (default: CPU count)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("stats", help="per-day ledger totals (count, net, end balance)")
+    p.add_argument("--days", type=int, default=30, help="most recent N days with activity")
+    p.add_argument("--by-type", action="store_true", help="totals per ledger entry type instead")
+    p.add_argument("--workers", type=int, help="scan processes (default: CPU count)")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("compact", help="compact the ledger to the last N days")
+    p.add_argument("--days", type=int, default=30)
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser("verify", help="check ledger running balances (exit 1 on problems)")
+    p.add_argument("--workers", type=int, help="scan processes (default: CPU count)")
+    p.set_defaults(func=cmd_verify)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.data_dir:
+        storage.set_app_dir(args.data_dir)
+    try:
+        if args.func not in (cmd_encrypt, cmd_settings):
+            from . import encryption
+            encryption.ensure_unlocked(storage.current(), ask=_ask_passphrase)
+        return args.func(args)
+    except (CliError, KeyError, ValueError, PermissionError, RuntimeError) as e:
+        msg = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+        if args.json:
+            sys.stdout.write(json.dumps({"error": msg}) + "\n")
+        else:
+            print(f"error: {msg}", file=sys.stderr)
+        return EXIT_ERROR
+    except BrokenPipeError:
+        return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
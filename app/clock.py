@@ -0,0 +1,95 @@
+# =============================
+# File: app/clock.py
+# =============================
+"""
+The time source for everything that schedules or timestamps data.
+
+AppState (windows, due times, forfeits, recurring instances), storage
+(row timestamps, Monday purge, compaction cutoff), the chart and
+columnar day buckets (utc_offset), the GUI tick and dated file names
+ask clock.now() instead of datetime.now(). By default that is the system
+clock; a simulation or a test installs a ManualClock to run weeks of
+days in seconds:
+
+    sim = clock.ManualClock(datetime(2026, 1, 5, 9, 0))
+    with clock.use(sim):
+        state.forfeit_overdue()
+        sim.advance(hours=3)
+
+now() is naive local time, like the datetime.now() it replaces;
+now_aware() is the same instant with the local UTC offset attached.
+Durations (perf_counter, monotonic, metrics) stay on real time.
+"""
+from __future__ import annotations
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterator
+
+
+class SystemClock:
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class ManualClock:
+    """A clock that only moves when told to (thread-safe)."""
+
+    def __init__(self, start: datetime) -> None:
+        self._now = start.replace(tzinfo=None)
+        self._lock = threading.Lock()
+
+    def now(self) -> datetime:
+        with self._lock:
+            return self._now
+
+    def set(self, at: datetime) -> None:
+        with self._lock:
+            self._now = at.replace(tzinfo=None)
+
+    def advance(self, delta: timedelta | None = None, **kwargs: float) -> datetime:
+        """Move forward by `delta` or timedelta(**kwargs); returns the new time."""
+        with self._lock:
+            self._now += delta if delta is not None else timedelta(**kwargs)
+            return self._now
+
+
+_clock = SystemClock()
+
+
+def now() -> datetime:
+    return _clock.now()
+
+
+def now_aware() -> datetime:
+    return _clock.now().astimezone()
+
+
+def today() -> date:
+    return _clock.now().date()
+
+
+def utc_offset() -> int:
+    """Seconds east of UTC at now() (day buckets of epoch timestamps use it)."""
+    return int(now_aware().utcoffset().total_seconds())
+
+
+def get():
+    return _clock
+
+
+def install(c) -> None:
+    """Make `c` (anything with now() -> naive local datetime) the process clock."""
+    global _clock
+    _clock = c
+
+
+@contextmanager
+def use(c) -> Iterator:
+    """Install `c` for the duration of the block."""
+    prev = _clock
+    install(c)
+    try:
+        yield c
+    finally:
+        install(prev)
@@ -0,0 +1,291 @@
+# =============================
+# File: app/columnar.py
+# =============================
+"""
+Columnar sidecar of ledger.txt for analytics (APP_DIR/columns/).
+
+    ts.bin       int64   epoch seconds
+    cents.bin    int64   amount in cents
+    type.bin     uint8   code into meta["types"]
+    balance.bin  int32   running balance in cents (int64 once a value no longer fits)
+    meta.json    rows, ledger bytes consumed, ledger signature, type names
+
+The ledger stays the source of truth: sync() appends the lines written
+since the last sync and rebuilds from scratch when the ledger was rewritten
+(compaction, purge). It runs after compaction and from background
+maintenance (the tick worker, the headless API server).
+
+Not kept for an encrypted directory (app.encryption): the columns would be
+plaintext amounts and balances; sync() removes them and open() returns None.
+
+LedgerColumns.open() maps the files read-only. With NumPy installed the
+columns are zero-copy ndarrays and queries are vectorized; without it they
+are memoryviews and the same queries run as plain loops.
+"""
+from __future__ import annotations
+import bisect
+import hashlib
+import json
+import mmap
+import threading
+from array import array
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import storage
+from . import metrics
+from . import clock
+from .linescan import LineScanner
+
+try:
+    import numpy as np
+except ImportError:  # optional: analytics fall back to plain Python
+    np = None
+
+FORMAT_VERSION = 2
+SIG_BYTES = 256
+INT32_MAX = 2 ** 31 - 1
+_COLUMNS = ("ts", "cents", "type", "balance")
+_CODES = {"ts": "q", "cents": "q", "type": "B", "balance": "i"}
+
+
+def columns_dir() -> Path:
+    return storage.APP_DIR / "columns"
+
+
+def _col_path(name: str) -> Path:
+    return columns_dir() / f"{name}.bin"
+
+
+def _meta_path() -> Path:
+    return columns_dir() / "meta.json"
+
+
+def _load_meta() -> Optional[Dict[str, Any]]:
+    try:
+        meta = json.loads(_meta_path().read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    return meta if meta.get("version") == FORMAT_VERSION else None
+
+
+def _save_meta(meta: Dict[str, Any]) -> None:
+    tmp = _meta_path().with_suffix(".tmp")
+    tmp.write_text(json.dumps(meta), encoding="utf-8")
+    tmp.replace(_meta_path())
+
+
+def _signature(consumed: int) -> str:
+    """Hash of the ledger's first bytes (only the part already converted)."""
+    with storage.LEDGER_PATH.open("rb") as f:
+        return hashlib.blake2b(f.read(min(SIG_BYTES, consumed)), digest_size=16).hexdigest()
+
+
+def _epoch(ts: str) -> int:
+    dt = storage._parse_ts(ts)
+    return int(dt.timestamp()) if dt is not None else 0
+
+
+# ---------- Building ----------
+@metrics.timed("columnar.sync")
+def sync() -> int:
+    """Bring the sidecar up to date with ledger.txt. Returns rows added."""
+    with storage.current().obj("columnar.lock", lambda _: threading.Lock()):
+        if not storage.LEDGER_PATH.exists() or storage.encrypted():
+            _remove()
+            return 0
+        columns_dir().mkdir(parents=True, exist_ok=True)
+        meta = _load_meta()
+        size = storage.LEDGER_PATH.stat().st_size
+        if meta is None or size < meta["offset"] or meta["sig"] != _signature(meta["offset"]):
+            meta = {"version": FORMAT_VERSION, "rows": 0, "offset": 0, "sig": "",
+                    "types": [], "balance_code": "i", "sorted": True, "last_ts": None}
+        elif size == meta["offset"]:
+            return 0
+
+        cols = {name: array(_CODES[name]) for name in _COLUMNS}
+        cols["balance"] = array(meta["balance_code"])
+        types: List[str] = meta["types"]
+        codes = {t: i for i, t in enumerate(types)}
+        ts_col = cols["ts"]
+        last_ts = meta["last_ts"]
+        is_sorted = meta["sorted"]
+        after_snapshot = False
+        with LineScanner(storage.LEDGER_PATH) as sc:
+            end = sc.complete_end()
+            for _, line in sc.lines(meta["offset"], end, decode=True):
+                try:
+                    obj = json.loads(line)
+                    cents = int(round(float(obj.get("amount", 0.0)) * 100))
+                    bal = int(round(float(obj.get("balance", 0.0)) * 100))
+                except Exception:
+                    continue
+                kind = str(obj.get("type", ""))
+                code = codes.get(kind)
+                if code is None:
+                    if len(types) > 255:
+                        code = codes[kind] = 0  # uint8 exhausted; lump into the first type
+                    else:
+                        code = codes[kind] = len(types)
+                        types.append(kind)
+                if cols["balance"].typecode == "i" and abs(bal) > INT32_MAX:
+                    cols["balance"] = array("q", cols["balance"])
+                ts = _epoch(str(obj.get("ts", "")))
+                if after_snapshot and ts < ts_col[-1]:
+                    # A compaction snapshot is stamped when it is written but stands
+                    # for the balance just before the first retained row
+                    ts_col[-1] = ts
+                    last_ts = ts_col[-2] if len(ts_col) > 1 else meta["last_ts"]
+                if last_ts is not None and ts < last_ts:
+                    is_sorted = False
+                last_ts = ts
+                after_snapshot = kind == "snapshot"
+                ts_col.append(ts)
+                cols["cents"].append(cents)
+                cols["type"].append(code)
+                cols["balance"].append(bal)
+        if cols["balance"].typecode != meta["balance_code"]:
+            _widen_balance(meta["rows"])
+            meta["balance_code"] = "q"
+
+        # Drop anything past meta["rows"] (a sync interrupted before its meta write)
+        for name in _COLUMNS:
+            code = meta["balance_code"] if name == "balance" else _CODES[name]
+            path = _col_path(name)
+            with path.open("ab") as f:
+                f.truncate(meta["rows"] * array(code).itemsize)
+                cols[name].tofile(f)
+        added = len(cols["ts"])
+        meta.update(rows=meta["rows"] + added, offset=end, types=types, sig=_signature(end),
+                    sorted=is_sorted, last_ts=last_ts)
+        _save_meta(meta)
+        return added
+
+
+def _widen_balance(rows: int) -> None:
+    path = _col_path("balance")
+    old = array("i")
+    if rows and path.exists():
+        with path.open("rb") as f:
+            old.fromfile(f, rows)
+    with path.open("wb") as f:
+        array("q", old).tofile(f)
+
+
+def _remove() -> None:
+    for name in _COLUMNS:
+        _col_path(name).unlink(missing_ok=True)
+    _meta_path().unlink(missing_ok=True)
+
+
+# ---------- Reading ----------
+class LedgerColumns:
+    """Read-only mapped view of the sidecar. Amounts are returned in dollars."""
+
+    def __init__(self, meta: Dict[str, Any]) -> None:
+        self.rows: int = meta["rows"]
+        self.types: List[str] = meta["types"]
+        self.sorted: bool = meta["sorted"]
+        self._maps: List[mmap.mmap] = []
+        self.ts = self._map("ts", "q")
+        self.cents = self._map("cents", "q")
+        self.type = self._map("type", "B")
+        self.balance = self._map("balance", meta["balance_code"])
+
+    @classmethod
+    def open(cls) -> Optional["LedgerColumns"]:
+        """Map the current sidecar (None if it has not been built)."""
+        meta = _load_meta() if not storage.encrypted() else None
+        return cls(meta) if meta is not None else None
+
+    def _map(self, name: str, code: str):
+        n = self.rows * array(code).itemsize
+        if n == 0:
+            return np.zeros(0, dtype=code) if np is not None else memoryview(array(code))
+        with _col_path(name).open("rb") as f:
+            mm = mmap.mmap(f.fileno(), n, access=mmap.ACCESS_READ)
+        self._maps.append(mm)
+        if np is not None:
+            return np.frombuffer(mm, dtype=np.dtype(code), count=self.rows)
+        return memoryview(mm)[:n].cast(code)
+
+    def close(self) -> None:
+        self.ts = self.cents = self.type = self.balance = None
+        for mm in self._maps:
+            try:
+                mm.close()
+            except BufferError:
+                pass  # an ndarray still references it; freed with the array
+        self._maps.clear()
+
+    def __enter__(self) -> "LedgerColumns":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.rows
+
+    # ---------- Queries ----------
+    def _select(self, t0: Optional[float], t1: Optional[float]):
+        """
+        Rows with t0 <= ts < t1: a slice found by binary search when ts is
+        sorted (the usual case), else a mask (NumPy) or a list of indices.
+        """
+        lo = -2 ** 63 if t0 is None else int(t0)
+        hi = 2 ** 63 - 1 if t1 is None else int(t1)
+        if self.sorted:
+            if np is not None:
+                a, b = np.searchsorted(self.ts, [lo, hi], "left")
+            else:
+                a, b = bisect.bisect_left(self.ts, lo), bisect.bisect_left(self.ts, hi)
+            return slice(int(a), int(b))
+        if np is not None:
+            return (self.ts >= lo) & (self.ts < hi)
+        return [i for i, t in enumerate(self.ts) if lo <= t < hi]
+
+    def _indices(self, sel) -> Iterable[int]:
+        return range(*sel.indices(self.rows)) if isinstance(sel, slice) else sel
+
+    def balance_series(self, t0: Optional[float] = None, t1: Optional[float] = None) -> Tuple[Any, Any]:
+        """(epoch seconds, balance dollars) for rows in [t0, t1)."""
+        sel = self._select(t0, t1)
+        if np is not None:
+            return self.ts[sel], self.balance[sel] / 100.0
+        idx = self._indices(sel)
+        return [self.ts[i] for i in idx], [self.balance[i] / 100.0 for i in idx]
+
+    def net(self, t0: Optional[float] = None, t1: Optional[float] = None) -> float:
+        sel = self._select(t0, t1)
+        if np is not None:
+            return int(self.cents[sel].sum()) / 100.0
+        return sum(self.cents[i] for i in self._indices(sel)) / 100.0
+
+    def sum_by_type(self, t0: Optional[float] = None, t1: Optional[float] = None) -> Dict[str, float]:
+        sel = self._select(t0, t1)
+        if np is not None:
+            sums = np.bincount(self.type[sel], weights=self.cents[sel], minlength=len(self.types))
+            return {t: round(float(sums[i]) / 100.0, 2) for i, t in enumerate(self.types)}
+        totals = [0] * len(self.types)
+        for i in self._indices(sel):
+            totals[self.type[i]] += self.cents[i]
+        return {t: round(totals[i] / 100.0, 2) for i, t in enumerate(self.types)}
+
+    def daily_net(self, t0: Optional[float] = None, t1: Optional[float] = None) -> List[Tuple[date, float]]:
+        """(local day, net dollars) for each day with activity in [t0, t1)."""
+        offset = clock.utc_offset()  # current local offset
+        sel = self._select(t0, t1)
+        epoch_day = date(1970, 1, 1).toordinal()
+        if np is not None:
+            days = (self.ts[sel] + offset) // 86400
+            uniq, inv = np.unique(days, return_inverse=True)
+            sums = np.bincount(inv, weights=self.cents[sel])
+            return [(date.fromordinal(int(d) + epoch_day), round(float(s) / 100.0, 2))
+                    for d, s in zip(uniq, sums)]
+        totals: Dict[int, int] = {}
+        for i in self._indices(sel):
+            d = (self.ts[i] + offset) // 86400
+            totals[d] = totals.get(d, 0) + self.cents[i]
+        return [(date.fromordinal(d + epoch_day), round(c / 100.0, 2)) for d, c in sorted(totals.items())]
@@ -0,0 +1,199 @@
+# =============================
+# File: app/dedup.py
+# =============================
+"""
+Duplicate suppression for keyed ledger/history rows.
+
+Rows written by AppState carry a deterministic `key`, e.g.
+"<task id>:forfeit:<due_at>" or "refund:<key of the purchase row>".
+journal.commit() drops any row whose key was already written, so a retry,
+a double click or two writers racing on a stale task list become no-ops.
+
+    keys.txt    every recorded key, one per line (append-only; trimmed to
+                the newest KEEP_KEYS once it passes MAX_KEYS)
+    keys.bloom  Bloom filter over keys.txt plus the byte offset it covers
+
+seen() answers "definitely new" from the in-memory Bloom filter in O(1).
+Only a Bloom hit (a real duplicate, or a ~1% false positive) loads the
+exact set from keys.txt, once. Before each check the index reads whatever
+other processes appended to keys.txt since it last looked.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+
+from . import storage
+from . import metrics
+
+BLOOM_BITS = 1 << 21  # 256 KiB; ~1% false positives at MAX_KEYS
+BLOOM_HASHES = 7
+MAX_KEYS = 200_000
+KEEP_KEYS = 100_000
+_MAGIC = b"TGBF1"
+_HEADER = struct.Struct("<5sQ")  # magic, keys.txt bytes covered
+
+
+class Bloom:
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: Optional[bytearray] = None) -> None:
+        self.bits = bits if bits is not None else bytearray(BLOOM_BITS // 8)
+
+    @staticmethod
+    def _positions(key: str) -> List[int]:
+        d = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(d[:8], "little"), int.from_bytes(d[8:], "little") | 1
+        return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+    def add(self, key: str) -> None:
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+
+class KeyIndex:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._lock = threading.RLock()
+        self._bloom: Optional[Bloom] = None
+        self._exact: Optional[Set[str]] = None
+        self._offset = 0  # keys.txt bytes folded into the Bloom filter
+        self._count = 0  # keys added since load (trim check)
+        self._saved_offset = -1
+
+    @property
+    def keys_path(self) -> Path:
+        return self.root / "keys.txt"
+
+    @property
+    def bloom_path(self) -> Path:
+        return self.root / "keys.bloom"
+
+    # ---------- Loading ----------
+    def _load(self) -> None:
+        self._exact = None
+        self._bloom, self._offset = Bloom(), 0
+        try:
+            raw = self.bloom_path.read_bytes()
+            magic, covered = _HEADER.unpack_from(raw)
+            bits = bytearray(raw[_HEADER.size:])
+            if magic == _MAGIC and len(bits) == BLOOM_BITS // 8 and covered <= self._size():
+                self._bloom, self._offset = Bloom(bits), covered
+                self._saved_offset = covered
+        except Exception:
+            pass
+
+    def _size(self) -> int:
+        try:
+            return os.path.getsize(self.keys_path)
+        except OSError:
+            return 0
+
+    def _catch_up(self) -> None:
+        """Fold in keys appended (by any process) since the last look."""
+        if self._bloom is None:
+            self._load()
+        size = self._size()
+        if size < self._offset:
+            self._load()  # trimmed by another process
+            size = self._size()
+        if size == self._offset:
+            return
+        with self.keys_path.open("rb") as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8", "replace").splitlines():
+            if line:
+                self._bloom.add(line)
+                if self._exact is not None:
+                    self._exact.add(line)
+        self._offset += end
+
+    def _exact_set(self) -> Set[str]:
+        if self._exact is None:
+            try:
+                with self.keys_path.open("rb") as f:
+                    data = f.read(self._offset)
+                self._exact = set(data.decode("utf-8", "replace").splitlines())
+            except OSError:
+                self._exact = set()
+            self._exact.discard("")
+            metrics.add_bytes("dedup.load_exact", read=self._offset)
+        return self._exact
+
+    # ---------- Queries ----------
+    @metrics.timed("dedup.seen")
+    def seen(self, keys: Iterable[str]) -> Set[str]:
+        """The subset of `keys` that has already been recorded."""
+        with self._lock:
+            self._catch_up()
+            maybe = [k for k in keys if k in self._bloom]
+            if not maybe:
+                return set()
+            exact = self._exact_set()
+            return {k for k in maybe if k in exact}
+
+    @metrics.timed("dedup.add")
+    def add(self, keys: Iterable[str]) -> None:
+        """Record keys (ones already present are skipped)."""
+        with self._lock:
+            self._catch_up()
+            new = [k for k in dict.fromkeys(keys)
+                   if "\n" not in k and (k not in self._bloom or k not in self._exact_set())]
+            if not new:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            data = "".join(k + "\n" for k in new).encode("utf-8")
+            with self.keys_path.open("ab") as f:
+                f.write(data)
+            for k in new:
+                self._bloom.add(k)
+                if self._exact is not None:
+                    self._exact.add(k)
+            self._offset += len(data)
+            self._count += len(new)
+            if self._count >= MAX_KEYS - KEEP_KEYS:
+                self._count = 0
+                self._maybe_trim()
+
+    def _maybe_trim(self) -> None:
+        with self.keys_path.open("rb") as f:
+            lines = f.read().splitlines()
+        if len(lines) <= MAX_KEYS:
+            return
+        keep = lines[-KEEP_KEYS:]
+        data = b"".join(k + b"\n" for k in keep)
+        tmp = self.keys_path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(self.keys_path)
+        self._bloom, self._exact, self._offset = Bloom(), None, 0
+        self._catch_up()
+        self.save()
+
+    def approx_bytes(self) -> int:
+        exact = len(self._exact) * 100 if self._exact is not None else 0
+        return (BLOOM_BITS // 8 if self._bloom is not None else 0) + exact
+
+    def save(self) -> None:
+        """Persist the Bloom filter so the next start only reads the keys.txt tail."""
+        with self._lock:
+            if self._bloom is None or self._offset == self._saved_offset:
+                return
+            blob = _HEADER.pack(_MAGIC, self._offset) + bytes(self._bloom.bits)
+            tmp = self.bloom_path.with_suffix(".tmp")
+            tmp.write_bytes(blob)
+            tmp.replace(self.bloom_path)
+            self._saved_offset = self._offset
+
+
+def index() -> KeyIndex:
+    """The key index of the active data directory (see storage.StorageContext)."""
+    return storage.current().obj("dedup", KeyIndex)
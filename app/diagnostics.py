@@ -0,0 +1,88 @@
+# =============================
+# File: app/diagnostics.py
+# =============================
+"""Hidden Diagnostics window (Ctrl+Shift+D): live view of app.metrics."""
+from __future__ import annotations
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from . import metrics
+from . import clock
+
+REFRESH_MS = 1000
+
+_COLUMNS = (
+    ("name", "Metric", 240, tk.W),
+    ("count", "Count", 70, tk.E),
+    ("p50_ms", "p50 ms", 80, tk.E),
+    ("p95_ms", "p95 ms", 80, tk.E),
+    ("max_ms", "max ms", 80, tk.E),
+    ("total_ms", "total ms", 90, tk.E),
+    ("bytes_read", "read B", 90, tk.E),
+    ("bytes_written", "written B", 90, tk.E),
+)
+
+
+class DiagnosticsWindow(tk.Toplevel):
+    def __init__(self, master: tk.Misc) -> None:
+        super().__init__(master)
+        self.title("Diagnostics")
+        self.geometry("900x420")
+
+        top = ttk.Frame(self, padding=(10, 8))
+        top.pack(fill=tk.X)
+        self.enabled_var = tk.BooleanVar(value=metrics.enabled())
+        ttk.Checkbutton(top, text="Collect metrics", variable=self.enabled_var,
+                        command=lambda: metrics.enable(self.enabled_var.get())).pack(side=tk.LEFT)
+        ttk.Button(top, text="Reset", command=self._reset).pack(side=tk.LEFT, padx=(12, 0))
+        ttk.Button(top, text="Dump JSON…", command=self._dump).pack(side=tk.RIGHT)
+
+        frame = ttk.Frame(self, padding=(10, 0, 10, 10))
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(frame, columns=[c[0] for c in _COLUMNS], show="headings")
+        for key, label, width, anchor in _COLUMNS:
+            self.tree.heading(key, text=label)
+            self.tree.column(key, width=width, anchor=anchor, stretch=(key == "name"))
+        self.tree.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
+        vsb = ttk.Scrollbar(frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=vsb.set)
+        vsb.pack(fill=tk.Y, side=tk.RIGHT)
+
+        self._job = None
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self._refresh()
+
+    def _refresh(self) -> None:
+        snap = metrics.snapshot()
+        for iid in set(self.tree.get_children()) - set(snap):
+            self.tree.delete(iid)
+        for name, m in snap.items():
+            values = [name] + [m[key] for key, *_ in _COLUMNS[1:]]
+            if self.tree.exists(name):
+                self.tree.item(name, values=values)
+            else:
+                self.tree.insert("", tk.END, iid=name, values=values)
+        self._job = self.after(REFRESH_MS, self._refresh)
+
+    def _reset(self) -> None:
+        metrics.reset()
+        for iid in self.tree.get_children():
+            self.tree.delete(iid)
+
+    def _dump(self) -> None:
+        path = filedialog.asksaveasfilename(
+            parent=self, title="Save metrics JSON", defaultextension=".json",
+            initialfile=f"todo_gamble_metrics_{clock.now().strftime('%Y%m%d_%H%M%S')}.json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+        try:
+            metrics.dump_json(path)
+        except Exception as e:
+            messagebox.showerror("Dump failed", str(e), parent=self)
+
+    def close(self) -> None:
+        if self._job is not None:
+            self.after_cancel(self._job)
+        self.destroy()
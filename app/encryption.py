@@ -0,0 +1,304 @@
+# =============================
+# File: app/encryption.py
+# =============================
+"""
+Optional encryption at rest (needs the `cryptography` package).
+
+Every line of the JSONL files (ledger.txt, history.jsonl and its archives,
+oplog.jsonl, the journal's copies of them) and the whole of tasks.json and
+templates.json are sealed one by one with AES-GCM:
+
+    ~<base64(nonce | ciphertext | tag)>
+
+A line is still one line, so appends stay O(record), byte offsets (journal,
+history pages, search index) still work, and tail/reverse reads
+decrypt only the lines they return. Readers accept plain and sealed lines
+alike (storage.parse_line), which is what makes enabling and disabling
+resumable after a crash.
+
+The key comes from a passphrase via scrypt (hashlib) with a per-directory
+salt kept in APP_DIR/encryption.json, next to a sealed check value. Only
+this module writes that file, and it keeps a copy in encryption.json.bak;
+without both, sealed data can't be read again, so opening a directory
+that has sealed lines but no key file fails (KeyFileMissing) instead of
+starting empty. The key is derived once per session and kept on the
+StorageContext (the profile pool keeps contexts across evictions, so
+reopening a profile doesn't re-derive it).
+
+Derived caches that would hold plaintext are not written while encrypted:
+the columnar sidecar (the chart reads the ledger instead) and the
+persisted search index (rebuilt in memory). settings.json and keys.txt
+(row keys: task ids, dates, purchase names) stay plain; sync segments use
+their own shared key (app.sync).
+"""
+from __future__ import annotations
+import base64
+import binascii
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import storage
+from . import metrics
+
+PASSPHRASE_ENV = "TODO_GAMBLE_PASSPHRASE"
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+NONCE_BYTES = 12
+_AAD = b"todo-gamble/1"
+_CHECK = "todo-gamble"
+
+
+KEY_FILE = "encryption.json"
+KEY_BACKUP = "encryption.json.bak"
+
+
+class LockedError(PermissionError):
+    """The data directory is encrypted and no (correct) passphrase was given."""
+
+
+class KeyFileMissing(LockedError):
+    """Sealed data exists but encryption.json (and its backup) is gone."""
+
+
+class LineCipher:
+    """AES-GCM sealing of single lines (a random nonce per line)."""
+
+    def __init__(self, key: bytes) -> None:
+        # Imported here so plain data directories never load cryptography
+        from cryptography.exceptions import InvalidTag
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        self._aead = AESGCM(key)
+        self._damaged = (binascii.Error, InvalidTag, ValueError)
+
+    def seal(self, text: str) -> str:
+        nonce = os.urandom(NONCE_BYTES)
+        blob = nonce + self._aead.encrypt(nonce, text.encode("utf-8"), _AAD)
+        return storage.SEALED_PREFIX + binascii.b2a_base64(blob, newline=False).decode("ascii")
+
+    def open(self, line: str | bytes) -> bytes:
+        """Plaintext bytes of a sealed line; ValueError if it is damaged or under another key."""
+        try:
+            blob = binascii.a2b_base64(line[1:].strip())
+            return self._aead.decrypt(blob[:NONCE_BYTES], blob[NONCE_BYTES:], _AAD)
+        except self._damaged:
+            raise ValueError("sealed line failed authentication")
+
+
+def available() -> bool:
+    return importlib.util.find_spec("cryptography") is not None
+
+
+def _require() -> None:
+    if not available():
+        raise RuntimeError("Encryption needs the 'cryptography' package (pip install cryptography).")
+
+
+@metrics.timed("encryption.derive_key")
+def derive_key(passphrase: str, params: Dict[str, Any]) -> bytes:
+    n, r, p = int(params["n"]), int(params["r"]), int(params["p"])
+    return hashlib.scrypt(passphrase.encode("utf-8"), salt=base64.b64decode(params["salt"]),
+                          n=n, r=r, p=p, maxmem=256 * n * r + (1 << 20), dklen=32)
+
+
+def new_key(passphrase: str) -> Tuple[Dict[str, Any], LineCipher]:
+    """Fresh KDF parameters (random salt, sealed check value) and their cipher."""
+    _require()
+    params = {"kdf": "scrypt", "n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P,
+              "salt": base64.b64encode(os.urandom(16)).decode("ascii")}
+    cipher = LineCipher(derive_key(passphrase, params))
+    params["check"] = cipher.seal(_CHECK)
+    return params, cipher
+
+
+def open_key(params: Dict[str, Any], passphrase: str) -> LineCipher:
+    """The cipher for `params`; LockedError if the passphrase doesn't match."""
+    _require()
+    cipher = LineCipher(derive_key(passphrase, params))
+    try:
+        ok = cipher.open(params["check"]).decode("utf-8") == _CHECK
+    except (ValueError, KeyError):
+        ok = False
+    if not ok:
+        raise LockedError("Wrong passphrase.")
+    return cipher
+
+
+def _read_params(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) and data.get("salt") and data.get("check") else None
+
+
+def _write_params(ctx: storage.StorageContext, params: Dict[str, Any]) -> None:
+    text = json.dumps(params, indent=2)
+    for name in (KEY_FILE, KEY_BACKUP):
+        storage.atomic_write(ctx.root / name, text)
+
+
+def _params(ctx: storage.StorageContext) -> Optional[Dict[str, Any]]:
+    params = _read_params(ctx.root / KEY_FILE)
+    if params is not None:
+        return params
+    params = _read_params(ctx.root / KEY_BACKUP)
+    if params is not None:
+        _write_params(ctx, params)  # restore the key file
+    return params
+
+
+def _has_sealed(ctx: storage.StorageContext) -> bool:
+    """True if any data file starts with a sealed line (first line only: files are sealed whole)."""
+    for path in _data_files(ctx) + _whole_files(ctx):
+        try:
+            with path.open("rb") as f:
+                for line in f:
+                    if line.strip():
+                        if line.startswith(storage.SEALED_PREFIX.encode("ascii")):
+                            return True
+                        break
+        except OSError:
+            continue
+    return False
+
+
+def is_encrypted(ctx: Optional[storage.StorageContext] = None) -> bool:
+    return _params(ctx or storage.current()) is not None
+
+
+def unlock(ctx: storage.StorageContext, passphrase: str) -> None:
+    """Derive the key and keep it on `ctx`. Raises LockedError for a wrong passphrase."""
+    _require()
+    params = _params(ctx)
+    if params is None:
+        return
+    ctx.cipher = open_key(params, passphrase)
+
+
+def ensure_unlocked(ctx: storage.StorageContext,
+                    ask: Optional[Callable[[], Optional[str]]] = None) -> bool:
+    """
+    Make an encrypted directory readable: the passphrase comes from
+    $TODO_GAMBLE_PASSPHRASE, else from ask(). Returns False for a plain
+    directory; raises LockedError when no passphrase is available, and
+    KeyFileMissing when sealed data has no key file to go with it.
+    """
+    if ctx.cipher is not None:
+        return True
+    if _params(ctx) is None:
+        if _has_sealed(ctx):
+            raise KeyFileMissing(
+                f"{ctx.root} holds encrypted data but {KEY_FILE} and {KEY_BACKUP} are missing. "
+                f"Restore {KEY_FILE} from a backup of this folder; without it the data can't be read.")
+        return False
+    passphrase = os.environ.get(PASSPHRASE_ENV) or (ask() if ask is not None else None)
+    if not passphrase:
+        raise LockedError(f"{ctx.root} is encrypted; set {PASSPHRASE_ENV} or enter the passphrase.")
+    unlock(ctx, passphrase)
+    return True
+
+
+# ---------- Enabling / disabling ----------
+def _data_files(ctx: storage.StorageContext) -> List[Path]:
+    from . import oplog
+    paths = [ctx.ledger_path, ctx.history_path, ctx.run(oplog.log_path)]
+    if ctx.history_archive_dir.exists():
+        paths += sorted(ctx.history_archive_dir.glob("history-*.jsonl"))
+    return [p for p in paths if p.exists()]
+
+
+def _whole_files(ctx: storage.StorageContext) -> List[Path]:
+    return [p for p in (ctx.tasks_path, ctx.root / "templates.json") if p.exists()]
+
+
+def _rewrite(path: Path, lines: Iterable[str]) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("w", encoding="utf-8", newline="\n") as f:
+        for line in lines:
+            f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)
+
+
+def _convert(ctx: storage.StorageContext, seal: bool) -> int:
+    """Seal (or open) every line that isn't already; returns bytes rewritten."""
+    cipher = ctx.cipher
+    done = 0
+
+    def convert(text: str) -> str:
+        sealed = text.startswith(storage.SEALED_PREFIX)
+        if seal and not sealed:
+            return cipher.seal(text)
+        if not seal and sealed:
+            return cipher.open(text).decode("utf-8")
+        return text
+
+    for path in _data_files(ctx):
+        text = path.read_text(encoding="utf-8")
+        _rewrite(path, [convert(ln) for ln in text.splitlines() if ln.strip()])
+        done += len(text)
+    for path in _whole_files(ctx):
+        text = path.read_text(encoding="utf-8").strip()
+        if seal and not text.startswith(storage.SEALED_PREFIX):
+            text = json.dumps(json.loads(text), indent=2)
+        _rewrite(path, [convert(text)])
+        done += len(text)
+    storage.fsync_path(ctx.root)
+    return done
+
+
+@metrics.timed("encryption.enable")
+def enable(passphrase: str) -> int:
+    """
+    Encrypt the active data directory with `passphrase` (re-running it
+    finishes an interrupted run). Returns bytes rewritten.
+    """
+    _require()
+    from . import journal
+    ctx = storage.current()
+    with ctx.lock:
+        journal.checkpoint()  # offsets in the journal won't survive the rewrite
+        if _params(ctx) is not None:
+            unlock(ctx, passphrase)
+        else:
+            if len(passphrase) < 8:
+                raise ValueError("Use a passphrase of at least 8 characters.")
+            params, cipher = new_key(passphrase)
+            # Key file first: a crash part-way leaves readable mixed files, never unreadable ones
+            _write_params(ctx, params)
+            ctx.cipher = cipher
+        n = _convert(ctx, seal=True)
+        shutil.rmtree(ctx.root / "columns", ignore_errors=True)
+        shutil.rmtree(ctx.root / "index", ignore_errors=True)
+        ctx.drop_objects()  # op-log offsets moved
+        return n
+
+
+@metrics.timed("encryption.disable")
+def disable(passphrase: str) -> int:
+    """Decrypt the active data directory back to plain files. Returns bytes rewritten."""
+    _require()
+    from . import journal
+    ctx = storage.current()
+    with ctx.lock:
+        if _params(ctx) is None:
+            return 0
+        unlock(ctx, passphrase)
+        journal.checkpoint()
+        n = _convert(ctx, seal=False)
+        # Key file last (backup first), so an interrupted run can still be finished
+        for name in (KEY_BACKUP, KEY_FILE):
+            try:
+                (ctx.root / name).unlink()
+            except FileNotFoundError:
+                pass
+        ctx.cipher = None
+        ctx.drop_objects()
+        return n
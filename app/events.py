@@ -0,0 +1,128 @@
+# =============================
+# File: app/events.py
+# =============================
+"""
+In-process change notifications.
+
+AppState publishes one typed event per change it makes; UI widgets subscribe
+and patch themselves instead of re-reading files and redrawing tables.
+`TkEventPump` batches events from any thread and delivers them once per Tk
+idle cycle, so a burst (e.g. 20 forfeits) becomes a single UI update.
+"""
+from __future__ import annotations
+import sys
+import threading
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, FrozenSet, List, Optional, Type
+
+from .models import Task
+
+
+# -------- Event types --------
+
+@dataclass(frozen=True)
+class TaskAdded:
+    task: Task
+
+
+@dataclass(frozen=True)
+class TaskRemoved:
+    task_id: str
+    reason: str  # "completed" | "forfeited" | "deleted" | "undone" | "synced"
+
+
+@dataclass(frozen=True)
+class LedgerAppended:
+    entry: dict  # the line as written (with ts and running balance)
+    balance: float
+
+
+@dataclass(frozen=True)
+class HistoryAppended:
+    row: dict  # the line as written (with ts)
+
+
+@dataclass(frozen=True)
+class SettingsChanged:
+    sections: FrozenSet[str]  # top-level fields that differ, e.g. {"creation_window"}
+    settings: Any  # the new app.settings.Settings
+
+
+Event = Any
+Subscriber = Callable[[Event], None]
+
+
+# -------- Bus --------
+
+class EventBus:
+    """Synchronous publish/subscribe keyed by event class. Thread-safe."""
+
+    def __init__(self) -> None:
+        self._subs: Dict[Optional[type], List[Subscriber]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type: Optional[Type], fn: Subscriber) -> Callable[[], None]:
+        """Subscribe to one event class (None = every event). Returns an unsubscribe callable."""
+        with self._lock:
+            self._subs.setdefault(event_type, []).append(fn)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                subs = self._subs.get(event_type, [])
+                if fn in subs:
+                    subs.remove(fn)
+        return unsubscribe
+
+    def publish(self, event: Event) -> None:
+        with self._lock:
+            targets = list(self._subs.get(type(event), ())) + list(self._subs.get(None, ()))
+        for fn in targets:
+            try:
+                fn(event)
+            except Exception:
+                # A broken subscriber must not abort the state change that published
+                traceback.print_exc(file=sys.stderr)
+
+
+# -------- Tk adapter --------
+
+class TkEventPump:
+    """
+    Collects bus events (from any thread) and hands them to `handler` as one
+    list per Tk idle cycle, on the Tk thread.
+    """
+
+    def __init__(self, widget, bus: EventBus, handler: Callable[[List[Event]], None]) -> None:
+        self._widget = widget
+        self._handler = handler
+        self._queue: Deque[Event] = deque()
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self._unsubscribe = bus.subscribe(None, self._on_event)
+
+    def _on_event(self, event: Event) -> None:
+        with self._lock:
+            self._queue.append(event)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        try:
+            self._widget.after(0, self._schedule_idle)
+        except Exception:
+            pass  # widget destroyed
+
+    def _schedule_idle(self) -> None:
+        self._widget.after_idle(self._flush)
+
+    def _flush(self) -> None:
+        with self._lock:
+            batch = list(self._queue)
+            self._queue.clear()
+            self._scheduled = False
+        if batch:
+            self._handler(batch)
+
+    def close(self) -> None:
+        self._unsubscribe()
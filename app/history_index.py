@@ -0,0 +1,371 @@
+# =============================
+# File: app/history_index.py
+# =============================
+"""
+Search index over all retained history (archived segments + history.jsonl).
+
+- Inverted index: description token -> ascending doc ids.
+- Secondary indexes: event -> doc ids, task_id -> doc ids, day -> doc ids.
+- A doc is one history line, located by (segment, byte offset); rows are read
+  back from the files only for the hits that are returned.
+
+refresh() indexes whatever was appended since the last call (it is cheap to
+call after every append_history) and copes with the weekly archive move by
+matching segments on a signature of their first bytes. The index is pickled
+to APP_DIR/index/ so startup only has to catch up on new lines (except in
+an encrypted directory, where it lives in memory only; see app.encryption).
+
+Queries mix free text with filters, e.g. "gym forfeited last 30 days":
+  words           description tokens (prefix match, all must match)
+  event names     completed, forfeited, purchase, refund, deleted, reverted, ...
+  event:<name>    explicit event filter;  task:<id-prefix>  task filter
+  today, yesterday, last N days|weeks|months, since YYYY-MM-DD
+"""
+from __future__ import annotations
+import bisect
+import hashlib
+import os
+import pickle
+import re
+import threading
+from array import array
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import storage
+from . import metrics
+from . import clock
+
+INDEX_VERSION = 2
+SIG_BYTES = 256
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+EVENT_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "completed": ("completed",), "complete": ("completed",), "done": ("completed",),
+    "forfeited": ("forfeited",), "forfeit": ("forfeited",), "forfeits": ("forfeited",),
+    "purchase": ("purchase",), "purchases": ("purchase",), "bought": ("purchase",),
+    "refund": ("refund",), "refunds": ("refund",),
+    "deleted": ("deleted_free", "deleted_penalty"), "penalty": ("deleted_penalty",),
+    "reverted": ("reverted_completion", "reverted_forfeit"),
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _index_path() -> Path:
+    return storage.APP_DIR / "index" / "history.idx"
+
+
+def _signature(path: Path, indexed: int) -> bytes:
+    """Hash of the first bytes of a segment (only the part already indexed)."""
+    with path.open("rb") as f:
+        return hashlib.blake2b(f.read(min(SIG_BYTES, indexed)), digest_size=16).digest()
+
+
+def _day_of(ts: str) -> int:
+    try:
+        return date.fromisoformat(ts[:10]).toordinal()
+    except Exception:
+        return 0
+
+
+class _Segment:
+    __slots__ = ("name", "sig", "indexed", "docs")
+
+    def __init__(self, name: str, sig: bytes) -> None:
+        self.name = name  # path relative to APP_DIR
+        self.sig = sig
+        self.indexed = 0  # bytes consumed
+        self.docs: List[int] = []  # doc ids in this segment (ascending)
+
+
+class HistoryIndex:
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.segments: List[_Segment] = []
+        self.doc_seg = array("I")   # doc id -> segment slot
+        self.doc_off = array("Q")   # doc id -> byte offset in segment
+        self.terms: Dict[str, array] = {}
+        self.events: Dict[str, array] = {}
+        self.task_ids: Dict[str, array] = {}
+        self.days: Dict[int, array] = {}
+        self.dead: Set[int] = set()
+        self._sorted_terms: Optional[List[str]] = None
+        self.dirty = True
+
+    # ---------- Persistence ----------
+    @classmethod
+    def load(cls) -> "HistoryIndex":
+        """Load the persisted index (or start empty); call refresh() afterwards."""
+        idx = cls()
+        if storage.encrypted():
+            return idx
+        try:
+            with _index_path().open("rb") as f:
+                data = pickle.load(f)
+            if data.get("version") == INDEX_VERSION:
+                with idx._lock:
+                    for k in ("segments", "doc_seg", "doc_off", "terms", "events",
+                              "task_ids", "days", "dead"):
+                        setattr(idx, k, data[k])
+                    idx.dirty = False
+        except Exception:
+            pass
+        return idx
+
+    def save(self) -> None:
+        with self._lock:
+            if not self.dirty or storage.encrypted():
+                return  # the tokens would be plaintext
+            data = {
+                "version": INDEX_VERSION,
+                "segments": self.segments, "doc_seg": self.doc_seg, "doc_off": self.doc_off,
+                "terms": self.terms, "events": self.events, "task_ids": self.task_ids,
+                "days": self.days, "dead": self.dead,
+            }
+            blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            self.dirty = False
+        path = _index_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(blob)
+        tmp.replace(path)
+
+    # ---------- Building ----------
+    @metrics.timed("index.refresh")
+    def refresh(self) -> int:
+        """Index new lines in every segment. Returns the number of rows added."""
+        with self._lock:
+            files = {self._rel(p): p for p in storage.history_segments()}
+            known = {s.name: s for s in self.segments if s.name}
+            # A segment that vanished or shrank was moved (weekly archive) or rewritten.
+            # Slots are never reused (doc_seg points at them); gone segments keep an empty name.
+            for seg in self.segments:
+                if not seg.name:
+                    continue
+                path = files.get(seg.name)
+                if path is not None and path.stat().st_size >= seg.indexed and \
+                        seg.indexed and _signature(path, seg.indexed) == seg.sig:
+                    continue
+                if path is not None and not seg.indexed:
+                    continue
+                moved = self._find_moved(seg, files, known)
+                if moved is not None:
+                    known.pop(seg.name, None)
+                    seg.name = moved
+                    known[moved] = seg
+                else:
+                    self.dead.update(seg.docs)
+                    seg.docs = []
+                    seg.indexed = 0
+                    seg.sig = b""
+                    if path is None:
+                        known.pop(seg.name, None)
+                        seg.name = ""
+                    self.dirty = True
+
+            added = 0
+            for name, path in files.items():
+                seg = known.get(name)
+                if seg is None:
+                    seg = _Segment(name, b"")
+                    self.segments.append(seg)
+                    known[name] = seg
+                added += self._index_segment(self.segments.index(seg), seg, path)
+            if len(self.dead) > max(1000, len(self.doc_off) // 4):
+                self._rebuild()
+            return added
+
+    def _rel(self, p: Path) -> str:
+        try:
+            return str(p.relative_to(storage.APP_DIR))
+        except ValueError:
+            return str(p)
+
+    def _find_moved(self, seg: _Segment, files: Dict[str, Path], known: Dict[str, _Segment]) -> Optional[str]:
+        if not seg.indexed:
+            return None
+        for name, path in files.items():
+            if name == seg.name or (name in known and known[name].indexed):
+                continue
+            try:
+                if path.stat().st_size >= seg.indexed and _signature(path, seg.indexed) == seg.sig:
+                    return name
+            except OSError:
+                continue
+        return None
+
+    def _index_segment(self, slot: int, seg: _Segment, path: Path) -> int:
+        with path.open("rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size <= seg.indexed:
+                return 0
+            f.seek(seg.indexed)
+            data = f.read(size - seg.indexed)
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return 0
+        base = seg.indexed
+        pos = 0
+        added = 0
+        while pos < end:
+            nl = data.index(b"\n", pos)
+            line = data[pos:nl]
+            if line.strip():
+                try:
+                    row = storage.parse_line(line)
+                except Exception:
+                    row = None
+                if isinstance(row, dict):
+                    self._add_doc(slot, seg, base + pos, row)
+                    added += 1
+            pos = nl + 1
+        seg.indexed = base + end
+        if base < SIG_BYTES:
+            seg.sig = _signature(path, seg.indexed)
+        if added:
+            self._sorted_terms = None
+        self.dirty = True
+        return added
+
+    def _add_doc(self, slot: int, seg: _Segment, offset: int, row: dict) -> None:
+        doc = len(self.doc_off)
+        self.doc_seg.append(slot)
+        self.doc_off.append(offset)
+        seg.docs.append(doc)
+        for tok in set(tokenize(str(row.get("description", "")))):
+            self.terms.setdefault(tok, array("I")).append(doc)
+        self.events.setdefault(str(row.get("event", "")), array("I")).append(doc)
+        if row.get("task_id"):
+            self.task_ids.setdefault(str(row["task_id"]), array("I")).append(doc)
+        self.days.setdefault(_day_of(str(row.get("ts", ""))), array("I")).append(doc)
+
+    def _rebuild(self) -> None:
+        """Drop tombstoned docs by re-indexing every segment from scratch."""
+        self._reset()
+        for path in storage.history_segments():
+            seg = _Segment(self._rel(path), b"")
+            self.segments.append(seg)
+            self._index_segment(len(self.segments) - 1, seg, path)
+
+    # ---------- Querying ----------
+    @metrics.timed("index.search")
+    def search(self, query: str, limit: int = 500, today: Optional[date] = None) -> List[dict]:
+        """Rows matching `query`, newest first."""
+        with self._lock:
+            docs = self._match(parse_query(query, today or clock.today()))
+            hits = sorted(docs - self.dead if self.dead else docs, reverse=True)[:limit]
+            locs = [(self.segments[self.doc_seg[d]].name, self.doc_off[d]) for d in hits]
+        return _read_rows(locs)
+
+    def _match(self, q: "Query") -> Set[int]:
+        sets: List[Set[int]] = []
+        for term in q.terms:
+            sets.append(self._prefix_docs(term))
+        if q.events:
+            sets.append(set().union(*(self.events.get(e, ()) for e in q.events)))
+        if q.task:
+            sets.append(set().union(*(v for k, v in self.task_ids.items() if k.startswith(q.task))))
+        if q.day_from is not None or q.day_to is not None:
+            lo = q.day_from if q.day_from is not None else 0
+            hi = q.day_to if q.day_to is not None else date.max.toordinal()
+            sets.append(set().union(*(v for d, v in self.days.items() if lo <= d <= hi)))
+        if not sets:
+            return set(range(len(self.doc_off)))
+        sets.sort(key=len)
+        out = set(sets[0])
+        for s in sets[1:]:
+            out.intersection_update(s)
+            if not out:
+                break
+        return out
+
+    def _prefix_docs(self, term: str) -> Set[int]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.terms)
+        terms = self._sorted_terms
+        out: Set[int] = set()
+        i = bisect.bisect_left(terms, term)
+        while i < len(terms) and terms[i].startswith(term):
+            out.update(self.terms[terms[i]])
+            i += 1
+        return out
+
+    def __len__(self) -> int:
+        return len(self.doc_off) - len(self.dead)
+
+
+class Query:
+    __slots__ = ("terms", "events", "task", "day_from", "day_to")
+
+    def __init__(self) -> None:
+        self.terms: List[str] = []
+        self.events: Set[str] = set()
+        self.task: Optional[str] = None
+        self.day_from: Optional[int] = None
+        self.day_to: Optional[int] = None  # inclusive, like day_from
+
+
+def parse_query(text: str, today: date) -> Query:
+    q = Query()
+    words = text.lower().split()
+    i = 0
+    while i < len(words):
+        w = words[i]
+        if w.startswith("event:"):
+            q.events.add(w[6:])
+        elif w.startswith("task:"):
+            q.task = w[5:]
+        elif w == "today":
+            q.day_from = today.toordinal()
+        elif w == "yesterday":
+            q.day_from = q.day_to = (today - timedelta(days=1)).toordinal()
+        elif w == "since" and i + 1 < len(words):
+            try:
+                q.day_from = date.fromisoformat(words[i + 1]).toordinal()
+                i += 1
+            except ValueError:
+                q.terms += tokenize(w)
+        elif w == "last" and i + 2 < len(words) and words[i + 1].isdigit():
+            n = int(words[i + 1])
+            unit = words[i + 2].rstrip("s")
+            days = {"day": 1, "week": 7, "month": 30, "year": 365}.get(unit)
+            if days:
+                q.day_from = (today - timedelta(days=n * days - 1)).toordinal()
+                i += 2
+            else:
+                q.terms += tokenize(w)
+        elif w in EVENT_ALIASES:
+            q.events.update(EVENT_ALIASES[w])
+        else:
+            q.terms += tokenize(w)
+        i += 1
+    return q
+
+
+def _read_rows(locs: Iterable[Tuple[str, int]]) -> List[dict]:
+    out: List[dict] = []
+    handles: Dict[str, object] = {}
+    try:
+        for name, off in locs:
+            f = handles.get(name)
+            if f is None:
+                try:
+                    f = handles[name] = (storage.APP_DIR / name).open("rb")
+                except OSError:
+                    continue
+            f.seek(off)
+            try:
+                out.append(storage.parse_line(f.readline()))
+            except Exception:
+                continue
+    finally:
+        for f in handles.values():
+            f.close()
+    return out
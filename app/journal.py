@@ -0,0 +1,248 @@
+# =============================
+# File: app/journal.py
+# =============================
+"""
+Write-ahead journal for AppState operations (APP_DIR/journal.jsonl).
+
+One logical operation (complete 20 tasks, record a purchase, ...) touches up
+to three files: ledger.txt, history.jsonl and tasks.json (plus its record
+in oplog.jsonl). commit():
+
+  1. appends one intent record to the journal and fsyncs it; the record
+     holds the exact ledger/history bytes with the file offsets they go at,
+     and the full task list;
+  2. applies the changes (two appends and an atomic tasks.json replace),
+     without fsync;
+  3. appends a commit record (no fsync).
+
+Rows with a `key` already recorded in app.dedup are dropped before step 1;
+the keys of the rows that are written go into the record, per file, and
+are added to the index once the appends holding them have landed. If an
+append no longer lines up with its file (another process wrote there),
+commit() raises JournalConflict before touching tasks.json and leaves the
+record without a commit record.
+
+recover() runs from AppState.__init__. It re-applies every journaled record
+in order; each step is idempotent (a ledger/history range that already
+holds the journaled bytes is left alone, a torn tail is cut back and
+rewritten), then rewrites tasks.json from the newest record. Committed
+records are re-checked too: data-file fsyncs are deferred, so a commit
+record alone does not prove the data reached the disk.
+
+checkpoint() fsyncs the data files and empties the journal. It runs once
+the journal passes CHECKPOINT_BYTES, on shutdown, and before anything
+rewrites the files wholesale (compaction, archive, purge), so recovery
+never has to reason about offsets from before a rewrite.
+
+In an encrypted directory (app.encryption) the journaled ledger/history/
+oplog text is already sealed line by line, and the task list is stored
+sealed as one string.
+"""
+from __future__ import annotations
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .models import Task
+from . import storage
+from . import dedup
+from . import oplog
+from . import metrics
+
+CHECKPOINT_BYTES = 1024 * 1024
+
+
+class JournalConflict(RuntimeError):
+    """A journaled append found different bytes at its offset (another writer)."""
+
+
+def journal_path() -> Path:
+    return storage.APP_DIR / "journal.jsonl"
+
+
+def _size(path: Path) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _append_record(rec: Dict[str, Any], sync: bool) -> int:
+    data = (json.dumps(rec, separators=(",", ":")) + "\n").encode("utf-8")
+    with journal_path().open("ab") as f:
+        f.write(data)
+        f.flush()
+        if sync:
+            os.fsync(f.fileno())
+        return f.tell()
+
+
+def _apply_append(path: Path, at: int, data: bytes) -> bool:
+    """Make path[at:at+len(data)] equal data. False if the file no longer lines up."""
+    size = _size(path)
+    if size == at:
+        with path.open("ab") as f:
+            f.write(data)
+        return True
+    if size < at:
+        return False  # rewritten/truncated since; the record no longer applies
+    with path.open("r+b") as f:
+        f.seek(at)
+        have = f.read(len(data))
+        if have == data:
+            return True  # already applied
+        if not data.startswith(have) or size > at + len(have):
+            return False  # different bytes there (another writer)
+        f.seek(at)
+        f.write(data)  # torn write: finish it
+        f.truncate(at + len(data))
+    return True
+
+
+def _tasks_of(value: Any) -> List[Task]:
+    data = storage.parse_line(value) if isinstance(value, str) else value
+    return [Task.from_dict(d) for d in data]
+
+
+def _apply(rec: Dict[str, Any]) -> bool:
+    """Apply one record; False (and tasks.json left alone) if an append did not land."""
+    landed: Dict[str, bool] = {}
+    for name, path in (("ledger", storage.LEDGER_PATH), ("history", storage.HISTORY_PATH),
+                       ("oplog", oplog.log_path())):
+        if name in rec:
+            at, text = rec[name]
+            landed[name] = _apply_append(path, at, text.encode("utf-8"))
+    keys = rec.get("keys") or {}
+    # A key shared by a ledger and a history row counts only once both are in
+    failed = {k for name, ks in keys.items() if not landed.get(name) for k in ks}
+    written = [k for name, ks in keys.items() if landed.get(name) for k in ks if k not in failed]
+    if written:
+        dedup.index().add(written)
+    ok = all(landed.values())
+    if ok and "tasks" in rec:
+        storage.save_tasks(_tasks_of(rec["tasks"]), durable=False)
+    return ok
+
+
+def _drop_seen(rows: List[dict], seen: set) -> List[dict]:
+    """Rows whose key is new (and not repeated earlier in the batch); null keys are dropped."""
+    out, batch = [], set()
+    for r in rows:
+        key = r.get("key")
+        if key is None:
+            if "key" in r:
+                r = {k: v for k, v in r.items() if k != "key"}
+        elif key in seen or key in batch:
+            continue
+        else:
+            batch.add(key)
+        out.append(r)
+    return out
+
+
+@metrics.timed("journal.commit")
+def commit(kind: str, ledger: List[dict], history: List[dict], tasks: Optional[List[Task]],
+           log: Optional[Callable[[List[dict], List[dict]], Optional[dict]]] = None
+           ) -> Tuple[List[dict], List[dict]]:
+    """
+    Journal and apply one operation. Ledger entries get `ts` and running
+    `balance`, history rows get `ts`; returns both as written. Rows whose
+    `key` was written before (app.dedup) are dropped. `log(ledger, history)`
+    may return an app.oplog record for the rows as written; it is appended
+    to oplog.jsonl as part of the same journal record.
+    """
+    with storage.current().lock:
+        storage.ensure_dirs()
+        keys = [r["key"] for r in (*ledger, *history) if r.get("key")]
+        seen = dedup.index().seen(keys) if keys else set()
+        for _ in seen:
+            metrics.record("journal.duplicate_dropped", 0.0)
+        ledger, history = _drop_seen(ledger, seen), _drop_seen(history, seen)
+        ledger_rows = storage.format_ledger_entries(ledger) if ledger else []
+        history_rows = storage.format_history_entries(history) if history else []
+        rec: Dict[str, Any] = {"op": uuid.uuid4().hex, "kind": kind}
+        if ledger_rows:
+            rec["ledger"] = [_size(storage.LEDGER_PATH), storage.jsonl_text(ledger_rows)]
+        if history_rows:
+            rec["history"] = [_size(storage.HISTORY_PATH), storage.jsonl_text(history_rows)]
+        if tasks is not None:
+            data = [t.to_dict() for t in tasks]
+            rec["tasks"] = storage.dumps_line(data) if storage.encrypted() else data
+        if len(rec) == 2:
+            return [], []
+        entry = log(ledger_rows, history_rows) if log is not None else None
+        if entry is not None:
+            rec["oplog"] = [_size(oplog.log_path()), storage.dumps_line(entry, separators=(",", ":")) + "\n"]
+        new_keys = {name: sorted({r["key"] for r in rows if r.get("key")})
+                    for name, rows in (("ledger", ledger_rows), ("history", history_rows))}
+        new_keys = {name: ks for name, ks in new_keys.items() if ks}
+        if new_keys:
+            rec["keys"] = new_keys
+        _append_record(rec, sync=True)
+        if not _apply(rec):
+            raise JournalConflict(f"{kind}: ledger or history changed underneath the write; "
+                                  "reload and try again")
+        n = sum(len(rec[k][1]) for k in ("ledger", "history") if k in rec)
+        metrics.add_bytes("journal.commit", written=n)
+        if _append_record({"op": rec["op"], "commit": True}, sync=False) > CHECKPOINT_BYTES:
+            checkpoint()
+        return ledger_rows, history_rows
+
+
+@metrics.timed("journal.checkpoint")
+def checkpoint() -> None:
+    """fsync ledger, history and tasks.json, then empty the journal."""
+    with storage.current().lock:
+        path = journal_path()
+        if not path.exists():
+            return
+        idx = dedup.index()
+        for p in (storage.LEDGER_PATH, storage.HISTORY_PATH, storage.TASKS_PATH,
+                  idx.keys_path, oplog.log_path()):
+            storage.fsync_path(p)
+        idx.save()
+        storage.fsync_path(storage.APP_DIR)
+        path.unlink()
+        oplog.index().trim()  # offsets in the journal are no longer needed
+
+
+@metrics.timed("journal.recover")
+def recover() -> Dict[str, int]:
+    """
+    Re-apply the journal after an unclean shutdown, then checkpoint.
+    Returns {"replayed": records re-checked, "incomplete": without a commit
+    record, "skipped": records whose files had changed underneath them}.
+    """
+    with storage.current().lock:
+        path = journal_path()
+        try:
+            raw = path.read_bytes()
+        except OSError:
+            return {"replayed": 0, "incomplete": 0, "skipped": 0}
+        intents: List[Dict[str, Any]] = []
+        done = set()
+        for line in raw.split(b"\n"):
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue  # torn last record: its changes were never applied
+            if rec.get("commit"):
+                done.add(rec.get("op"))
+            elif "op" in rec:
+                intents.append(rec)
+        skipped = 0
+        last_tasks = None
+        for rec in intents:
+            tasks = rec.pop("tasks", None)
+            if tasks is not None:
+                last_tasks = tasks
+            if not _apply(rec):
+                skipped += 1
+        if last_tasks is not None:
+            storage.save_tasks(_tasks_of(last_tasks), durable=False)
+        checkpoint()
+        return {"replayed": len(intents),
+                "incomplete": sum(1 for r in intents if r["op"] not in done),
+                "skipped": skipped}
@@ -0,0 +1,147 @@
+# =============================
+# File: app/linescan.py
+# =============================
+"""
+mmap-backed line scanner for the JSONL data files (ledger, history).
+
+    with LineScanner(LEDGER_PATH) as sc:
+        last = sc.last_line()
+        for off, line in sc.lines():          # oldest first
+            ...
+        for off, line in sc.reverse():        # newest first
+            ...
+
+Newlines are found over the mapped bytes and only the lines (or, for
+forward scans, newline-aligned blocks) being iterated are copied out, so a
+reader never holds the whole file as a str plus a list of lines. Empty and
+small files (< MMAP_MIN_BYTES) are read into memory instead of mapped.
+The scanner sees the file as it was when opened; later appends are ignored.
+"""
+from __future__ import annotations
+import mmap
+import os
+from typing import Iterator, List, Optional, Tuple
+
+MMAP_MIN_BYTES = 64 * 1024
+CHUNK_BYTES = 1024 * 1024
+
+
+class LineScanner:
+    def __init__(self, path: os.PathLike | str) -> None:
+        self._f = open(path, "rb")
+        self._mm: Optional[mmap.mmap] = None
+        try:
+            self.size = os.fstat(self._f.fileno()).st_size
+            if self.size >= MMAP_MIN_BYTES:
+                self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.buf = self._mm
+            else:
+                self.buf = self._f.read(self.size)
+                self.size = len(self.buf)
+        except Exception:
+            self._f.close()
+            raise
+
+    def __enter__(self) -> "LineScanner":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # Unmap before the caller replaces the file (required on Windows)
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self.buf = b""
+        self._f.close()
+
+    @property
+    def mapped(self) -> bool:
+        return self._mm is not None
+
+    # ---------- Offsets ----------
+    def line_start(self, offset: int) -> int:
+        """Offset of the first line starting at or after `offset` (newline-aligned split point)."""
+        if offset <= 0:
+            return 0
+        if offset >= self.size:
+            return self.size
+        nl = self.buf.rfind(b"\n", 0, offset)
+        if nl == offset - 1:
+            return offset
+        nl = self.buf.find(b"\n", offset)
+        return self.size if nl < 0 else nl + 1
+
+    def complete_end(self) -> int:
+        """Offset just past the last newline (excludes a partially written line)."""
+        return self.buf.rfind(b"\n") + 1
+
+    def slice(self, start: int, end: int) -> bytes:
+        return self.buf[max(0, start):min(end, self.size)]
+
+    # ---------- Iteration ----------
+    def lines(self, start: int = 0, end: Optional[int] = None,
+              decode: bool = False) -> Iterator[Tuple[int, bytes | str]]:
+        """
+        (offset, line) for non-blank lines starting in [start, end), oldest
+        first. Lines are cut from newline-aligned blocks of about CHUNK_BYTES;
+        decode=True yields str (one decode per block, cheaper for json.loads).
+        """
+        buf = self.buf
+        end = self.size if end is None else min(end, self.size)
+        pos = self.line_start(start)
+        while pos < end:
+            target = pos + CHUNK_BYTES
+            if target >= end:
+                cut = self.line_start(end)
+            else:
+                cut = buf.rfind(b"\n", pos, target) + 1
+                if cut <= pos:  # one line longer than a block
+                    cut = self.line_start(target)
+            block = buf[pos:cut]
+            if decode:
+                parts = block.decode("utf-8").split("\n")
+                ascii_only = block.isascii()
+            else:
+                parts = block.split(b"\n")
+                ascii_only = True
+            off = pos
+            for line in parts:
+                if line.strip():
+                    yield off, line
+                off += (len(line) if ascii_only else len(line.encode("utf-8"))) + 1
+            pos = cut
+
+    def reverse(self, end: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+        """(offset, line) for non-blank lines ending at or before `end`, newest first."""
+        buf = self.buf
+        stop = self.size if end is None else max(0, min(end, self.size))
+        while stop > 0:
+            nl = buf.rfind(b"\n", 0, stop)
+            if nl == stop - 1:
+                # stop sits just after a newline: the line is buf[prev+1:nl]
+                stop = nl
+                nl = buf.rfind(b"\n", 0, stop)
+            start = nl + 1
+            line = buf[start:stop]
+            if line.strip():
+                yield start, line
+            stop = nl if nl >= 0 else 0
+
+    def tail(self, n: int) -> List[bytes]:
+        """The last `n` non-blank lines, oldest first."""
+        out: List[bytes] = []
+        if n <= 0:
+            return out
+        for _, line in self.reverse():
+            out.append(line)
+            if len(out) >= n:
+                break
+        out.reverse()
+        return out
+
+    def last_line(self) -> bytes:
+        for _, line in self.reverse():
+            return line
+        return b""
@@ -1,104 +1,162 @@
 from __future__ import annotations
+import time
+_T0 = time.perf_counter()  # process-relative origin for --profile-startup
+
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 from datetime import datetime, timedelta
 
-import platform, subprocess, os  # already suggested before
+import os, sys, threading
 from pathlib import Path
-from datetime import datetime, timedelta
 from app.app_state import AppState
-from app import storage
+from app import storage, metrics, oplog, clock
 from app.notifications import Notifier
-import csv 
-from app.tray import TrayManager
-import threading
-import sys, socket, threading, ctypes, os
-from ctypes import wintypes
-
-# ---- single-instance primitives (Windows) ----
-MUTEX_NAME = "Global\\TodoGambleSingletonMutex"
-ERROR_ALREADY_EXISTS = 183
-_singleton_mutex = None
+from app.events import TkEventPump, TaskAdded, TaskRemoved, LedgerAppended, HistoryAppended, SettingsChanged
+
+# csv, subprocess, platform, the IPC channel (socket/selectors) and the tray
+# backend (pystray/PIL) are imported where they are used so they stay off the
+# startup path.
+
+
+class StartupProfiler:
+    """Collects startup stage timings; printed to stderr with --profile-startup."""
+
+    def __init__(self, enabled: bool = False, t0: float | None = None) -> None:
+        self.enabled = enabled
+        self._t0 = _T0 if t0 is None else t0
+        self._rows: list[tuple[str, float, float]] = []  # (name, at_ms, took_ms)
+        self._reported = False
+
+    def mark(self, name: str) -> None:
+        """Record a milestone (time since process start)."""
+        if self.enabled:
+            self._rows.append((name, (time.perf_counter() - self._t0) * 1000, 0.0))
+
+    def stage(self, name: str) -> "_Stage":
+        return _Stage(self, name)
+
+    def report(self) -> None:
+        if not self.enabled or self._reported:
+            return
+        self._reported = True
+        out = ["[startup] stage                          at(ms)  took(ms)"]
+        for name, at, took in sorted(self._rows, key=lambda r: r[1]):
+            took_s = f"{took:9.1f}" if took else " " * 9
+            out.append(f"[startup] {name:<30} {at:8.1f} {took_s}")
+        print("\n".join(out), file=sys.stderr, flush=True)
+
+
+class _Stage:
+    def __init__(self, prof: StartupProfiler, name: str) -> None:
+        self._prof = prof
+        self._name = name
+
+    def __enter__(self) -> "_Stage":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        p = self._prof
+        if p.enabled:
+            end = time.perf_counter()
+            p._rows.append((self._name, (end - p._t0) * 1000, (end - self._start) * 1000))
+
+
 REFRESH_MS = 60 * 1000
-def _acquire_single_instance() -> bool:
-    """Create a named mutex; return False if it already exists."""
-    global _singleton_mutex
-    k32 = ctypes.windll.kernel32
-    k32.CreateMutexW.argtypes = [wintypes.LPVOID, wintypes.BOOL, wintypes.LPCWSTR]
-    k32.CreateMutexW.restype = wintypes.HANDLE
-    handle = k32.CreateMutexW(None, False, MUTEX_NAME)
-    if not handle:
-        return True  # best-effort: if we can’t tell, proceed as primary
-    _singleton_mutex = handle
-    # If the mutex already existed, GetLastError() returns 183
-    last = k32.GetLastError()
-    return last != ERROR_ALREADY_EXISTS
-
-def _release_single_instance() -> None:
-    """Release the named mutex if we own it."""
-    try:
-        if _singleton_mutex:
-            ctypes.windll.kernel32.CloseHandle(_singleton_mutex)
-    except Exception:
-        pass
+SETTINGS_POLL_MS = 2000  # settings.json edits made elsewhere show up within this
+HISTORY_ROWS = 500  # rows shown in the History tab
+TRAY_UPDATE_MS = 1000  # tray tooltip/menu updates are coalesced to at most one per second
+TRAY_NEXT_TASKS = 3  # Complete items in the tray menu
 
 
-SINGLE_INSTANCE_PORT = 51337
-_listener_sock = None
+def _call_on_tk(app: "App", fn):
+    """Run fn on the Tk thread; returns a Future the IPC loop can wait on."""
+    from concurrent.futures import Future
+    fut: Future = Future()
 
-def _start_instance_server(app_ref: "App") -> None:
-    """Listen for SHOW commands from secondary launches."""
-    global _listener_sock
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind(("127.0.0.1", SINGLE_INSTANCE_PORT))
-        s.listen(1)
-        _listener_sock = s
-    except OSError:
-        return  # don’t crash if port not available
-
-    while True:
-        try:
-            conn, _ = s.accept()
-        except OSError:
-            break
+    def run() -> None:
+        if not fut.set_running_or_notify_cancel():
+            return
         try:
-            cmd = conn.recv(32)
-            if cmd.startswith(b"SHOW"):
-                app_ref.after(0, app_ref._show_from_tray)
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
+            fut.set_result(fn())
+        except Exception as e:
+            fut.set_exception(e)
+    app.after(0, run)
+    return fut
 
-def _notify_primary_instance() -> None:
-    """Tell the running instance to SHOW itself."""
-    try:
-        s = socket.create_connection(("127.0.0.1", SINGLE_INSTANCE_PORT), timeout=0.5)
-        s.sendall(b"SHOW")
-        s.close()
-    except Exception:
-        pass
 
-class App(tk.Tk):
-    def __init__(self) -> None:
-        super().__init__()
-        self.title("Todo Gamble")
-        self.geometry("840x560")
-        self.minsize(760, 480)
-        self.state = AppState()
+def _install_command_handlers(server, app: "App") -> None:
+    """Map the IPC command set onto App actions (all executed on the Tk thread)."""
+    def add_task(args: dict):
+        return _call_on_tk(app, lambda: app._add_task_remote(
+            str(args.get("description", "")), float(args["buy_in"]), float(args["payout"])))
+
+    def complete(args: dict):
+        return _call_on_tk(app, lambda: app._complete_task_remote(str(args["task_id"])))
+
+    def quit_(args: dict):
+        # Reply first: _quit_app stops this server, and stop() lets the IPC loop
+        # finish sending what was queued before it closes the sockets
+        app.after(0, app._quit_app)
+        return None
+
+    server.register("show", lambda args: _call_on_tk(app, app._show_from_tray))
+    server.register("add-task", add_task)
+    server.register("complete", complete)
+    server.register("balance", lambda args: _call_on_tk(app, lambda: round(app.state.balance, 2)))
+    server.register("quit", quit_)
+    server.register("profile", lambda args: _call_on_tk(app, lambda: app.start_profile(
+        seconds=args.get("seconds"), ticks=args.get("ticks"))))
+
+    def settings(args: dict):
+        # {"set": {"creation_window.start": "09:00", ...}} validates and saves first
+        changes = args.get("set") or {}
+        if changes:
+            return _call_on_tk(app, lambda: app.state.update_settings(changes).to_dict())
+        return _call_on_tk(app, lambda: app.state.settings.to_dict())
+
+    server.register("settings", settings)
+
+class _UiApiBackend:
+    """HTTP API writes, applied to the GUI's AppState on the Tk thread."""
+
+    def __init__(self, app: "App") -> None:
+        self.app = app
+
+    # The UI follows along through AppState change events.
+    def add_tasks(self, specs):
+        return self.app.state.add_tasks(specs)
 
+    def complete_task(self, task_id: str) -> None:
+        self.app.state.complete_task(task_id)
 
-        # Notifications & tray
+    def delete_task(self, task_id: str) -> dict:
+        return self.app.state.delete_task(task_id)
+
+    def record_purchase(self, description: str, amount, key=None) -> None:
+        self.app.state.record_purchase(description, amount, key=key)
+
+
+class App(tk.Tk):
+    def __init__(self, profiler: StartupProfiler | None = None) -> None:
+        self.profiler = profiler or StartupProfiler()
+        self.profiler.mark("imports done")
+        with self.profiler.stage("tk root"):
+            super().__init__()
+            self.title("Todo Gamble")
+            self.geometry("840x560")
+            self.minsize(760, 480)
+        with self.profiler.stage("load state"):
+            self._unlock_data()
+            self.state = AppState()
+
+        # Notifications & tray (tray backend is loaded after the first frame)
         self.notifier = Notifier()
-        app_root = Path(__file__).resolve().parents[0]
-        self.tray = TrayManager(
-            app_root=app_root,
-            on_show=self._show_from_tray,
-            on_quit=self._quit_app
-        )
+        self.tray = None
+        self._tray_job = None  # pending tray summary push (after id)
+        self.ipc = None  # CommandServer, attached by main()
+        self.api = None  # ApiServer when started with --api-port
+        self._quitting = False
 
         # Remember what we’ve notified today to avoid duplicates
         self._notified_day_key: str | None = None  # e.g., "2025-08-13"
@@ -107,22 +165,193 @@ class App(tk.Tk):
 
         # override close to hide to tray
         self.protocol("WM_DELETE_WINDOW", self._hide_to_tray)
+        # Hidden Diagnostics window (metrics)
+        self._diagnostics = None
+        self._recurring_win = None
+        self._capture = None  # active profiling.ProfileCapture
+        self.bind_all("<Control-Shift-D>", lambda e: self._open_diagnostics())
+        self.bind_all("<Control-Shift-d>", lambda e: self._open_diagnostics())
+        self.bind_all("<Control-z>", lambda e: self._on_undo(e))
+        self.bind_all("<Control-y>", lambda e: self._on_redo(e))
+        self.bind_all("<Control-Shift-Z>", lambda e: self._on_redo(e))
 
 
         self._history_row_data = {}  # iid -> dict from history.jsonl
+        self._history_loaded = False  # rows arrive after the first frame
         self._history_selected_iid = None
-        self._build_menu()
-        self._build_header()
-        self._build_tabs()
-        self._refresh_all()
+        # Search index over all retained history; built off the Tk thread
+        self.history_index = None
+        self._index_refreshing = False
+        self._index_dirty = False
+        self._search_job = None
+        with self.profiler.stage("build ui"):
+            self._build_menu()
+            self._build_header()
+            self._build_tabs()
+        with self.profiler.stage("render today"):
+            # History rows are loaded after the first frame (see _start_deferred)
+            self._refresh_table()
+            self._refresh_balance()
+            self._refresh_window_label()
+            self._refresh_add_enabled()
+        # Incremental UI updates from state changes, batched per idle cycle
+        self._history_seq = 0
+        self._event_pump = TkEventPump(self, self.state.events, self._apply_events)
         self._tick_worker_running = False
 
         # Periodic checks: window status + forfeits + Monday purge
         self.after(2000, self._tick)
-        self._last_tick: datetime = datetime.now()
+        self._last_tick: datetime = clock.now()
+        self._notify_plan = None  # (day, (start, end, pre_end)); see _notification_plan
+        self.after(SETTINGS_POLL_MS, self._poll_settings)
+
+        # Staged startup: history + tray once the window has been drawn
+        self._deferred_pending = {"history", "tray"}
+        self.after_idle(self._start_deferred)
+
+    # ---------- Staged startup ----------
+    def _start_deferred(self) -> None:
+        self.profiler.mark("first frame")
+        spec = os.environ.get("TODO_GAMBLE_PROFILE")
+        if spec:
+            try:
+                from app.profiling import parse_spec
+                self.start_profile(**parse_spec(spec))
+            except Exception as e:
+                print(f"TODO_GAMBLE_PROFILE ignored: {e}", file=sys.stderr)
+        threading.Thread(target=self._load_history_worker, daemon=True).start()
+        threading.Thread(target=self._load_tray_worker, daemon=True).start()
+        threading.Thread(target=self._build_index_worker, daemon=True).start()
+
+    def _load_history_worker(self) -> None:
+        """Read history off the Tk thread, then render it on the Tk thread."""
+        with self.profiler.stage("read history"):
+            try:
+                rows = storage.read_history(max_lines=HISTORY_ROWS)
+            except Exception:
+                rows = []
+
+        def render() -> None:
+            with self.profiler.stage("render history"):
+                self._render_history_rows(rows)
+            self._deferred_done("history")
+        self.after(0, render)
+
+    def _build_index_worker(self) -> None:
+        """Load the persisted history index and catch it up with the files."""
+        from app.history_index import HistoryIndex
+        try:
+            idx = HistoryIndex.load()
+            idx.refresh()
+            idx.save()
+        except Exception:
+            return
+        self.history_index = idx
+        if self._history_query():
+            self.after(0, self._run_history_search)
 
-        #tray
-        self.tray.start()
+    def _refresh_index(self) -> None:
+        """Index newly appended history in the background (coalesced)."""
+        if self.history_index is None:
+            return
+        if self._index_refreshing:
+            self._index_dirty = True
+            return
+        self._index_refreshing = True
+        self._index_dirty = False
+
+        def work() -> None:
+            try:
+                self.history_index.refresh()
+            except Exception:
+                pass
+
+            def done() -> None:
+                self._index_refreshing = False
+                if self._index_dirty:
+                    self._refresh_index()
+                elif self._history_query():
+                    self._run_history_search()
+            self.after(0, done)
+        threading.Thread(target=work, daemon=True).start()
+
+    def _load_tray_worker(self) -> None:
+        """Start the tray icon; app.tray imports pystray/PIL on its own thread."""
+        tray = None
+        with self.profiler.stage("load tray"):
+            try:
+                from app.tray import TrayManager
+                tray = TrayManager(
+                    app_root=Path(__file__).resolve().parents[0],
+                    on_show=lambda: self.after(0, self._show_from_tray),
+                    on_quit=lambda: self.after(0, self._quit_app),
+                    on_error=lambda: self.after(0, self._on_tray_unavailable),
+                    on_complete=lambda task_id: self.after(0, lambda: self._complete_from_tray(task_id)),
+                )
+                if not self._quitting:
+                    tray.start()
+            except Exception:
+                tray = None
+        self.tray = tray
+        self.after(0, lambda: self._deferred_done("tray"))
+        self.after(0, self._schedule_tray_update)
+
+    # ---------- Tray summary ----------
+    def _schedule_tray_update(self) -> None:
+        """Push a fresh summary to the tray soon (bursts of changes coalesce)."""
+        if self.tray is None or self._tray_job is not None:
+            return
+        self._tray_job = self.after(TRAY_UPDATE_MS, self._push_tray_update)
+
+    def _push_tray_update(self) -> None:
+        self._tray_job = None
+        if self.tray is not None:
+            self.tray.update(self._tray_summary())
+
+    def _tray_summary(self):
+        import heapq
+        from app.tray import TraySummary
+        tasks = self.state.tasks
+        soonest = heapq.nsmallest(TRAY_NEXT_TASKS, tasks, key=lambda t: t.due_at or "")
+        return TraySummary(
+            balance=round(self.state.balance, 2),
+            pending=len(tasks),
+            window=self._window_countdown(),
+            next_tasks=tuple((t.id, t.description, t.payout) for t in soonest),
+        )
+
+    def _window_countdown(self) -> str:
+        now = clock.now()
+        start, end = self.state.window_today()
+        if now < start:
+            return f"window opens {start.strftime('%I:%M %p').lstrip('0')}"
+        if now >= end:
+            return "window closed"
+        mins = int((end - now).total_seconds() // 60)
+        return f"window ends in {mins // 60}h {mins % 60:02d}m" if mins >= 60 else f"window ends in {mins}m"
+
+    def _complete_from_tray(self, task_id: str) -> None:
+        try:
+            done = self.state.complete_tasks([task_id])
+        except KeyError:
+            return  # completed or forfeited since the menu was built
+        except Exception as e:
+            self.notifier.notify("Complete failed", str(e))
+            return
+        # Rows, balance and the tray follow via state events
+        self.notifier.notify("Task completed", f"{done[0].description}: +${done[0].payout:.2f}")
+
+    def _on_tray_unavailable(self) -> None:
+        # No tray backend on this system; closing minimizes instead
+        self.tray = None
+        if self.wm_state() == "withdrawn":
+            self._show_from_tray()
+
+    def _deferred_done(self, name: str) -> None:
+        self._deferred_pending.discard(name)
+        if not self._deferred_pending:
+            self.profiler.mark("startup complete")
+            self.profiler.report()
 
     # ---------- UI ----------
     def _build_menu(self) -> None:
@@ -130,6 +359,9 @@ class App(tk.Tk):
         filemenu = tk.Menu(menubar, tearoff=0)
 
         filemenu.add_command(label="Record Purchase…", command=self._on_record_purchase)
+        filemenu.add_command(label="Import Tasks…", command=self._on_import_tasks)
+        filemenu.add_command(label="Sync", command=self._on_sync)
+        filemenu.add_command(label="Sync With…", command=lambda: self._on_sync(choose=True))
         filemenu.add_command(label="Open Data Folder", command=self._open_data_folder) 
         filemenu.add_command(label="Minimize to Tray", command=self._hide_to_tray)
         filemenu.add_command(label="Exit", command=self._quit_app)
@@ -137,12 +369,20 @@ class App(tk.Tk):
         filemenu.add_command(label="Purge Data…", command=self._on_purge_data)          # new
         filemenu.add_command(label="Compact Ledger…", command=self._on_compact_ledger)  # new
         filemenu.add_command(label="Send Test Notification", command=self._send_test_notification)
+        filemenu.add_command(label="Capture Profile…", command=self._on_capture_profile)
         filemenu.add_separator()
 
         menubar.add_cascade(label="File", menu=filemenu)
 
+        editmenu = tk.Menu(menubar, tearoff=0)
+        editmenu.add_command(label="Undo", accelerator="Ctrl+Z", command=self._on_undo)
+        editmenu.add_command(label="Redo", accelerator="Ctrl+Y", command=self._on_redo)
+        menubar.add_cascade(label="Edit", menu=editmenu)
+
         settingsmenu = tk.Menu(menubar, tearoff=0)
         settingsmenu.add_command(label="Set Creation Window", command=self._on_set_window)
+        settingsmenu.add_command(label="Recurring Tasks…", command=self._open_recurring)
+        settingsmenu.add_command(label="Encryption…", command=self._on_encryption)
         menubar.add_cascade(label="Settings", menu=settingsmenu)
         self.config(menu=menubar)
 
@@ -173,6 +413,17 @@ class App(tk.Tk):
         self.nb.add(self.history, text="History")
         self._build_history(self.history)
 
+        # Chart tab (data is loaded the first time it is shown)
+        from app.chart import ChartView
+        self.chart = ChartView(self.nb)
+        self.nb.add(self.chart, text="Chart")
+        self.nb.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+
+    def _on_tab_changed(self, event=None) -> None:
+        if self.nb.select() == str(self.chart):
+            self.chart.ensure_loaded()
+            self.chart.redraw()  # rows may have arrived while hidden
+
     def _build_today(self, parent: ttk.Frame) -> None:
         form = ttk.Labelframe(parent, text="Create Task", padding=(12, 10))
         form.pack(fill=tk.X, padx=12, pady=8)
@@ -195,7 +446,8 @@ class App(tk.Tk):
         table_frame.pack(fill=tk.BOTH, expand=True)
 
         cols = ("description", "buy_in", "payout")
-        self.tree = ttk.Treeview(table_frame, columns=cols, show="headings", height=12)
+        self.tree = ttk.Treeview(table_frame, columns=cols, show="headings", height=12,
+                                 selectmode="extended")  # multi-select for bulk complete/delete
         self.tree.heading("description", text="Description")
         self.tree.heading("buy_in", text="Buy-in")
         self.tree.heading("payout", text="Payout")
@@ -226,6 +478,12 @@ class App(tk.Tk):
         )
         self.history_filter.pack(side=tk.LEFT, padx=(6, 12))
         self.history_filter.bind("<<ComboboxSelected>>", lambda e: self._refresh_history_table())
+        ttk.Label(top, text="Search:").pack(side=tk.LEFT)
+        self.history_search_var = tk.StringVar()
+        search = ttk.Entry(top, textvariable=self.history_search_var, width=28)
+        search.pack(side=tk.LEFT, padx=(6, 12))
+        search.bind("<KeyRelease>", lambda e: self._schedule_history_search())
+        search.bind("<Escape>", lambda e: (self.history_search_var.set(""), self._schedule_history_search()))
 
         # Buttons
         ttk.Button(top, text="Open Data Folder", command=self._open_data_folder).pack(side=tk.LEFT)
@@ -262,17 +520,15 @@ class App(tk.Tk):
 
     # ---------- Events ----------
     def _on_set_window(self) -> None:
-        cur = self.state.settings.get("creation_window", {"start": "11:00", "end": "12:00"})
-        start = simpledialog.askstring("Creation window", "Start time (HH:MM)", initialvalue=cur["start"], parent=self)
+        cur = self.state.settings.creation_window
+        start = simpledialog.askstring("Creation window", "Start time (HH:MM)", initialvalue=cur.start, parent=self)
         if start is None:
             return
-        end = simpledialog.askstring("Creation window", "End time (HH:MM)", initialvalue=cur["end"], parent=self)
+        end = simpledialog.askstring("Creation window", "End time (HH:MM)", initialvalue=cur.end, parent=self)
         if end is None:
             return
         try:
-            self.state.set_window_times(start, end)
-            self._refresh_window_label()
-            self._refresh_add_enabled()
+            self.state.set_window_times(start, end)  # the label and button follow SettingsChanged
         except Exception as e:
             messagebox.showerror("Invalid time", str(e))
 
@@ -289,7 +545,7 @@ class App(tk.Tk):
             return
 
         try:
-            t = self.state.add_task(desc, buyin, payout)
+            self.state.add_task(desc, buyin, payout)
         except PermissionError as e:
             messagebox.showwarning("Outside creation window", str(e))
             return
@@ -300,52 +556,177 @@ class App(tk.Tk):
         self.desc_var.set("")
         self.buyin_var.set("")
         self.payout_var.set("")
-        self._insert_task_row(t)
 
     def _on_complete(self) -> None:
         sel = self.tree.selection()
         if not sel:
             messagebox.showinfo("Nothing selected", "Select a task to mark complete.")
             return
-        item_id = sel[0]
         try:
-            self.state.complete_task(item_id)
+            # One batch: one ledger/history/tasks write for the whole selection
+            self.state.complete_tasks(sel)
         except KeyError:
             messagebox.showerror("Error", "Could not find the selected task.")
             return
-        self.tree.delete(item_id)
-        self._refresh_balance()
-        self._refresh_history_table()
+
+    def _add_task_remote(self, description: str, buy_in: float, payout: float) -> dict:
+        return self.state.add_task(description, buy_in, payout).to_dict()
+
+    def _complete_task_remote(self, task_id: str) -> float:
+        self.state.complete_task(task_id)
+        return round(self.state.balance, 2)
+
     def _on_delete_task(self) -> None:
         sel = self.tree.selection()
         if not sel:
             messagebox.showinfo("Nothing selected", "Select a task to delete.")
             return
-        item_id = sel[0]
         # Confirm
-        if not messagebox.askyesno("Delete Task", "Delete this task?\n\nNo payout will be earned."):
+        what = "this task" if len(sel) == 1 else f"these {len(sel)} tasks"
+        if not messagebox.askyesno("Delete Task", f"Delete {what}?\n\nNo payout will be earned."):
             return
         try:
-            result = self.state.delete_task(item_id)
+            results = self.state.delete_tasks(sel)
         except KeyError as e:
-            messagebox.showerror("Error", str(e))
+            messagebox.showerror("Error", e.args[0] if e.args else str(e))
             return
-        # Remove row and refresh
-        self.tree.delete(item_id)
-        if result.get("penalized"):
-            self._refresh_balance()
-            self._refresh_history_table()
-            message = f"Task deleted with penalty: ${abs(result['penalty']):.2f}"
+        # Rows, balance and history update through state events
+        penalized = [r for r in results if r.get("penalized")]
+        penalty = abs(sum(r["penalty"] for r in penalized))
+        if len(results) == 1:
+            message = (f"Task deleted with penalty: ${penalty:.2f}" if penalized
+                       else "Task deleted (no penalty).")
+        elif penalized:
+            message = f"{len(results)} tasks deleted; {len(penalized)} with penalty: ${penalty:.2f}"
         else:
-            self._refresh_history_table()
-            message = "Task deleted (no penalty)."
+            message = f"{len(results)} tasks deleted (no penalty)."
         messagebox.showinfo("Deleted", message)
 
+    def _on_import_tasks(self) -> None:
+        path = filedialog.askopenfilename(
+            title="Import Tasks",
+            filetypes=[("CSV or JSON", "*.csv *.json *.jsonl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        fmt = {".csv": "csv", ".json": "json", ".jsonl": "json"}.get(os.path.splitext(path)[1].lower())
+        try:
+            with open(path, encoding="utf-8-sig") as f:
+                specs = storage.parse_task_specs(f.read(), fmt)
+            # Validates every row before writing anything
+            tasks = self.state.add_tasks(specs)
+        except PermissionError as e:
+            messagebox.showwarning("Outside creation window", str(e))
+            return
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Import failed", str(e))
+            return
+        messagebox.showinfo("Imported", f"Imported {len(tasks)} task(s).")
+
+    def _unlock_data(self) -> None:
+        """Ask for the passphrase of an encrypted data folder (app.encryption); quit on cancel."""
+        from app import encryption
+        ctx = storage.current()
+        prompt = "This data folder is encrypted.\nPassphrase:"
+        while True:
+            try:
+                encryption.ensure_unlocked(ctx, ask=lambda: simpledialog.askstring(
+                    "Todo Gamble", prompt, show="*", parent=self))
+                return
+            except encryption.KeyFileMissing as e:
+                messagebox.showerror("Todo Gamble", str(e))
+                raise SystemExit(1)
+            except encryption.LockedError as e:
+                if str(e) != "Wrong passphrase.":
+                    raise SystemExit(0)  # cancelled
+                prompt = "Wrong passphrase, try again:"
+            except RuntimeError as e:
+                messagebox.showerror("Todo Gamble", str(e))
+                raise SystemExit(1)
+
+    def _on_encryption(self) -> None:
+        from app import encryption
+        if not encryption.available():
+            messagebox.showinfo("Encryption", "Install the 'cryptography' package to encrypt your data.")
+            return
+        encrypted = encryption.is_encrypted()
+        question = ("Your data is encrypted. Decrypt it back to plain files?" if encrypted else
+                    "Encrypt tasks, ledger and history with a passphrase?\n"
+                    "Without the passphrase the data can't be recovered.")
+        if not messagebox.askyesno("Encryption", question):
+            return
+        passphrase = simpledialog.askstring("Encryption", "Passphrase:", show="*", parent=self)
+        if not passphrase:
+            return
+        if not encrypted and simpledialog.askstring("Encryption", "Repeat the passphrase:",
+                                                    show="*", parent=self) != passphrase:
+            messagebox.showerror("Encryption", "The passphrases don't match.")
+            return
+        try:
+            # Holds the journal lock: no write lands while the files are rewritten
+            (encryption.disable if encrypted else encryption.enable)(passphrase)
+        except (PermissionError, ValueError, OSError) as e:
+            messagebox.showerror("Encryption", str(e))
+            return
+        self.chart.reload()
+        messagebox.showinfo("Encryption", "Data decrypted." if encrypted else "Data encrypted.")
+
+    def _on_sync(self, choose: bool = False) -> None:
+        """Sync with the remembered shared folder (app.sync); ask for one the first time."""
+        folder = self.state.settings.sync_dir
+        if choose or not folder or not os.path.isdir(folder):
+            folder = filedialog.askdirectory(title="Sync folder (shared with your other machines)",
+                                             initialdir=folder or None, mustexist=True)
+            if not folder:
+                return
+            self.state.update_settings({"sync_dir": folder})
+
+        self._start_sync(folder)
+
+    def _start_sync(self, folder: str, new_passphrase: str | None = None) -> None:
+        from app import sync
+
+        def ask() -> str | None:
+            # Called on the sync thread; the dialog runs on the Tk thread
+            return _call_on_tk(self, lambda: simpledialog.askstring(
+                "Sync", "Sync passphrase (shared by your devices):", show="*", parent=self)).result()
+
+        def work() -> None:
+            try:
+                report = sync.sync(self.state, folder, ask=ask, new_passphrase=new_passphrase)
+            except sync.SyncKeyNeeded:
+                self.after(0, lambda: self._new_sync_passphrase(folder))
+                return
+            except Exception as e:
+                err = str(e)
+                self.after(0, lambda: messagebox.showerror("Sync failed", err))
+                return
+            # Imported rows and tasks reach the UI through state events
+            msg = f"Sent {report['uploaded']} segment(s), applied {report['applied']} change(s)."
+            if report["errors"]:
+                msg += f" Skipped {len(report['errors'])} damaged segment(s)."
+            self.after(0, lambda: self.notifier.notify("Sync complete", msg))
+        threading.Thread(target=work, name="sync", daemon=True).start()
+
+    def _new_sync_passphrase(self, folder: str) -> None:
+        """Encrypted data only syncs under a passphrase shared by the devices; set one up."""
+        if not messagebox.askokcancel(
+                "Sync", "Your data is encrypted, so synced changes are protected with a separate "
+                        "sync passphrase. Enter the same one on every device that uses this folder."):
+            return
+        passphrase = simpledialog.askstring("Sync", "New sync passphrase:", show="*", parent=self)
+        if not passphrase:
+            return
+        if simpledialog.askstring("Sync", "Repeat the passphrase:", show="*", parent=self) != passphrase:
+            messagebox.showerror("Sync", "The passphrases don't match.")
+            return
+        self._start_sync(folder, new_passphrase=passphrase)
 
     def _on_purge_history(self) -> None:
-        if storage.HISTORY_PATH.exists():
-            storage.HISTORY_PATH.unlink(missing_ok=True)
+        # Archived rows stay searchable (see history_index)
+        storage.archive_history()
         self._refresh_history_table()
+        self._refresh_index()
 
     def _tick(self) -> None:
       # Skip if already running
@@ -354,59 +735,103 @@ class App(tk.Tk):
           return
 
       self._tick_worker_running = True
-      threading.Thread(target=self._tick_worker, daemon=True).start()
+      target = self._tick_worker
+      if self._capture is not None and self._capture.active:
+          target = self._capture.wrap(target, on_tick_done=lambda: self.after(0, self._stop_profile))
+      threading.Thread(target=target, daemon=True).start()
       self.after(REFRESH_MS, self._tick)
 
 
+    def _poll_settings(self) -> None:
+        # A stat() of settings.json; a change arrives as SettingsChanged via the pump
+        try:
+            self.state.reload_settings()
+        finally:
+            self.after(SETTINGS_POLL_MS, self._poll_settings)
+
+    def _notification_plan(self, now: datetime):
+        """
+        Today's (window start, end, pre-end reminder or None). Kept until the
+        day changes or SettingsChanged touches the window or notifications.
+        """
+        day = now.date()
+        cached = self._notify_plan
+        if cached is not None and cached[0] == day:
+            return cached[1]
+        start, end = self.state.window_today()
+        minutes = self.state.settings.notifications.pre_end_minutes
+        pre_end = end - timedelta(minutes=minutes) if minutes else None
+        if getattr(self, "_notified_day_key", None) != day:
+            self._notified_day_key = day
+            self._notified_open = False
+            self._notified_pre_end = False
+        else:
+            # Settings changed today: notify again for moments still ahead
+            if start > now:
+                self._notified_open = False
+            if pre_end is not None and pre_end > now:
+                self._notified_pre_end = False
+        self._notify_plan = (day, (start, end, pre_end))
+        return start, end, pre_end
+
+    @metrics.timed("ui.tick_worker")
     def _tick_worker(self) -> None:
         """Runs off the Tk thread. Do I/O here; marshal UI updates with .after()."""
         try:
-            now = datetime.now()
+            now = clock.now()
             last = getattr(self, "_last_tick", now)
             self._last_tick = now
 
             # 1) Forfeit overdue tasks (disk I/O)
-            forfeited = self.state.forfeit_overdue()
+            forfeited = self.state.forfeit_overdue()  # UI follows via state events
             if forfeited:
-                self.after(0, self._refresh_table)
-                self.after(0, self._refresh_balance)
-                self.after(0, self._refresh_history_table)
                 self.after(0, lambda: self.notifier.notify("Tasks Forfeited",
                                                         f"{forfeited} task(s) forfeited at window end."))
 
+            # 1b) Recurring templates: today's instances once the window is open
+            try:
+                created = self.state.materialize_recurring()
+            except Exception:
+                created = []
+            if created:
+                self.after(0, lambda: self.notifier.notify("Recurring tasks",
+                                                        f"{len(created)} recurring task(s) added."))
+
             # 2) Monday purge (disk I/O)
             if storage.purge_history_if_monday():
                 self.after(0, self._refresh_history_table)
+                self.after(0, self._refresh_index)
 
-            # 3) Window status + notifications
-            start, end = self.state.window_today()
-            pre_end = end - timedelta(minutes=10)
+            # 3) Columnar ledger sidecar for analytics (disk I/O, incremental)
+            try:
+                from app import columnar
+                columnar.sync()
+            except Exception:
+                pass
 
-            # Reset flags each new day
-            today_key = now.strftime("%Y-%m-%d")
-            if getattr(self, "_notified_day_key", None) != today_key:
-                self._notified_day_key = today_key
-                self._notified_open = False
-                self._notified_pre_end = False
+            # 4) Window status + notifications
+            start, end, pre_end = self._notification_plan(now)
+            notify_open = self.state.settings.notifications.window_open
 
             # Fire when crossing start boundary
-            if not self._notified_open and last < start <= now:
+            if notify_open and not self._notified_open and last < start <= now:
                 self._notified_open = True
                 self.after(0, lambda: self.notifier.notify(
                     "Task window open",
                     f"You can create tasks until {end.strftime('%I:%M %p').lstrip('0')}."
                 ))
 
-            # Fire when crossing 10-min-before-end boundary
-            if not self._notified_pre_end and last < pre_end <= now:
+            # Fire when crossing the reminder before the end
+            if pre_end is not None and not self._notified_pre_end and last < pre_end <= now:
                 self._notified_pre_end = True
+                left = int((end - pre_end).total_seconds() // 60)
                 self.after(0, lambda: self.notifier.notify(
-                    "10 minutes left",
+                    f"{left} minutes left",
                     "Finish or mark tasks complete to avoid forfeits."
                 ))
 
             # If app starts while already inside the window, notify once
-            if not self._notified_open and start <= now <= end:
+            if notify_open and not self._notified_open and start <= now <= end:
                 self._notified_open = True
                 self.after(0, lambda: self.notifier.notify(
                     "Task window open",
@@ -416,6 +841,7 @@ class App(tk.Tk):
             # Lightweight UI state updates
             self.after(0, self._refresh_add_enabled)
             self.after(0, self._refresh_window_label)
+            self.after(0, self._schedule_tray_update)  # window countdown
 
         finally:
             self._tick_worker_running = False
@@ -428,6 +854,7 @@ class App(tk.Tk):
         self._refresh_window_label()
         self._refresh_add_enabled()
 
+    @metrics.timed("ui.refresh_table")
     def _refresh_table(self) -> None:
         for row in self.tree.get_children():
             self.tree.delete(row)
@@ -437,40 +864,129 @@ class App(tk.Tk):
     def _insert_task_row(self, t) -> None:
         self.tree.insert("", tk.END, iid=t.id, values=(t.description, f"{t.buy_in:.2f}", f"{t.payout:.2f}"))
 
+    @metrics.timed("ui.refresh_history_table")
     def _refresh_history_table(self) -> None:
+        if self._history_query():
+            self._run_history_search()
+            return
+        self._render_history_rows(storage.read_history(max_lines=HISTORY_ROWS))
+
+    # ---------- History search ----------
+    def _history_query(self) -> str:
+        var = getattr(self, "history_search_var", None)
+        return var.get().strip() if var is not None else ""
+
+    def _schedule_history_search(self, delay_ms: int = 250) -> None:
+        """Debounce typing in the search box."""
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(delay_ms, self._run_history_search)
+
+    def _run_history_search(self) -> None:
+        self._search_job = None
+        query = self._history_query()
+        if not query:
+            self._render_history_rows(storage.read_history(max_lines=HISTORY_ROWS))
+            return
+        idx = self.history_index
+        if idx is None:
+            return  # index still building; _build_index_worker re-runs the search
+
+        def work() -> None:
+            try:
+                rows = idx.search(query, limit=HISTORY_ROWS)
+            except Exception:
+                rows = []
+            rows.reverse()  # table is oldest-first like read_history()
+
+            def render() -> None:
+                if self._history_query() == query:
+                    self._render_history_rows(rows)
+            self.after(0, render)
+        threading.Thread(target=work, daemon=True).start()
+
+    @metrics.timed("ui.render_history_rows")
+    def _render_history_rows(self, rows) -> None:
+        self._history_loaded = True
         # clear table + mapping
         for row in self.h_tree.get_children():
             self.h_tree.delete(row)
         self._history_row_data.clear()
 
-        rows = self._filter_history_rows(storage.read_history())
-        for idx, obj in enumerate(rows):
-            iid = f"h{idx}"
-            self._history_row_data[iid] = obj
-            self.h_tree.insert(
-                "", tk.END, iid=iid,
-                values=(
-                    obj.get("ts",""),
-                    obj.get("event",""),
-                    obj.get("description",""),
-                    f"{float(obj.get('buy_in', 0.0)):.2f}",
-                    f"{float(obj.get('payout', 0.0)):.2f}",
-                )
+        for obj in self._filter_history_rows(rows):
+            self._insert_history_row(obj)
+
+    def _insert_history_row(self, obj: dict) -> None:
+        iid = f"h{self._history_seq}"
+        self._history_seq += 1
+        self._history_row_data[iid] = obj
+        self.h_tree.insert(
+            "", tk.END, iid=iid,
+            values=(
+                obj.get("ts",""),
+                obj.get("event",""),
+                obj.get("description",""),
+                f"{float(obj.get('buy_in', 0.0)):.2f}",
+                f"{float(obj.get('payout', 0.0)):.2f}",
             )
+        )
 
+    @metrics.timed("ui.apply_events")
+    def _apply_events(self, events) -> None:
+        """Patch the widgets for a batch of AppState events (one Tk idle cycle)."""
+        balance = None
+        new_rows = []
+        for ev in events:
+            if isinstance(ev, TaskAdded):
+                if not self.tree.exists(ev.task.id):
+                    self._insert_task_row(ev.task)
+            elif isinstance(ev, TaskRemoved):
+                if self.tree.exists(ev.task_id):
+                    self.tree.delete(ev.task_id)
+            elif isinstance(ev, LedgerAppended):
+                balance = ev.balance
+                self.chart.on_ledger_entry(ev.entry, ev.balance)
+            elif isinstance(ev, HistoryAppended):
+                new_rows.append(ev.row)
+            elif isinstance(ev, SettingsChanged):
+                if ev.sections & {"creation_window", "notifications"}:
+                    self._notify_plan = None
+                if "creation_window" in ev.sections:
+                    self._refresh_window_label()
+                    self._refresh_add_enabled()
+        if balance is not None:
+            self.balance_var.set(f"${balance:,.2f}")
+        if new_rows:
+            self._refresh_index()
+        if events:
+            self._schedule_tray_update()
+        if new_rows and self._history_loaded and not self._history_query():
+            for obj in self._filter_history_rows(new_rows):
+                self._insert_history_row(obj)
+            # Keep the table to the same window read_history() would show
+            extra = len(self._history_row_data) - HISTORY_ROWS
+            if extra > 0:
+                for iid in self.h_tree.get_children()[:extra]:
+                    self.h_tree.delete(iid)
+                    self._history_row_data.pop(iid, None)
+
+    @metrics.timed("ui.refresh_balance")
     def _refresh_balance(self) -> None:
         self.balance_var.set(f"${self.state.balance:,.2f}")
 
+    @metrics.timed("ui.refresh_add_enabled")
     def _refresh_add_enabled(self) -> None:
         enabled = self.state.in_creation_window()
         self.add_btn.state(["!disabled"] if enabled else ["disabled"])
 
+    @metrics.timed("ui.refresh_window_label")
     def _refresh_window_label(self) -> None:
         start, end = self.state.window_today()
-        now = datetime.now()
+        now = clock.now()
         status = "OPEN" if start <= now <= end else "Closed"
         self.window_var.set(f"Creation window: {start.strftime('%H:%M')}–{end.strftime('%H:%M')}  ({status})")
     def _open_data_folder(self) -> None:
+        import platform, subprocess
         try:
             storage.ensure_dirs()
             path = storage.APP_DIR
@@ -496,13 +1012,11 @@ class App(tk.Tk):
         except ValueError as e:
             messagebox.showerror("Invalid input", str(e))
             return
-        self._refresh_balance()
-        self._refresh_history_table()
         messagebox.showinfo("Recorded", f"Purchase recorded: -${amount:,.2f}")
 
     def _on_export_history_csv(self) -> None:
         # Choose destination file
-        default_name = f"todo_gamble_history_{datetime.now().strftime('%Y%m%d')}.csv"
+        default_name = f"todo_gamble_history_{clock.now().strftime('%Y%m%d')}.csv"
         path = filedialog.asksaveasfilename(
             title="Export History CSV",
             defaultextension=".csv",
@@ -512,21 +1026,12 @@ class App(tk.Tk):
         if not path:
             return
 
-        # Gather filtered history
-        data = storage.read_history()
-        filtered = self._filter_history_rows(data)
+        # All retained history, filtered like the table
+        events = {"Purchases Only": ["purchase"],
+                  "Tasks Only": ["completed", "forfeited"]}.get(self.history_filter_var.get())
         try:
             with open(path, "w", newline="", encoding="utf-8") as f:
-                w = csv.writer(f)
-                w.writerow(["ts", "event", "description", "buy_in", "payout"])
-                for obj in filtered:
-                    w.writerow([
-                        obj.get("ts", ""),
-                        obj.get("event", ""),
-                        obj.get("description", ""),
-                        f"{float(obj.get('buy_in', 0.0)):.2f}",
-                        f"{float(obj.get('payout', 0.0)):.2f}",
-                    ])
+                storage.export_history(f, "csv", events=events)
             messagebox.showinfo("Exported", f"History exported to:\n{path}")
         except Exception as e:
             messagebox.showerror("Export failed", str(e))
@@ -564,18 +1069,27 @@ class App(tk.Tk):
         obj = self._history_row_data[iid]
         event = (obj.get("event") or "").lower()
 
+        # Rows written since the op log exists are undone straight from it
+        if obj.get("key") and oplog.index().find_row(obj["key"]) is not None:
+            desc = obj.get("description", "")
+            if not messagebox.askyesno("Revert", f"Undo this {event.replace('_', ' ')}?\n\n{desc}"):
+                return
+            try:
+                self.state.revert_row(obj)
+            except Exception as e:
+                messagebox.showerror("Revert failed", str(e))
+            return
+
         if event == "purchase":
             desc = obj.get("description", "")
             amt = abs(float(obj.get("payout", 0.0)))  # payout is stored negative for purchases
             if not messagebox.askyesno("Refund purchase?", f"Refund this purchase?\n\n{desc}\n${amt:.2f}"):
                 return
             try:
-                self.state.revert_purchase(desc, amt)
+                self.state.revert_purchase(desc, amt, source=obj)
             except Exception as e:
                 messagebox.showerror("Revert failed", str(e))
                 return
-            self._refresh_balance()
-            self._refresh_history_table()
             messagebox.showinfo("Reverted", f"Refunded ${amt:.2f} for: {desc}")
             return
 
@@ -587,6 +1101,8 @@ class App(tk.Tk):
                 "description": obj.get("description", ""),
                 "buy_in": float(obj.get("buy_in", 0.0)),
                 "payout": float(obj.get("payout", 0.0)),
+                "ts": obj.get("ts"),    # identifies the row: a second revert is a no-op
+                "key": obj.get("key"),
             }
             restore = messagebox.askyesno(
                 "Revert",
@@ -602,16 +1118,32 @@ class App(tk.Tk):
             except Exception as e:
                 messagebox.showerror("Revert failed", str(e))
                 return
-            self._refresh_balance()
-            self._refresh_history_table()
-            if restore:
-                self._refresh_table()
             messagebox.showinfo("Reverted", f"Reverted {event} for: {snap['description']}")
             return
 
         # Other events (refund, reverted_*) — no-op or future support
         messagebox.showinfo("Revert", "This history event type cannot be reverted.")
 
+    def _on_undo(self, event=None):
+        if event is not None and isinstance(event.widget, (tk.Entry, ttk.Entry)):
+            return None  # let the entry undo its own text
+        try:
+            if self.state.undo() is None:
+                self.bell()
+        except Exception as e:
+            messagebox.showerror("Undo failed", str(e))
+        return "break"
+
+    def _on_redo(self, event=None):
+        if event is not None and isinstance(event.widget, (tk.Entry, ttk.Entry)):
+            return None
+        try:
+            if self.state.redo() is None:
+                self.bell()
+        except Exception as e:
+            messagebox.showerror("Redo failed", str(e))
+        return "break"
+
     def _on_purge_data(self) -> None:
         msg = (
             "Purge Data will remove:\n"
@@ -631,6 +1163,7 @@ class App(tk.Tk):
             self._refresh_balance()
             self._refresh_table()
             self._refresh_history_table()
+            self.chart.reload()
             messagebox.showinfo("Purge complete",
                                 f"Data purged. Balance is now ${self.state.balance:,.2f}.")
         except Exception as e:
@@ -650,6 +1183,7 @@ class App(tk.Tk):
             # recompute (snapshot may have changed first line)
             self.state.balance = storage.compute_balance()
             self._refresh_balance()
+            self.chart.reload()
             messagebox.showinfo("Ledger compacted",
                                 f"Ledger compacted to last {retain} days.\nLines now: {n}\n"
                                 f"Balance: ${self.state.balance:,.2f}")
@@ -661,6 +1195,10 @@ class App(tk.Tk):
 
 
     def _hide_to_tray(self) -> None:
+        if self.tray is None:
+            # No tray icon to come back from; minimize instead of hiding
+            self.iconify()
+            return
         try:
             self.withdraw()  # hides window, keeps mainloop alive
             # Tiny toast to confirm background mode
@@ -678,13 +1216,85 @@ class App(tk.Tk):
             pass
 
     def _quit_app(self) -> None:
+        self._quitting = True
         try:
-            self.tray.stop()
+            if self.tray is not None:
+                self.tray.stop()
+        except Exception:
+            pass
+        if self.ipc is not None:
+            self.ipc.stop()
+        if self.api is not None:
+            self.api.stop()
+        if self._capture is not None:
+            self._stop_profile()
+        if self.history_index is not None:
+            try:
+                self.history_index.save()
+            except Exception:
+                pass
+        try:
+            self.state.close()  # fsync deferred writes, empty the journal
         except Exception:
             pass
-            
-        _release_single_instance()
         self.destroy()
+    # ---------- Profiling ----------
+    def start_profile(self, seconds: float | None = None, ticks: int | None = None) -> dict:
+        """Start a cProfile/tracemalloc capture (Tk thread). Used by menu, env var and IPC."""
+        from app.profiling import ProfileCapture, diagnostics_dir
+        if self._capture is not None and self._capture.active:
+            raise RuntimeError("A profile capture is already running.")
+        if seconds is None and ticks is None:
+            seconds = 30
+
+        def done(paths) -> None:
+            where = str(paths[0].parent) if paths else str(diagnostics_dir())
+            self.after(0, lambda: self.notifier.notify("Profile captured", f"Saved to {where}"))
+
+        cap = ProfileCapture(seconds=float(seconds) if seconds is not None else None,
+                             ticks=int(ticks) if ticks is not None else None, on_done=done)
+        cap.start()
+        self._capture = cap
+        if seconds is not None:
+            self.after(int(float(seconds) * 1000), self._stop_profile)
+        return {"dir": str(diagnostics_dir()), "seconds": seconds, "ticks": ticks}
+
+    def _stop_profile(self) -> None:
+        cap, self._capture = self._capture, None
+        if cap is not None:
+            cap.stop()
+
+    def _on_capture_profile(self) -> None:
+        from app.profiling import parse_spec
+        spec = simpledialog.askstring(
+            "Capture Profile",
+            "Profile the next N seconds (e.g. 30) or the next N ticks (e.g. ticks:3):",
+            initialvalue="30", parent=self)
+        if not spec:
+            return
+        try:
+            info = self.start_profile(**parse_spec(spec))
+        except Exception as e:
+            messagebox.showerror("Capture Profile", str(e))
+            return
+        messagebox.showinfo("Capture Profile",
+                            f"Capturing… reports will be written to:\n{info['dir']}")
+
+    def _open_diagnostics(self) -> None:
+        from app.diagnostics import DiagnosticsWindow
+        if self._diagnostics is not None and self._diagnostics.winfo_exists():
+            self._diagnostics.lift()
+            return
+        self._diagnostics = DiagnosticsWindow(self)
+
+    def _open_recurring(self) -> None:
+        # New templates due today are picked up by the next tick while the window is open
+        from app.recurring_window import RecurringWindow
+        if self._recurring_win is not None and self._recurring_win.winfo_exists():
+            self._recurring_win.lift()
+            return
+        self._recurring_win = RecurringWindow(self, self.state.templates)
+
     def _send_test_notification(self) -> None:
         try:
             self.notifier.notify("Test Notification", "If you see this, notifications are working.")
@@ -692,17 +1302,48 @@ class App(tk.Tk):
             messagebox.showerror("Notification Error", str(e))
 
 
-if __name__ == "__main__":
-    # 1) Named mutex single-instance
-    if not _acquire_single_instance():
+def main(argv: list[str] | None = None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser(prog="app.main", description="Todo Gamble desktop app")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print a startup timing breakdown to stderr")
+    parser.add_argument("--api-port", type=int, metavar="PORT",
+                        help="also serve the local HTTP/JSON API on 127.0.0.1:PORT")
+    args = parser.parse_args(argv)
+    profiler = StartupProfiler(enabled=args.profile_startup)
+
+    from app import single_instance
+
+    # 1) Lock file single-instance
+    with profiler.stage("single-instance check"):
+        lock = single_instance.InstanceLock()
+        primary = lock.acquire()
+    if not primary:
         # A primary instance exists → ask it to show and exit.
-        _notify_primary_instance()
+        try:
+            single_instance.send_command("show", wait=2.0)
+        except Exception:
+            pass
         sys.exit(0)
 
     try:
-        app = App()
-        # 2) Start SHOW listener (so future launches can focus us)
-        threading.Thread(target=_start_instance_server, args=(app,), daemon=True).start()
+        app = App(profiler=profiler)
+        # 2) Command channel (so future launches and scripts can drive us)
+        server = single_instance.CommandServer()
+        _install_command_handlers(server, app)
+        if server.start():
+            app.ipc = server
+        if args.api_port:
+            from app.server import ApiServer, serve_in_thread
+            app.api = ApiServer(app.state, port=args.api_port, backend=_UiApiBackend(app),
+                                submit=lambda fn: _call_on_tk(app, fn))
+            serve_in_thread(app.api)
         app.mainloop()
     finally:
-        _release_single_instance()
+        lock.release()
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # scan workers in the PyInstaller build
+    main()
@@ -0,0 +1,187 @@
+# =============================
+# File: app/metrics.py
+# =============================
+"""
+Lightweight timing/metrics for hot paths.
+
+    @metrics.timed("storage.read_history")
+    def read_history(...): ...
+
+    with metrics.timer("ui.refresh_table"):
+        ...
+
+    metrics.add_bytes("storage.read_history", read=n)
+
+Each metric keeps a count, totals, bytes read/written and the last
+RING_SIZE durations (for p50/p95/max). Collection is off unless enabled with
+enable() or TODO_GAMBLE_METRICS=1; when off, a timed call costs one
+attribute check and timer() returns a shared no-op context manager.
+"""
+from __future__ import annotations
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, TypeVar
+
+RING_SIZE = 512
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class _Flag:
+    __slots__ = ("on",)
+
+    def __init__(self, on: bool) -> None:
+        self.on = on
+
+
+_enabled = _Flag(os.environ.get("TODO_GAMBLE_METRICS", "") not in ("", "0"))
+_lock = threading.Lock()
+
+
+class _Stat:
+    __slots__ = ("count", "total", "max", "samples", "bytes_read", "bytes_written", "errors")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=RING_SIZE)
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.errors = 0
+
+
+_stats: Dict[str, _Stat] = {}
+
+
+def _stat(name: str) -> _Stat:
+    st = _stats.get(name)
+    if st is None:
+        with _lock:
+            st = _stats.setdefault(name, _Stat())
+    return st
+
+
+def enabled() -> bool:
+    return _enabled.on
+
+
+def enable(on: bool = True) -> None:
+    _enabled.on = on
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+
+
+def record(name: str, seconds: float, failed: bool = False) -> None:
+    st = _stat(name)
+    with _lock:
+        st.count += 1
+        st.total += seconds
+        if seconds > st.max:
+            st.max = seconds
+        st.samples.append(seconds)
+        if failed:
+            st.errors += 1
+
+
+def add_bytes(name: str, read: int = 0, written: int = 0) -> None:
+    if not _enabled.on:
+        return
+    st = _stat(name)
+    with _lock:
+        st.bytes_read += read
+        st.bytes_written += written
+
+
+def timed(name: Optional[str] = None) -> Callable[[F], F]:
+    """Decorator: record each call's duration under `name` (default: qualified name)."""
+    def wrap(fn: F) -> F:
+        key = name or f"{fn.__module__}.{fn.__qualname__}"
+        flag = _enabled
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not flag.on:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                record(key, time.perf_counter() - t0, failed)
+        return wrapper  # type: ignore[return-value]
+    return wrap
+
+
+class _Timer:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        record(self.name, time.perf_counter() - self.t0, exc_type is not None)
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopTimer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NOOP = _NoopTimer()
+
+
+def timer(name: str):
+    """Context manager version of timed()."""
+    return _Timer(name) if _enabled.on else _NOOP
+
+
+def _pct(sorted_vals, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Per-metric summary; latencies in milliseconds over the last RING_SIZE calls."""
+    with _lock:
+        items = [(k, st.count, st.total, st.max, sorted(st.samples), st.bytes_read,
+                  st.bytes_written, st.errors) for k, st in _stats.items()]
+    out: Dict[str, Dict[str, Any]] = {}
+    for name, count, total, mx, samples, br, bw, errors in sorted(items):
+        out[name] = {
+            "count": count,
+            "total_ms": round(total * 1000, 3),
+            "p50_ms": round(_pct(samples, 0.50) * 1000, 3),
+            "p95_ms": round(_pct(samples, 0.95) * 1000, 3),
+            "max_ms": round(mx * 1000, 3),
+            "bytes_read": br,
+            "bytes_written": bw,
+            "errors": errors,
+        }
+    return out
+
+
+def dump_json(path: os.PathLike | str) -> None:
+    doc = {"enabled": _enabled.on, "ts": time.time(), "metrics": snapshot()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
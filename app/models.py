@@ -12,9 +12,12 @@ class Task:
     status: str  # "pending" | "completed" | "forfeited"
     due_at: Optional[str] = None  # ISO string (local tz)
     created_at: Optional[str] = None  # <-- NEW
+    source: Optional[str] = None  # "<template id>@<YYYY-MM-DD>" for recurring instances
+    revision: int = 0  # bumped each time the task is restored (undo/revert), so its new rows get new keys
 
     @staticmethod
-    def new(description: str, buy_in: float, payout: float, due_at: Optional[str],created_at: Optional[str] = None) -> "Task":
+    def new(description: str, buy_in: float, payout: float, due_at: Optional[str],created_at: Optional[str] = None,
+            source: Optional[str] = None) -> "Task":
         return Task(
             id=str(uuid.uuid4()),
             description=description.strip(),
@@ -23,6 +26,7 @@ class Task:
             status="pending",
             due_at=due_at,
             created_at=created_at,
+            source=source,
         )
 
     def to_dict(self) -> Dict[str, Any]:
@@ -38,4 +42,6 @@ class Task:
             status=d.get("status", "pending"),
             due_at=d.get("due_at"),
             created_at=d.get("created_at"),
+            source=d.get("source"),
+            revision=int(d.get("revision", 0)),
         )
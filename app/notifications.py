@@ -1,4 +1,4 @@
-import platform, subprocess
+import platform
 from dataclasses import dataclass
 
 @dataclass
@@ -26,6 +26,7 @@ class Notifier:
                 Notification(app_id=self.app_name, title=title, msg=message).show()
                 return
             else:
+                import subprocess
                 subprocess.run(["notify-send", title, message], check=False)
         except Exception:
             pass
\ No newline at end of file
@@ -0,0 +1,254 @@
+# =============================
+# File: app/oplog.py
+# =============================
+"""
+Operation log (APP_DIR/oplog.jsonl): one record per AppState operation,
+written inside the same journal record as the operation's own changes.
+
+    {"op": id, "kind": "complete_tasks" | "undo" | "redo" | ..., "ts": ..., "user": true,
+     "undoes": null, "undone": [],
+     "items": [{"key": row key, "ledger": row, "history": row,
+                "task": task dict before/after, "change": "removed"|"added"}]}
+
+An item is everything one operation did to one thing (a task, a purchase):
+its ledger and history rows share the item's `key`. The item's inverse is
+derived from it (ledger amounts negated, event names swapped, the task
+put back or taken away), so any item can be undone later without
+reconstructing anything from the History table. An undo is itself an
+operation whose items invert those of the undone one; undoing an undo is a
+redo.
+
+The in-memory index (built once from the file, then kept current) maps
+op id -> byte offset, row key -> (op id, item), task id -> op ids, and
+records which items have been undone. Lookups are O(1); a record is read
+back from the file with a single seek.
+"""
+from __future__ import annotations
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import storage
+from . import metrics
+
+MAX_BYTES = 16 * 1024 * 1024
+KEEP_BYTES = 8 * 1024 * 1024
+
+# Ledger types / history events and the ones that cancel them (both ways)
+_TYPE_PAIRS = (("payout", "revert_payout"), ("forfeit", "revert_forfeit"),
+               ("purchase", "refund"), ("delete_penalty", "revert_penalty"))
+_EVENT_PAIRS = (("completed", "reverted_completion"), ("forfeited", "reverted_forfeit"),
+                ("purchase", "refund"), ("deleted_penalty", "reverted_penalty"),
+                ("deleted_free", "reverted_delete"))
+INVERSE_TYPE = {**dict(_TYPE_PAIRS), **{b: a for a, b in _TYPE_PAIRS}}
+INVERSE_EVENT = {**dict(_EVENT_PAIRS), **{b: a for a, b in _EVENT_PAIRS}}
+_SIGNED_EVENTS = {"purchase", "refund", "deleted_penalty", "reverted_penalty"}  # payout column is the amount
+_ROW_META = ("ts", "balance", "key")
+
+
+def log_path() -> Path:
+    return storage.APP_DIR / "oplog.jsonl"
+
+
+def new_op_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _inverse_name(name: str, table: Dict[str, str]) -> str:
+    if name in table:
+        return table[name]
+    return name[5:] if name.startswith("undo_") else f"undo_{name}"
+
+
+def inverse_ledger_row(row: dict, key: str) -> dict:
+    out = {k: v for k, v in row.items() if k not in _ROW_META}
+    out["type"] = _inverse_name(str(row.get("type", "")), INVERSE_TYPE)
+    out["amount"] = -float(row.get("amount", 0.0))
+    out["key"] = key
+    return out
+
+
+def inverse_history_row(row: dict, key: str) -> dict:
+    out = {k: v for k, v in row.items() if k not in _ROW_META}
+    event = str(row.get("event", ""))
+    out["event"] = _inverse_name(event, INVERSE_EVENT)
+    if event in _SIGNED_EVENTS:
+        out["payout"] = -float(row.get("payout", 0.0))
+    out["key"] = key
+    return out
+
+
+def build_items(ledger: List[dict], history: List[dict],
+                removed: Dict[str, dict], added: Dict[str, dict]) -> List[Dict[str, Any]]:
+    """Group an operation's rows by key and attach the task each one changed."""
+    items: List[Dict[str, Any]] = []
+    by_key: Dict[str, Dict[str, Any]] = {}
+
+    def item_for(row: dict) -> Dict[str, Any]:
+        key = row.get("key")
+        it = by_key.get(key) if key else None
+        if it is None:
+            it = {"key": key}
+            items.append(it)
+            if key:
+                by_key[key] = it
+        return it
+
+    for row in ledger:
+        item_for(row)["ledger"] = row
+    for row in history:
+        item_for(row)["history"] = row
+    claimed = set()
+    for it in items:
+        row = it.get("ledger") or it.get("history") or {}
+        tid = row.get("task_id")
+        if not tid or tid in claimed:
+            continue
+        if tid in removed:
+            it["task"], it["change"] = removed[tid], "removed"
+            claimed.add(tid)
+        elif tid in added:
+            it["task"], it["change"] = added[tid], "added"
+            claimed.add(tid)
+    for change, tasks in (("removed", removed), ("added", added)):
+        for tid, task in tasks.items():
+            if tid not in claimed:
+                items.append({"key": None, "task": task, "change": change})
+    return items
+
+
+class OpIndex:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._size = 0  # oplog.jsonl bytes indexed
+        self.offsets: Dict[str, int] = {}
+        self.order: List[str] = []  # op ids, oldest first
+        self.user: Dict[str, bool] = {}  # op id -> a user action (Ctrl+Z target)
+        self.undo_ops: Dict[str, str] = {}  # undo op id -> op id it undoes (redos excluded)
+        self.counts: Dict[str, int] = {}  # op id -> item count
+        self.by_key: Dict[str, Tuple[str, int]] = {}
+        self.by_task: Dict[str, List[str]] = {}
+        self.undone: Dict[str, set] = {}
+
+    # ---------- Building ----------
+    def _catch_up(self) -> None:
+        """Index records appended since the last look (any process); the first call reads the whole log."""
+        path = self.root / "oplog.jsonl"
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        if size < self._size:
+            self._reset()  # rewritten (trimmed): start over
+        if size == self._size:
+            return
+        with path.open("rb") as f:
+            f.seek(self._size)
+            data = f.read(size - self._size)
+        end = data.rfind(b"\n") + 1
+        pos = 0
+        while pos < end:
+            nl = data.index(b"\n", pos)
+            try:
+                self._note(storage.parse_line(data[pos:nl]), self._size + pos)
+            except Exception:
+                pass
+            pos = nl + 1
+        metrics.add_bytes("oplog.index", read=end)
+        self._size += end
+
+    def _note(self, rec: Dict[str, Any], offset: int) -> None:
+        op = rec["op"]
+        self.offsets[op] = offset
+        self.order.append(op)
+        self.user[op] = bool(rec.get("user"))
+        items = rec.get("items", [])
+        self.counts[op] = len(items)
+        for i, it in enumerate(items):
+            if it.get("key"):
+                self.by_key[it["key"]] = (op, i)
+            task = it.get("task") or {}
+            row = it.get("ledger") or it.get("history") or {}
+            tid = task.get("id") or row.get("task_id")
+            if tid:
+                ops = self.by_task.setdefault(tid, [])
+                if not ops or ops[-1] != op:
+                    ops.append(op)
+        if rec.get("undoes"):
+            if rec.get("kind") == "undo":
+                self.undo_ops[op] = rec["undoes"]
+            self.undone.setdefault(rec["undoes"], set()).update(rec.get("undone", []))
+
+    # ---------- Queries ----------
+    def read(self, op: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._catch_up()
+            off = self.offsets.get(op)
+        if off is None:
+            return None
+        with (self.root / "oplog.jsonl").open("rb") as f:
+            f.seek(off)
+            return storage.parse_line(f.readline())
+
+    def find_row(self, key: str) -> Optional[Tuple[str, int]]:
+        """(op id, item index) of the item that wrote the row with this key."""
+        with self._lock:
+            self._catch_up()
+            return self.by_key.get(key)
+
+    def ops_for_task(self, task_id: str) -> List[str]:
+        with self._lock:
+            self._catch_up()
+            return list(self.by_task.get(task_id, ()))
+
+    def _pending(self, op: str) -> bool:
+        return len(self.undone.get(op, ())) < self.counts.get(op, 0)
+
+    def pending_items(self, op: str) -> List[int]:
+        """Items of `op` that have not been undone yet."""
+        with self._lock:
+            self._catch_up()
+            done = self.undone.get(op, set())
+            return [i for i in range(self.counts.get(op, 0)) if i not in done]
+
+    def last_undoable(self) -> Optional[str]:
+        """Newest user operation (not an undo) with items left to undo."""
+        with self._lock:
+            self._catch_up()
+            for op in reversed(self.order):
+                if self.user.get(op) and op not in self.undo_ops and self._pending(op):
+                    return op
+            return None
+
+    def approx_bytes(self) -> int:
+        return 200 * len(self.offsets) + 150 * len(self.by_key)
+
+    # ---------- Maintenance ----------
+    def trim(self) -> None:
+        """Keep the newest KEEP_BYTES of records once the log passes MAX_BYTES."""
+        with self._lock:
+            path = self.root / "oplog.jsonl"
+            try:
+                if path.stat().st_size <= MAX_BYTES:
+                    return
+            except OSError:
+                return
+            with path.open("rb") as f:
+                f.seek(-KEEP_BYTES, os.SEEK_END)
+                data = f.read()
+            data = data[data.find(b"\n") + 1:]
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            tmp.replace(path)
+            self._reset()
+
+
+def index() -> OpIndex:
+    """The op index of the active data directory (see storage.StorageContext)."""
+    return storage.current().obj("oplog", OpIndex)
@@ -0,0 +1,180 @@
+# =============================
+# File: app/profiles.py
+# =============================
+"""
+Several data directories ("profiles") served from one process.
+
+    <root>/<name>/    one profile = one ordinary data directory
+
+ProfilePool.acquire(name) opens a profile on first use: its own
+storage.StorageContext (paths, journal lock, dedup/op-log indexes) and an
+AppState bound to it. Open profiles are kept in LRU order. When more than
+`max_open` are open, or their estimated memory passes `max_bytes`, the
+least recently used idle ones are closed (journal checkpoint, caches
+dropped) and reopened from disk on next use. A profile is busy between
+acquire() and release() (or inside `with pool.using(name)`), and busy
+profiles are never evicted.
+
+Each directory is still fully usable on its own (`--data-dir
+<root>/<name>` for the CLI and GUI).
+"""
+from __future__ import annotations
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from . import storage
+from . import metrics
+from .app_state import AppState
+
+DEFAULT_MAX_OPEN = 8
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+_BASE_BYTES = 64 * 1024  # AppState, settings, templates, event bus
+_TASK_BYTES = 600
+NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+class Profile:
+    def __init__(self, name: str, ctx: storage.StorageContext) -> None:
+        self.name = name
+        self.ctx = ctx
+        self.state = AppState(self.ctx)
+        self.busy = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def backend(self) -> AppState:
+        return self.state
+
+    def approx_bytes(self) -> int:
+        return _BASE_BYTES + _TASK_BYTES * len(self.state.tasks) + self.ctx.approx_bytes()
+
+    def close(self) -> None:
+        self.state.close()
+        self.ctx.drop_objects()
+
+
+class ProfilePool:
+    def __init__(self, root: Path | str, max_open: int = DEFAULT_MAX_OPEN,
+                 max_bytes: int = DEFAULT_MAX_BYTES, create: bool = False) -> None:
+        self.root = Path(root).expanduser()
+        self.max_open = max(1, max_open)
+        self.max_bytes = max_bytes
+        self.create = create  # make <root>/<name> on first use instead of KeyError
+        self._open: "OrderedDict[str, Profile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._opening: Dict[str, threading.Lock] = {}  # so a profile is opened once
+        # Contexts outlive evictions: a closing profile and its reopened
+        # successor share the context's journal lock
+        self._contexts: Dict[str, storage.StorageContext] = {}
+
+    def names(self) -> List[str]:
+        """Profiles on disk (directories under root with a valid name)."""
+        try:
+            return sorted(p.name for p in self.root.iterdir() if p.is_dir() and NAME_RE.match(p.name))
+        except OSError:
+            return []
+
+    def open_profiles(self) -> List[str]:
+        """Names of the open profiles, least recently used first."""
+        with self._lock:
+            return list(self._open)
+
+    # ---------- Acquire / release ----------
+    @metrics.timed("profiles.acquire")
+    def acquire(self, name: str) -> Profile:
+        """
+        The open profile `name`, marked busy until release(). Raises
+        ValueError for a bad name, KeyError for an unknown profile (unless
+        the pool creates them).
+        """
+        if not NAME_RE.match(name):
+            raise ValueError(f"Invalid profile name: {name!r}")
+        with self._lock:
+            prof = self._take(name)
+            if prof is not None:
+                return prof
+            opening = self._opening.setdefault(name, threading.Lock())
+        with opening:  # AppState() reads the directory; don't hold the pool lock for it
+            with self._lock:
+                prof = self._take(name)
+                if prof is not None:
+                    return prof
+            path = self.root / name
+            if not path.is_dir():
+                if not self.create:
+                    raise KeyError(f"Unknown profile: {name}")
+                path.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                ctx = self._contexts.get(name)
+                if ctx is None:
+                    ctx = self._contexts[name] = storage.StorageContext(path)
+            prof = Profile(name, ctx)
+            with self._lock:
+                prof.busy = 1
+                self._open[name] = prof
+                self._opening.pop(name, None)
+                victims = self._evict()
+            self._close(victims)
+            return prof
+
+    def _take(self, name: str) -> Profile | None:
+        prof = self._open.get(name)
+        if prof is not None:
+            self._open.move_to_end(name)
+            prof.busy += 1
+        return prof
+
+    def release(self, prof: Profile) -> None:
+        with self._lock:
+            prof.busy -= 1
+            prof.last_used = time.monotonic()
+            victims = self._evict()
+        self._close(victims)
+
+    @contextmanager
+    def using(self, name: str) -> Iterator[Profile]:
+        prof = self.acquire(name)
+        try:
+            yield prof
+        finally:
+            self.release(prof)
+
+    # ---------- Eviction ----------
+    def _evict(self) -> List[Profile]:
+        """Drop least recently used idle profiles until within bounds (pool lock held)."""
+        victims: List[Profile] = []
+        total = sum(p.approx_bytes() for p in self._open.values())
+        for name in list(self._open):
+            if len(self._open) <= self.max_open and total <= self.max_bytes:
+                break
+            prof = self._open[name]
+            if prof.busy:
+                continue
+            del self._open[name]
+            total -= prof.approx_bytes()
+            victims.append(prof)
+        return victims
+
+    @staticmethod
+    def _close(profs: List[Profile]) -> None:
+        for prof in profs:
+            try:
+                prof.close()
+            except Exception:
+                pass
+            metrics.record("profiles.evicted", 0.0)
+
+    def close_all(self) -> None:
+        with self._lock:
+            profs = list(self._open.values())
+            self._open.clear()
+        for prof in profs:
+            try:
+                prof.close()
+            except Exception:
+                pass
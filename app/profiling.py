@@ -0,0 +1,173 @@
+# =============================
+# File: app/profiling.py
+# =============================
+"""
+Opt-in profile captures from a running app.
+
+A capture profiles the Tk thread with cProfile, profiles each tick worker
+that runs during the capture with its own cProfile (merged at the end) and
+traces allocations with tracemalloc. It covers either the next N seconds or
+the next N completed ticks. Reports go to APP_DIR/diagnostics/:
+
+    capture-<stamp>.prof          pstats file (snakeviz, `python -m pstats`)
+    capture-<stamp>-stats.txt     top functions by cumulative time
+    capture-<stamp>-alloc.txt     top allocation sites and growth during the capture
+
+Only the newest MAX_CAPTURES captures are kept.
+
+Triggers: File ▸ Capture Profile…, TODO_GAMBLE_PROFILE=<seconds> or
+TODO_GAMBLE_PROFILE=ticks:<n> at startup, or the IPC command `profile`.
+"""
+from __future__ import annotations
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from . import storage
+from . import clock
+
+MAX_CAPTURES = 10
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 30
+
+
+def diagnostics_dir() -> Path:
+    return storage.APP_DIR / "diagnostics"
+
+
+def parse_spec(spec: str) -> dict:
+    """'30' -> {'seconds': 30}; 'ticks:5' -> {'ticks': 5}. Raises ValueError."""
+    spec = spec.strip().lower()
+    if spec.startswith("ticks:"):
+        n = int(spec.split(":", 1)[1])
+        if n <= 0:
+            raise ValueError("ticks must be positive")
+        return {"ticks": n}
+    seconds = float(spec)
+    if seconds <= 0:
+        raise ValueError("seconds must be positive")
+    return {"seconds": seconds}
+
+
+class ProfileCapture:
+    """
+    start() and stop() must be called on the thread being profiled (the Tk
+    thread); wrap() profiles work on other threads. `on_done(paths)` is
+    called from a background thread once the reports are written.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, ticks: Optional[int] = None,
+                 on_done: Optional[Callable[[List[Path]], None]] = None) -> None:
+        if (seconds is None) == (ticks is None):
+            raise ValueError("Give exactly one of seconds or ticks")
+        self.seconds = seconds
+        self.ticks = ticks
+        self.on_done = on_done
+        self.active = False
+        self.ticks_done = 0
+        self._main = cProfile.Profile()
+        self._workers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+        self._snap_start: Optional[tracemalloc.Snapshot] = None
+        self._t0 = 0.0
+
+    # ---------- Lifecycle ----------
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self._started_tracemalloc = True
+        self._snap_start = tracemalloc.take_snapshot()
+        self._t0 = time.perf_counter()
+        self.active = True
+        self._main.enable()
+
+    def stop(self) -> None:
+        """Stop collecting and write reports on a background thread."""
+        if not self.active:
+            return
+        self._main.disable()
+        self.active = False
+        elapsed = time.perf_counter() - self._t0
+        snap_end = tracemalloc.take_snapshot()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        threading.Thread(target=self._write_reports, args=(snap_end, elapsed),
+                         name="profile-writer", daemon=True).start()
+
+    # ---------- Worker threads ----------
+    def wrap(self, fn: Callable[[], None], on_tick_done: Optional[Callable[[], None]] = None) -> Callable[[], None]:
+        """Profile one run of fn (a tick worker); counts toward a tick-based capture."""
+        def run() -> None:
+            prof = cProfile.Profile()
+            try:
+                prof.runcall(fn)
+            finally:
+                with self._lock:
+                    self._workers.append(prof)
+                    self.ticks_done += 1
+                    finished = self.ticks is not None and self.ticks_done >= self.ticks
+                if finished and on_tick_done is not None:
+                    on_tick_done()
+        return run
+
+    # ---------- Reports ----------
+    def _write_reports(self, snap_end: tracemalloc.Snapshot, elapsed: float) -> None:
+        out_dir = diagnostics_dir()
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stem = out_dir / f"capture-{clock.now().strftime('%Y%m%d-%H%M%S')}"
+        paths: List[Path] = []
+        try:
+            stats = pstats.Stats(self._main)
+            with self._lock:
+                workers = list(self._workers)
+            for prof in workers:
+                stats.add(prof)
+            prof_path = stem.with_suffix(".prof")
+            stats.dump_stats(str(prof_path))
+            paths.append(prof_path)
+
+            buf = io.StringIO()
+            buf.write(f"Capture: {elapsed:.1f}s, {len(workers)} tick worker run(s)\n\n")
+            pstats.Stats(str(prof_path), stream=buf).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            stats_path = Path(f"{stem}-stats.txt")
+            stats_path.write_text(buf.getvalue(), encoding="utf-8")
+            paths.append(stats_path)
+
+            alloc_path = Path(f"{stem}-alloc.txt")
+            alloc_path.write_text(self._alloc_report(snap_end), encoding="utf-8")
+            paths.append(alloc_path)
+        finally:
+            rotate(out_dir)
+            if self.on_done is not None:
+                self.on_done(paths)
+
+    def _alloc_report(self, snap_end: tracemalloc.Snapshot) -> str:
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        end = snap_end.filter_traces(filters)
+        lines = [f"Top {TOP_ALLOCATIONS} allocation sites at end of capture", ""]
+        for stat in end.statistics("lineno")[:TOP_ALLOCATIONS]:
+            lines.append(str(stat))
+        if self._snap_start is not None:
+            start = self._snap_start.filter_traces(filters)
+            lines += ["", f"Top {TOP_ALLOCATIONS} changes during capture", ""]
+            for stat in end.compare_to(start, "lineno")[:TOP_ALLOCATIONS]:
+                lines.append(str(stat))
+        return "\n".join(lines) + "\n"
+
+
+def rotate(out_dir: Path, keep: int = MAX_CAPTURES) -> None:
+    """Delete all but the newest `keep` captures (all files of a capture go together)."""
+    stems = sorted({p.name.split(".")[0].replace("-stats", "").replace("-alloc", "")
+                    for p in out_dir.glob("capture-*")})
+    for stem in stems[:-keep] if keep else stems:
+        for p in out_dir.glob(f"{stem}*"):
+            try:
+                p.unlink()
+            except OSError:
+                pass
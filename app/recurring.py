@@ -0,0 +1,261 @@
+# =============================
+# File: app/recurring.py
+# =============================
+"""
+Recurring task templates (APP_DIR/templates.json).
+
+A template is a task spec plus a rule:
+  daily                every day
+  weekdays / weekends  Mon–Fri / Sat–Sun
+  mon,wed,fri          the listed days (three-letter names)
+  every N days         every Nth day counted from the template's start date
+
+Each template stores its next occurrence (`next`), so the scheduler keeps a
+heap ordered by it and due() only pops the templates whose date has come:
+expansion costs O(templates due), not a pass over every template.
+
+AppState.materialize_recurring() creates the day's instances when the
+creation window is open. Instances carry Task.source = "<id>@<date>"; that
+key is checked against the pending tasks before anything is created, so a
+second call (or a crash between saving tasks.json and templates.json)
+never produces duplicates.
+"""
+from __future__ import annotations
+import heapq
+import os
+import threading
+import uuid
+from dataclasses import dataclass, asdict
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import storage
+from . import metrics
+from . import clock
+
+FORMAT_VERSION = 1
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def templates_path() -> Path:
+    return storage.APP_DIR / "templates.json"
+
+
+# ---------- Rules ----------
+class Rule:
+    """A parsed recurrence rule: a weekday set or an every-N-days step."""
+    __slots__ = ("text", "weekdays", "step")
+
+    def __init__(self, text: str, weekdays: Tuple[int, ...] = (), step: int = 0) -> None:
+        self.text = text
+        self.weekdays = weekdays
+        self.step = step
+
+    @classmethod
+    def parse(cls, text: str) -> "Rule":
+        """Raises ValueError for anything the scheduler can't expand."""
+        t = " ".join(str(text).lower().split())
+        if t == "daily":
+            return cls(t, tuple(range(7)))
+        if t == "weekdays":
+            return cls(t, tuple(range(5)))
+        if t == "weekends":
+            return cls(t, (5, 6))
+        words = t.split()
+        if len(words) == 3 and words[0] == "every" and words[2] in ("day", "days"):
+            try:
+                step = int(words[1])
+            except ValueError:
+                step = 0
+            if step < 1:
+                raise ValueError(f"Invalid rule: {text!r} (N must be a positive integer)")
+            return cls(t, step=step)
+        days = [d.strip()[:3] for d in t.split(",") if d.strip()]
+        if days and all(d in DAY_NAMES for d in days):
+            wd = tuple(sorted({DAY_NAMES.index(d) for d in days}))
+            return cls(",".join(DAY_NAMES[i] for i in wd), wd)
+        raise ValueError(f"Invalid rule: {text!r} (use daily, weekdays, weekends, "
+                         "mon,wed,fri or every N days)")
+
+    def next_on_or_after(self, d: date, start: date) -> date:
+        """First occurrence >= d (start anchors every-N-days rules)."""
+        if self.step:
+            if d <= start:
+                return start
+            behind = (d - start).days % self.step
+            return d + timedelta(days=(self.step - behind) % self.step)
+        for i in range(7):
+            c = d + timedelta(days=i)
+            if c.weekday() in self.weekdays:
+                return c
+        raise ValueError(f"Rule {self.text!r} never occurs")
+
+
+# ---------- Templates ----------
+@dataclass
+class Template:
+    id: str
+    description: str
+    buy_in: float
+    payout: float
+    rule: str
+    start: str  # YYYY-MM-DD
+    next: str  # YYYY-MM-DD, precomputed next occurrence
+
+    @staticmethod
+    def new(description: str, buy_in: float, payout: float, rule: str,
+            start: Optional[date] = None) -> "Template":
+        description = str(description or "").strip()
+        if not description:
+            raise ValueError("Description is required")
+        try:
+            buy_in, payout = float(buy_in), float(payout)
+        except (TypeError, ValueError):
+            raise ValueError("Buy-in and Payout must be numbers")
+        parsed = Rule.parse(rule)
+        start = start or clock.today()
+        return Template(
+            id=str(uuid.uuid4()),
+            description=description,
+            buy_in=buy_in,
+            payout=payout,
+            rule=parsed.text,
+            start=start.isoformat(),
+            next=parsed.next_on_or_after(start, start).isoformat(),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]) -> "Template":
+        return Template(
+            id=d["id"],
+            description=d["description"],
+            buy_in=float(d["buy_in"]),
+            payout=float(d["payout"]),
+            rule=d["rule"],
+            start=d["start"],
+            next=d["next"],
+        )
+
+    def key(self, on: date) -> str:
+        return f"{self.id}@{on.isoformat()}"
+
+    def advance(self, past: date) -> None:
+        """Move `next` to the first occurrence after `past`."""
+        start = date.fromisoformat(self.start)
+        self.next = Rule.parse(self.rule).next_on_or_after(past + timedelta(days=1), start).isoformat()
+
+
+class TemplateStore:
+    """
+    templates.json plus a heap of (next, id). reload_if_changed() is a stat()
+    so callers can check before every expansion and still see edits made by
+    another process (CLI).
+    """
+
+    def __init__(self) -> None:
+        self.path = templates_path()  # fixed at creation: the store belongs to one data directory
+        self._lock = threading.RLock()
+        self.templates: Dict[str, Template] = {}
+        self._heap: List[Tuple[str, str]] = []
+        self._stamp: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def load(cls) -> "TemplateStore":
+        store = cls()
+        store.reload_if_changed()
+        return store
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def reload_if_changed(self) -> bool:
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return False
+            templates: Dict[str, Template] = {}
+            if stamp is not None:
+                try:
+                    data = storage.parse_line(self.path.read_text(encoding="utf-8").strip())
+                    if data.get("version") == FORMAT_VERSION:
+                        for d in data.get("templates", []):
+                            t = Template.from_dict(d)
+                            templates[t.id] = t
+                except Exception:
+                    pass
+            self.templates = templates
+            self._heap = [(t.next, t.id) for t in templates.values()]
+            heapq.heapify(self._heap)
+            self._stamp = stamp
+            return True
+
+    @metrics.timed("storage.save_templates")
+    def save(self) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            text = storage.dumps_line({"version": FORMAT_VERSION,
+                                       "templates": [t.to_dict() for t in self.templates.values()]}, indent=2)
+            metrics.add_bytes("storage.save_templates", written=len(text))
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(text, encoding="utf-8")
+            tmp.replace(self.path)
+            self._stamp = self._file_stamp()
+
+    # ---------- Editing ----------
+    def add(self, template: Template) -> Template:
+        with self._lock:
+            self.reload_if_changed()
+            self.templates[template.id] = template
+            heapq.heappush(self._heap, (template.next, template.id))
+            self.save()
+            return template
+
+    def remove(self, template_id: str) -> Template:
+        """Accepts a full id or a unique prefix. Raises KeyError."""
+        with self._lock:
+            self.reload_if_changed()
+            matches = [i for i in self.templates if i.startswith(template_id)]
+            if template_id in self.templates:
+                matches = [template_id]
+            if len(matches) != 1:
+                raise KeyError(f"{'Ambiguous' if matches else 'Unknown'} template id: {template_id}")
+            t = self.templates.pop(matches[0])
+            self.save()  # its heap entry is skipped lazily in due()
+            return t
+
+    def list(self) -> List[Template]:
+        with self._lock:
+            self.reload_if_changed()
+            return sorted(self.templates.values(), key=lambda t: (t.next, t.description))
+
+    # ---------- Scheduling ----------
+    def due(self, on: date) -> List[Template]:
+        """Templates whose next occurrence is on or before `on` (heap order)."""
+        with self._lock:
+            self.reload_if_changed()
+            key = on.isoformat()
+            out: List[Template] = []
+            seen = set()
+            while self._heap and self._heap[0][0] <= key:
+                nxt, tid = heapq.heappop(self._heap)
+                t = self.templates.get(tid)
+                if t is None or t.next != nxt or tid in seen:
+                    continue  # removed or rescheduled since this entry was pushed
+                seen.add(tid)
+                out.append(t)
+            return out
+
+    def reschedule(self, templates: List[Template]) -> None:
+        """Push the (already advanced) templates back onto the heap."""
+        with self._lock:
+            for t in templates:
+                if t.id in self.templates:
+                    heapq.heappush(self._heap, (t.next, t.id))
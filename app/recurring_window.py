@@ -0,0 +1,84 @@
+# =============================
+# File: app/recurring_window.py
+# =============================
+"""Settings → Recurring Tasks…: add and remove recurring templates."""
+from __future__ import annotations
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from .recurring import Template, TemplateStore
+
+_COLUMNS = (
+    ("description", "Description", 220, tk.W),
+    ("rule", "Repeats", 110, tk.W),
+    ("next", "Next", 90, tk.W),
+    ("buy_in", "Buy-in", 70, tk.E),
+    ("payout", "Payout", 70, tk.E),
+)
+RULES = ("daily", "weekdays", "weekends", "mon,wed,fri", "every 2 days")
+
+
+class RecurringWindow(tk.Toplevel):
+    def __init__(self, master: tk.Misc, store: TemplateStore) -> None:
+        super().__init__(master)
+        self.title("Recurring Tasks")
+        self.geometry("640x360")
+        self.store = store
+
+        form = ttk.Frame(self, padding=(10, 8))
+        form.pack(fill=tk.X)
+        self.desc_var = tk.StringVar()
+        self.buyin_var = tk.StringVar()
+        self.payout_var = tk.StringVar()
+        self.rule_var = tk.StringVar(value="daily")
+        for label, var, width in (("Description", self.desc_var, 24), ("Buy-in", self.buyin_var, 7),
+                                  ("Payout", self.payout_var, 7)):
+            ttk.Label(form, text=label).pack(side=tk.LEFT)
+            ttk.Entry(form, textvariable=var, width=width).pack(side=tk.LEFT, padx=(4, 8))
+        ttk.Label(form, text="Repeats").pack(side=tk.LEFT)
+        ttk.Combobox(form, textvariable=self.rule_var, values=RULES, width=12).pack(side=tk.LEFT, padx=(4, 8))
+        ttk.Button(form, text="Add", command=self._add).pack(side=tk.LEFT)
+
+        frame = ttk.Frame(self, padding=(10, 0, 10, 4))
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(frame, columns=[c[0] for c in _COLUMNS], show="headings")
+        for key, label, width, anchor in _COLUMNS:
+            self.tree.heading(key, text=label)
+            self.tree.column(key, width=width, anchor=anchor, stretch=(key == "description"))
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        bottom = ttk.Frame(self, padding=(10, 0, 10, 10))
+        bottom.pack(fill=tk.X)
+        ttk.Label(bottom, text="Instances are added when the creation window opens.").pack(side=tk.LEFT)
+        ttk.Button(bottom, text="Remove", command=self._remove).pack(side=tk.RIGHT)
+        self._refresh()
+
+    def _refresh(self) -> None:
+        for iid in self.tree.get_children():
+            self.tree.delete(iid)
+        for t in self.store.list():
+            self.tree.insert("", tk.END, iid=t.id, values=(
+                t.description, t.rule, t.next, f"{t.buy_in:.2f}", f"{t.payout:.2f}"))
+
+    def _add(self) -> None:
+        try:
+            self.store.add(Template.new(self.desc_var.get(), self.buyin_var.get(),
+                                        self.payout_var.get(), self.rule_var.get()))
+        except ValueError as e:
+            messagebox.showerror("Invalid template", str(e), parent=self)
+            return
+        self.desc_var.set("")
+        self.buyin_var.set("")
+        self.payout_var.set("")
+        self._refresh()
+
+    def _remove(self) -> None:
+        sel = self.tree.selection()
+        if not sel:
+            return
+        for iid in sel:
+            try:
+                self.store.remove(iid)
+            except KeyError:
+                pass
+        self._refresh()
@@ -0,0 +1,99 @@
+# =============================
+# File: app/scan.py
+# =============================
+"""
+Parallel map/reduce over JSONL files (ledger, history segments).
+
+Each file is split into newline-aligned byte ranges; `fn(path, start, end)`
+runs once per range and results come back in file/range order:
+
+    parts = scan.map_ranges(_count_events, storage.history_segments())
+    total = scan.map_reduce(_count_events, merge, {}, storage.history_segments())
+
+`fn` must be picklable (a module-level function or functools.partial of
+one), because large inputs are spread over a ProcessPoolExecutor. Inputs
+under PARALLEL_MIN_BYTES run in-process, where worker start-up would cost
+more than it saves, and so do encrypted directories (workers don't hold
+the key). Use iter_range() inside `fn` to get parsed rows.
+"""
+from __future__ import annotations
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from . import storage
+from .linescan import LineScanner
+
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+MIN_RANGE_BYTES = 1024 * 1024
+RANGES_PER_WORKER = 4  # smaller ranges even out skew between workers
+
+T = TypeVar("T")
+R = TypeVar("R")
+Range = Tuple[str, int, int]
+
+
+def default_workers() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def plan(paths: Iterable[os.PathLike | str], workers: Optional[int] = None) -> List[Range]:
+    """Newline-aligned (path, start, end) ranges covering every file, in order."""
+    files = []
+    for p in paths:
+        try:
+            size = os.path.getsize(p)
+        except OSError:
+            continue
+        if size:
+            files.append((str(p), size))
+    total = sum(size for _, size in files)
+    workers = workers or default_workers()
+    target = max(MIN_RANGE_BYTES, total // (workers * RANGES_PER_WORKER) + 1)
+    out: List[Range] = []
+    for path, size in files:
+        if size <= target:
+            out.append((path, 0, size))
+            continue
+        with LineScanner(path) as sc:
+            start = 0
+            while start < sc.size:
+                end = sc.line_start(start + target)
+                out.append((path, start, end))
+                start = end
+    return out
+
+
+def iter_range(path: str, start: int, end: int) -> Iterator[Tuple[int, Any]]:
+    """(offset, parsed row) for lines starting in [start, end); unparseable lines are skipped."""
+    with LineScanner(path) as sc:
+        for off, line in sc.lines(start, end, decode=True):
+            try:
+                yield off, storage.parse_line(line)
+            except Exception:
+                continue
+
+
+def map_ranges(fn: Callable[[str, int, int], T], paths: Iterable[os.PathLike | str],
+               workers: Optional[int] = None) -> List[T]:
+    """Run fn over every range; results in order."""
+    workers = workers or default_workers()
+    ranges = plan(paths, workers)
+    total = sum(end - start for _, start, end in ranges)
+    if workers <= 1 or len(ranges) <= 1 or total < PARALLEL_MIN_BYTES or storage.encrypted():
+        return [fn(*r) for r in ranges]
+    # spawn: forking a process that runs Tk/socket threads is not safe
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=ctx) as pool:
+        futures = [pool.submit(fn, *r) for r in ranges]
+        return [f.result() for f in futures]
+
+
+def map_reduce(fn: Callable[[str, int, int], T], reduce: Callable[[R, T], R], initial: R,
+               paths: Iterable[os.PathLike | str], workers: Optional[int] = None) -> R:
+    """Fold the in-order results of map_ranges() with reduce(acc, part)."""
+    acc = initial
+    for part in map_ranges(fn, paths, workers):
+        acc = reduce(acc, part)
+    return acc
@@ -0,0 +1,541 @@
+# =============================
+# File: app/server.py
+# =============================
+"""
+Local HTTP/JSON API backed by AppState (asyncio, stdlib only).
+
+    python -m app.server [--host 127.0.0.1] [--port 8765] [--data-dir DIR]
+    python -m app.server --profiles ROOT [--max-open N] [--max-mb MB] [--create-profiles]
+
+or alongside the GUI with ``python -m app.main --api-port 8765``.
+
+Endpoints
+  GET    /balance                      {"balance"}                    (ETag)
+  GET    /tasks                        [task, ...]
+  POST   /tasks                        {description, buy_in, payout} or a list of them
+  POST   /tasks/<id>/complete          {"balance"}
+  DELETE /tasks/<id>                   {"penalized", "penalty", "balance"}
+  POST   /purchases                    {description, amount} (Idempotency-Key header optional)
+  GET    /history?limit=50&before=N    {"rows" (newest first), "next"} (ETag)
+  GET    /events?since=N&timeout=25    long-poll for ledger entries after byte N
+  GET    /events/stream                Server-Sent Events (Last-Event-ID = byte offset)
+
+With --profiles every directory under ROOT is a profile (app.profiles):
+the endpoints above live under /profiles/<name>/..., and GET /profiles
+lists the names. Profiles are opened on first request and the least
+recently used idle ones are closed once more than --max-open are open or
+they hold more than --max-mb; maintenance covers the open ones (a profile
+catches up on missed forfeits when it is reopened).
+
+Writes are queued onto a single writer (one thread, FIFO) so concurrent
+clients are serialized; reads run on the default executor and never wait
+behind writes. Event ids are ledger byte offsets; a smaller id than the one
+you sent means the ledger was compacted and the stream restarted.
+
+Requests must name this server in Host (127.0.0.1, localhost or [::1] with
+the port) and may only carry a same-server Origin, so web pages cannot reach
+the API through the browser, including via DNS rebinding. POST and DELETE
+also need ``Content-Type: application/json``, which a cross-site form
+cannot send without a preflight.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import os
+import re
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from . import storage
+
+DEFAULT_PORT = 8765
+MAX_BODY = 1 << 20
+POLL_INTERVAL = 1.0  # seconds between ledger stat checks while clients wait
+SSE_HEARTBEAT = 15.0
+
+_REASONS = {
+    200: "OK", 201: "Created", 304: "Not Modified", 400: "Bad Request",
+    403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 415: "Unsupported Media Type", 500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body", "target")
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> None:
+        parts = urlsplit(target)
+        self.method = method.upper()
+        self.path = parts.path.rstrip("/") or "/"
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+        self.target: Any = None  # the data set being served (state, backend, ctx)
+
+    def json(self) -> Any:
+        try:
+            return json.loads(self.body.decode("utf-8") or "null")
+        except ValueError as e:
+            raise HttpError(400, f"Invalid JSON body: {e}")
+
+    def int_arg(self, name: str, default: Optional[int], lo: int = 0, hi: int = 10**12) -> Optional[int]:
+        raw = self.query.get(name)
+        if raw is None or raw == "":
+            return default
+        try:
+            return max(lo, min(hi, int(raw)))
+        except ValueError:
+            raise HttpError(400, f"{name} must be an integer")
+
+
+def _file_etag(path, extra: str = "") -> str:
+    try:
+        st = os.stat(path)
+        tag = f"{st.st_size:x}-{st.st_mtime_ns:x}"
+    except OSError:
+        tag = "0-0"
+    return f'W/"{tag}{extra}"'
+
+
+class _Target:
+    """One data set: its AppState, the object that takes writes, and its storage context."""
+    __slots__ = ("state", "backend", "ctx")
+
+    def __init__(self, state, backend: Any = None) -> None:
+        self.state = state
+        self.backend = backend or state
+        self.ctx = state.ctx
+
+
+_LOOPBACK_NAMES = ("127.0.0.1", "localhost", "[::1]")
+_WILDCARD_HOSTS = ("", "0.0.0.0", "::")
+
+_PROFILE_PATH = re.compile(r"^/profiles/(?P<name>[^/]+)(?P<rest>/.*)?$")
+
+
+class ApiServer:
+    """
+    `backend` receives the write calls (add_tasks, complete_task, delete_task,
+    record_purchase); it defaults to the AppState. `submit(fn)` must run fn
+    on the one writer and return a concurrent Future; the GUI passes a
+    function that runs fn on the Tk thread. With `maintenance=True`
+    (headless) the server also forfeits overdue tasks once a minute, the
+    job the GUI's tick does otherwise. With a `pool` (app.profiles) and no
+    state, it serves every profile in the pool under /profiles/<name>.
+    """
+
+    def __init__(self, state=None, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 backend: Any = None, submit: Optional[Callable[[Callable[[], Any]], Future]] = None,
+                 maintenance: bool = False, pool: Any = None) -> None:
+        self.state = state
+        self.pool = pool
+        self._default = _Target(state, backend) if state is not None else None
+        self.maintenance = maintenance
+        self.host = host
+        self.port = port
+        self._own_writer: Optional[ThreadPoolExecutor] = None
+        if submit is None:
+            self._own_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-writer")
+            submit = self._own_writer.submit
+        self._submit = submit
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._waiters = 0
+        self._ledger_sizes: Dict[str, int] = {}
+        self._routes: List[Tuple[str, re.Pattern, Callable]] = [
+            ("GET", re.compile(r"^/balance$"), self._get_balance),
+            ("GET", re.compile(r"^/tasks$"), self._get_tasks),
+            ("POST", re.compile(r"^/tasks$"), self._post_tasks),
+            ("POST", re.compile(r"^/tasks/(?P<task_id>[^/]+)/complete$"), self._post_complete),
+            ("DELETE", re.compile(r"^/tasks/(?P<task_id>[^/]+)$"), self._delete_task),
+            ("POST", re.compile(r"^/purchases$"), self._post_purchase),
+            ("GET", re.compile(r"^/history$"), self._get_history),
+            ("GET", re.compile(r"^/events$"), self._get_events),
+            ("GET", re.compile(r"^/events/stream$"), self._get_event_stream),
+        ]
+
+    # ---------- Lifecycle ----------
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_conn, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._loop.create_task(self._watch_ledger())
+        if self.maintenance:
+            self._loop.create_task(self._maintain())
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                if self._server.is_serving():
+                    raise  # cancelled from outside, not by stop()
+
+    def stop(self) -> None:
+        """Thread-safe shutdown."""
+        loop = self._loop
+        if loop is not None and self._server is not None:
+            loop.call_soon_threadsafe(self._server.close)
+        if self._own_writer is not None:
+            self._own_writer.shutdown(wait=False)
+
+    # ---------- Change notification ----------
+    def _pulse(self) -> None:
+        ev, self._changed = self._changed, asyncio.Event()
+        ev.set()
+
+    def _ledger_paths(self) -> List[str]:
+        if self._default is not None:
+            return [str(self._default.ctx.ledger_path)]
+        return [str(self.pool.root / name / "ledger.txt") for name in self.pool.open_profiles()]
+
+    async def _watch_ledger(self) -> None:
+        """Pick up appends made by other processes (CLI, GUI) while clients wait."""
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            if not self._waiters:
+                continue
+            changed = False
+            for path in self._ledger_paths():
+                try:
+                    size = os.stat(path).st_size
+                except OSError:
+                    size = 0
+                if size != self._ledger_sizes.get(path, -1):
+                    self._ledger_sizes[path] = size
+                    changed = True
+            if changed:
+                self._pulse()
+
+    async def _maintain(self) -> None:
+        from . import columnar
+        while True:
+            names = [None] if self._default is not None else self.pool.open_profiles()
+            for name in names:
+                try:
+                    target = await self._acquire(name)
+                except Exception:
+                    continue
+                try:
+                    await self._write(target, target.state.reload_settings)  # edits made elsewhere
+                    await self._write(target, target.state.forfeit_overdue)
+                    await self._write(target, target.state.materialize_recurring)
+                    await self._write(target, columnar.sync)
+                except Exception:
+                    pass
+                finally:
+                    self._release(target)
+            await asyncio.sleep(60)
+
+    async def _wait_change(self, timeout: float) -> None:
+        ev = self._changed
+        self._waiters += 1
+        try:
+            await asyncio.wait_for(ev.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters -= 1
+
+    # ---------- Targets ----------
+    async def _acquire(self, name: Optional[str]) -> Any:
+        if name is None:
+            return self._default
+        return await asyncio.get_running_loop().run_in_executor(None, self.pool.acquire, name)
+
+    def _release(self, target: Any) -> None:
+        if target is not self._default:
+            self.pool.release(target)
+
+    # ---------- Reads / writes ----------
+    async def _read(self, target: Any, fn: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, target.ctx.run, fn, *args)
+
+    async def _write(self, target: Any, fn: Callable[[], Any]) -> Any:
+        result = await asyncio.wrap_future(self._submit(lambda: target.ctx.run(fn)))
+        self._pulse()
+        return result
+
+    # ---------- Handlers ----------
+    async def _get_profiles(self, req: Request):
+        names = await asyncio.get_running_loop().run_in_executor(None, self.pool.names)
+        return 200, {"profiles": names, "open": self.pool.open_profiles()}, {}
+
+    async def _get_balance(self, req: Request):
+        etag = _file_etag(req.target.ctx.ledger_path)
+        if req.headers.get("if-none-match") == etag:
+            return 304, None, {"ETag": etag}
+        bal = await self._read(req.target, storage.compute_balance)
+        return 200, {"balance": round(bal, 2)}, {"ETag": etag}
+
+    async def _get_tasks(self, req: Request):
+        return 200, [t.to_dict() for t in list(req.target.state.tasks)], {}
+
+    async def _post_tasks(self, req: Request):
+        body = req.json()
+        specs = body if isinstance(body, list) else [body]
+        if not all(isinstance(s, dict) for s in specs):
+            raise HttpError(400, "Expected a task object or a list of task objects")
+        tasks = await self._write(req.target, lambda: req.target.backend.add_tasks(specs))
+        out = [t.to_dict() for t in tasks]
+        return 201, (out if isinstance(body, list) else out[0]), {}
+
+    async def _post_complete(self, req: Request, task_id: str):
+        await self._write(req.target, lambda: req.target.backend.complete_task(task_id))
+        return 200, {"balance": round(req.target.state.balance, 2)}, {}
+
+    async def _delete_task(self, req: Request, task_id: str):
+        res = await self._write(req.target, lambda: req.target.backend.delete_task(task_id))
+        return 200, {**res, "balance": round(req.target.state.balance, 2)}, {}
+
+    async def _post_purchase(self, req: Request):
+        body = req.json() or {}
+        if not isinstance(body, dict):
+            raise HttpError(400, "Expected {description, amount}")
+        desc = str(body.get("description", ""))
+        amount = body.get("amount")
+        # A retried request with the same Idempotency-Key is recorded once
+        key = req.headers.get("idempotency-key") or body.get("key")
+        key = str(key) if key else None
+        await self._write(req.target, lambda: req.target.backend.record_purchase(desc, amount, key=key))
+        return 201, {"balance": round(req.target.state.balance, 2)}, {}
+
+    async def _get_history(self, req: Request):
+        limit = req.int_arg("limit", 50, lo=1, hi=1000)
+        before = req.int_arg("before", None)
+        etag = _file_etag(req.target.ctx.history_path, f":{before}:{limit}")
+        if req.headers.get("if-none-match") == etag:
+            return 304, None, {"ETag": etag}
+        rows, cursor = await self._read(req.target, storage.read_history_page, before, limit)
+        return 200, {"rows": rows, "next": cursor}, {"ETag": etag}
+
+    async def _get_events(self, req: Request):
+        since = req.int_arg("since", None)
+        timeout = req.int_arg("timeout", 25, lo=0, hi=120)
+        if since is None:
+            # First call: start from "now" so clients don't replay the whole ledger
+            _, offset = await self._read(req.target, storage.read_ledger_since, 1 << 62)
+            return 200, {"events": [], "next": offset}, {}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            events, offset = await self._read(req.target, storage.read_ledger_since, since)
+            remaining = deadline - loop.time()
+            if events or offset < since or remaining <= 0:
+                return 200, {"events": events, "next": offset, "reset": offset < since}, {}
+            await self._wait_change(remaining)
+
+    async def _get_event_stream(self, req: Request, writer: asyncio.StreamWriter):
+        last = req.headers.get("last-event-id") or req.query.get("since")
+        try:
+            offset = int(last) if last is not None else None
+        except ValueError:
+            offset = None
+        if offset is None:
+            _, offset = await self._read(req.target, storage.read_ledger_since, 1 << 62)
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+        )
+        writer.write(f"retry: 2000\nid: {offset}\n\n".encode())
+        await writer.drain()
+        loop = asyncio.get_running_loop()
+        last_beat = loop.time()
+        while True:
+            events, new_offset = await self._read(req.target, storage.read_ledger_since, offset)
+            if new_offset < offset:
+                writer.write(f"event: reset\nid: {new_offset}\ndata: {{}}\n\n".encode())
+            for e in events:
+                writer.write(f"event: ledger\ndata: {json.dumps(e)}\n\n".encode())
+            if events:
+                writer.write(f"id: {new_offset}\n\n".encode())
+            offset = new_offset
+            if loop.time() - last_beat >= SSE_HEARTBEAT:
+                writer.write(b": keep-alive\n\n")
+                last_beat = loop.time()
+            await writer.drain()  # raises once the client goes away
+            await self._wait_change(SSE_HEARTBEAT)
+
+    # ---------- HTTP plumbing ----------
+    async def _handle_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Malformed request line"}, {}, False)
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "Body too large"}, {}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep = version.upper() == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if not await self._dispatch(Request(method, target, headers, body), writer, keep):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    def _check_caller(self, req: Request) -> None:
+        """Refuse requests a browser page could have sent on someone's behalf."""
+        names = set(_LOOPBACK_NAMES)
+        if self.host not in _WILDCARD_HOSTS:
+            names.add(f"[{self.host}]" if ":" in self.host else self.host)
+        hosts = {f"{n}:{self.port}" for n in names}
+        if req.headers.get("host", "").lower() not in hosts:
+            raise HttpError(403, "Unknown Host")
+        origin = req.headers.get("origin")
+        if origin is not None and origin.lower() not in {f"http://{h}" for h in hosts}:
+            raise HttpError(403, "Cross-origin requests are not allowed")
+        if req.method in ("POST", "DELETE"):
+            ctype = req.headers.get("content-type", "").partition(";")[0].strip().lower()
+            if ctype != "application/json":
+                raise HttpError(415, "Content-Type must be application/json")
+
+    async def _dispatch(self, req: Request, writer: asyncio.StreamWriter, keep: bool) -> bool:
+        try:
+            self._check_caller(req)
+        except HttpError as e:
+            return await self._respond(writer, e.status, {"error": str(e)}, {}, keep)
+        if self._default is not None:
+            req.target = self._default
+            return await self._route(req, writer, keep)
+        if req.path == "/profiles":
+            if req.method != "GET":
+                return await self._respond(writer, 405, {"error": "Method not allowed"}, {}, keep)
+            status, payload, headers = await self._get_profiles(req)
+            return await self._respond(writer, status, payload, headers, keep)
+        m = _PROFILE_PATH.match(req.path)
+        if not m:
+            return await self._respond(writer, 404, {"error": "Not found"}, {}, keep)
+        try:
+            req.target = await self._acquire(m["name"])
+        except KeyError as e:
+            return await self._respond(writer, 404, {"error": e.args[0]}, {}, keep)
+        except ValueError as e:
+            return await self._respond(writer, 400, {"error": str(e)}, {}, keep)
+        req.path = m["rest"] or "/"
+        try:
+            return await self._route(req, writer, keep)
+        finally:
+            self._release(req.target)
+
+    async def _route(self, req: Request, writer: asyncio.StreamWriter, keep: bool) -> bool:
+        allowed = False
+        for method, pattern, handler in self._routes:
+            m = pattern.match(req.path)
+            if not m:
+                continue
+            allowed = True
+            if method != req.method:
+                continue
+            try:
+                if handler == self._get_event_stream:
+                    await handler(req, writer)
+                    return False
+                status, payload, headers = await handler(req, **m.groupdict())
+            except HttpError as e:
+                status, payload, headers = e.status, {"error": str(e)}, {}
+            except KeyError as e:
+                status, payload, headers = 404, {"error": e.args[0] if e.args else "Not found"}, {}
+            except PermissionError as e:
+                status, payload, headers = 403, {"error": str(e)}, {}
+            except (ValueError, TypeError) as e:
+                status, payload, headers = 400, {"error": str(e)}, {}
+            except Exception as e:
+                status, payload, headers = 500, {"error": f"{type(e).__name__}: {e}"}, {}
+            return await self._respond(writer, status, payload, headers, keep)
+        if allowed:
+            return await self._respond(writer, 405, {"error": "Method not allowed"}, {}, keep)
+        return await self._respond(writer, 404, {"error": "Not found"}, {}, keep)
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Any,
+                       headers: Dict[str, str], keep: bool) -> bool:
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}"]
+        if payload is not None:
+            head.append("Content-Type: application/json")
+        head.append(f"Content-Length: {len(body)}")
+        head.append("Connection: " + ("keep-alive" if keep else "close"))
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+        return keep
+
+
+def serve_in_thread(server: ApiServer):
+    """Run `server` on its own event loop in a daemon thread (GUI mode)."""
+    import threading
+    t = threading.Thread(target=lambda: asyncio.run(server.serve_forever()),
+                         name="api-server", daemon=True)
+    t.start()
+    return t
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m app.server",
+                                     description="Todo Gamble local HTTP/JSON API (headless)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--data-dir", help=f"data directory (default {storage.APP_DIR})")
+    parser.add_argument("--profiles", metavar="ROOT", help="serve every profile directory under ROOT")
+    parser.add_argument("--max-open", type=int, default=8, help="open profiles kept in memory (--profiles)")
+    parser.add_argument("--max-mb", type=int, default=64, help="memory budget for open profiles (--profiles)")
+    parser.add_argument("--create-profiles", action="store_true",
+                        help="create a profile directory on its first request (--profiles)")
+    args = parser.parse_args(argv)
+    if args.data_dir:
+        storage.set_app_dir(args.data_dir)
+
+    state = pool = None
+    if args.profiles:
+        from .profiles import ProfilePool
+        pool = ProfilePool(args.profiles, max_open=args.max_open, max_bytes=args.max_mb * 1024 * 1024,
+                           create=args.create_profiles)
+    else:
+        from .app_state import AppState
+        state = AppState()
+    server = ApiServer(state, host=args.host, port=args.port, maintenance=True, pool=pool)
+
+    print(f"Todo Gamble API on http://{server.host}:{server.port}", file=sys.stderr, flush=True)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pool is not None:
+            pool.close_all()
+        else:
+            state.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+# =============================
+# File: app/settings.py
+# =============================
+"""
+Typed settings (APP_DIR/settings.json).
+
+    {"version": 2,
+     "creation_window": {"start": "11:00", "end": "12:00"},   local HH:MM
+     "notifications": {"window_open": true, "pre_end_minutes": 10},
+     "sync_dir": null}                                         app.sync folder
+
+Every field has a default and a check. Loading fills in missing fields
+(nested ones too) and replaces invalid ones with their default, noting
+each in `problems`; the app always starts. Writing is strict: an invalid
+value raises SettingsError (a ValueError) naming the field, and nothing
+is saved. Unknown keys are kept as they are.
+
+Files carry a schema version. Older files go through MIGRATIONS in order
+(version N -> N+1) and are written back once; files without a version are
+version 1.
+
+SettingsStore.get() is a stat() of settings.json; it re-reads the file
+only when its mtime/size changed, so callers can check on every tick and
+still see edits made by hand, by the CLI or over IPC. A file that doesn't
+parse keeps the last good settings (and is logged). Saving keeps the
+unknown keys found on disk, and copies an unparseable file to
+settings.json.bad before replacing it. AppState compares
+the new Settings with the old and only invalidates what depends on the
+sections that changed (see AppState.reload_settings).
+"""
+from __future__ import annotations
+import dataclasses
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+from dataclasses import dataclass, field
+from datetime import time
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from . import storage
+from . import metrics
+
+SCHEMA_VERSION = 2
+_HHMM_RE = re.compile(r"^(\d{1,2}):(\d{1,2})$")
+
+
+class SettingsError(ValueError):
+    """An invalid settings value; `field` is its dotted name."""
+
+    def __init__(self, field: str, message: str) -> None:
+        super().__init__(f"{field}: {message}")
+        self.field = field
+
+
+# ---------- Checks (value -> canonical value, or SettingsError) ----------
+def _hhmm(name: str, value: Any) -> str:
+    m = _HHMM_RE.match(value.strip()) if isinstance(value, str) else None
+    if m is None or int(m[1]) > 23 or int(m[2]) > 59:
+        raise SettingsError(name, f"expected a time as HH:MM, got {value!r}")
+    return f"{int(m[1]):02d}:{int(m[2]):02d}"
+
+
+def _bool(name: str, value: Any) -> bool:
+    if not isinstance(value, bool):
+        raise SettingsError(name, f"expected true or false, got {value!r}")
+    return value
+
+
+def _minutes(name: str, value: Any) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 240:
+        raise SettingsError(name, f"expected whole minutes from 0 to 240, got {value!r}")
+    return value
+
+
+def _optional_path(name: str, value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise SettingsError(name, f"expected a folder path, got {value!r}")
+    return value
+
+
+def _check(fn: Callable[[str, Any], Any]) -> Dict[str, Any]:
+    return {"check": fn}
+
+
+def _section(cls: type) -> Dict[str, Any]:
+    return {"section": cls}
+
+
+# ---------- Schema ----------
+@dataclass(frozen=True)
+class CreationWindow:
+    start: str = field(default="11:00", metadata=_check(_hhmm))
+    end: str = field(default="12:00", metadata=_check(_hhmm))  # at or before start = crosses midnight
+
+    def times(self) -> Tuple[time, time]:
+        (sh, sm), (eh, em) = (map(int, v.split(":")) for v in (self.start, self.end))
+        return time(sh, sm), time(eh, em)
+
+
+@dataclass(frozen=True)
+class Notifications:
+    window_open: bool = field(default=True, metadata=_check(_bool))
+    pre_end_minutes: int = field(default=10, metadata=_check(_minutes))  # 0 = no reminder
+
+
+@dataclass(frozen=True)
+class Settings:
+    creation_window: CreationWindow = field(default_factory=CreationWindow, metadata=_section(CreationWindow))
+    notifications: Notifications = field(default_factory=Notifications, metadata=_section(Notifications))
+    sync_dir: Optional[str] = field(default=None, metadata=_check(_optional_path))
+    extra: Dict[str, Any] = field(default_factory=dict)  # unknown keys, written back unchanged
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"version": SCHEMA_VERSION, **self.extra}
+        for f in _fields(Settings):
+            value = getattr(self, f.name)
+            if "section" in f.metadata:
+                out[f.name] = dataclasses.asdict(value)
+            elif value is not None:
+                out[f.name] = value
+        return out
+
+    def changed(self, other: "Settings") -> FrozenSet[str]:
+        """Names of the top-level fields (sections) that differ."""
+        names = {f.name for f in _fields(Settings) if getattr(self, f.name) != getattr(other, f.name)}
+        if self.extra != other.extra:
+            names.add("extra")
+        return frozenset(names)
+
+    def with_values(self, changes: Dict[str, Any]) -> "Settings":
+        """A copy with dotted-name changes ({"creation_window.start": "09:00"}); raises SettingsError."""
+        data = self.to_dict()
+        for name, value in changes.items():
+            *parents, leaf = name.split(".")
+            node = data
+            for p in parents:
+                if not isinstance(node.get(p), dict):
+                    raise SettingsError(name, "unknown setting")
+                node = node[p]
+            if name not in KNOWN:
+                raise SettingsError(name, "unknown setting")
+            node[leaf] = value
+        return parse(data, strict=True)[0]
+
+
+def coerce(text: str) -> Any:
+    """A command-line value: JSON when it parses (10, true, null), else the text itself."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _fields(cls: type) -> List[dataclasses.Field]:
+    return [f for f in dataclasses.fields(cls) if f.name != "extra"]
+
+
+def _build(cls: type, data: Any, prefix: str, strict: bool, problems: List[str]) -> Any:
+    if not isinstance(data, dict):
+        if data is not None:
+            _problem(SettingsError(prefix.rstrip(".") or "settings", "expected an object"), strict, problems)
+        data = {}
+    values: Dict[str, Any] = {}
+    for f in _fields(cls):
+        name = prefix + f.name
+        if "section" in f.metadata:
+            values[f.name] = _build(f.metadata["section"], data.get(f.name), name + ".", strict, problems)
+        elif f.name in data:
+            try:
+                values[f.name] = f.metadata["check"](name, data[f.name])
+            except SettingsError as e:
+                _problem(e, strict, problems)  # the default stays
+    return cls(**values)
+
+
+def _problem(e: SettingsError, strict: bool, problems: List[str]) -> None:
+    if strict:
+        raise e
+    problems.append(f"{e}; using the default")
+
+
+def _known(cls: type, prefix: str = "") -> List[str]:
+    out: List[str] = []
+    for f in _fields(cls):
+        if "section" in f.metadata:
+            out += _known(f.metadata["section"], prefix + f.name + ".")
+        else:
+            out.append(prefix + f.name)
+    return out
+
+
+KNOWN = frozenset(_known(Settings))  # dotted names accepted by with_values()
+
+
+# ---------- Versions ----------
+def _v1_to_v2(data: Dict[str, Any]) -> Dict[str, Any]:
+    # v1: creation_window only (times as typed, e.g. "9:5"); v2 adds notifications
+    win = data.get("creation_window")
+    if isinstance(win, dict):
+        for k in ("start", "end"):
+            try:
+                win[k] = _hhmm(k, win.get(k))
+            except SettingsError:
+                pass  # left for parse() to report
+    data.setdefault("notifications", dataclasses.asdict(Notifications()))
+    return data
+
+
+MIGRATIONS: Dict[int, Callable[[Dict[str, Any]], Dict[str, Any]]] = {1: _v1_to_v2}
+
+
+def migrate(data: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """Bring a settings dict up to SCHEMA_VERSION. Returns (data, whether anything ran)."""
+    version = data.get("version", 1)
+    if not isinstance(version, int) or version >= SCHEMA_VERSION:
+        return data, False
+    while version < SCHEMA_VERSION:
+        data = MIGRATIONS[version](dict(data))
+        version += 1
+    data["version"] = version
+    return data, True
+
+
+def parse(data: Any, strict: bool = False) -> Tuple[Settings, List[str]]:
+    """(Settings, problems) from a settings dict of any known version."""
+    problems: List[str] = []
+    if not isinstance(data, dict):
+        _problem(SettingsError("settings", "expected an object"), strict, problems)
+        data = {}
+    data, _ = migrate(dict(data))
+    settings = _build(Settings, data, "", strict, problems)
+    return dataclasses.replace(settings, extra=_extra(data)), problems
+
+
+def _extra(data: Dict[str, Any]) -> Dict[str, Any]:
+    known = {f.name for f in _fields(Settings)} | {"version"}
+    return {k: v for k, v in data.items() if k not in known}
+
+
+# ---------- Store ----------
+class SettingsStore:
+    """settings.json of one data directory, re-read only when its stat changes."""
+
+    def __init__(self, root: Path) -> None:
+        self.path = root / "settings.json"
+        self._lock = threading.RLock()
+        self._settings = Settings()
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._loaded = False
+        self.problems: List[str] = []  # from the last load
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self) -> Settings:
+        with self._lock:
+            self.reload_if_changed()
+            return self._settings
+
+    @metrics.timed("settings.reload")
+    def reload_if_changed(self) -> bool:
+        with self._lock:
+            stamp = self._file_stamp()
+            if self._loaded and stamp == self._stamp:
+                return False
+            self._loaded = True
+            if stamp is None:
+                self._settings, self.problems = Settings(), []
+                self.save(self._settings)  # write the defaults once
+                return True
+            try:
+                data = self._read_file()
+            except (OSError, ValueError) as e:
+                # Left as is so it can be fixed by hand; the last good settings meanwhile
+                self._stamp = stamp
+                self.problems = [f"settings.json is unreadable ({e}); keeping the last settings"]
+                print(f"error: {self.problems[0]}", file=sys.stderr)
+                return False
+            self._settings, self.problems = parse(data)
+            self._stamp = stamp
+            if not self.problems and isinstance(data, dict) and migrate(dict(data))[1]:
+                self.save(self._settings)  # migrated: write the current version once
+            return True
+
+    def _read_file(self, metric: str = "settings.reload") -> Dict[str, Any]:
+        """settings.json as a dict; OSError/ValueError if it can't be read or isn't an object."""
+        text = self.path.read_text(encoding="utf-8")
+        metrics.add_bytes(metric, read=len(text))
+        data = json.loads(text)
+        if not isinstance(data, dict):
+            raise ValueError("expected an object")
+        return data
+
+    def _carry_over(self, out: Dict[str, Any]) -> None:
+        """Add the unknown keys on disk that `out` doesn't have."""
+        if not self.path.exists():
+            return
+        try:
+            data = self._read_file("settings.save")
+        except (OSError, ValueError) as e:
+            shutil.copyfile(self.path, self.path.with_name(self.path.name + ".bad"))
+            print(f"error: settings.json is unreadable ({e}); saved a copy as settings.json.bad",
+                  file=sys.stderr)
+            return
+        for k, v in _extra(data).items():
+            out.setdefault(k, v)
+
+    @metrics.timed("settings.save")
+    def save(self, settings: Settings) -> None:
+        """Write `settings`, keeping unknown keys that are on disk but not in it."""
+        with self._lock:
+            data = settings.to_dict()
+            self._carry_over(data)
+            settings = dataclasses.replace(settings, extra=_extra(data))
+            text = json.dumps(data, indent=2)
+            metrics.add_bytes("settings.save", written=len(text))
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            storage.atomic_write(self.path, text)
+            self._settings, self._stamp, self._loaded = settings, self._file_stamp(), True
+            self.problems = []  # what was wrong on disk has just been replaced
+
+    def update(self, changes: Dict[str, Any]) -> Settings:
+        """Validate and save dotted-name changes; raises SettingsError (nothing saved)."""
+        with self._lock:
+            new = self.get().with_values(changes)
+            self.save(new)
+            return new
+
+
+def store(ctx: Optional[storage.StorageContext] = None) -> SettingsStore:
+    """The settings store of `ctx` (default: the active data directory)."""
+    return (ctx or storage.current()).obj("settings", SettingsStore)
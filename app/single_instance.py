@@ -0,0 +1,447 @@
+# =============================
+# File: app/single_instance.py
+# =============================
+"""
+Single-instance lock and local command channel.
+
+- Lock: ``APP_DIR/instance.lock`` held with ``fcntl.flock`` (POSIX) or
+  ``msvcrt.locking`` (Windows). The OS drops it if the process dies.
+- Channel: a Unix domain socket at ``APP_DIR/instance.sock`` where AF_UNIX is
+  available, otherwise TCP on 127.0.0.1 with the port written to
+  ``APP_DIR/instance.port``.
+- Protocol: every message is a 4-byte big-endian length followed by a UTF-8
+  JSON body. Requests are ``{"cmd": name, "args": {...}}``; responses are
+  ``{"ok": true, "result": ...}`` or ``{"ok": false, "error": "..."}``.
+
+The server runs one non-blocking ``selectors`` loop on a daemon thread, so any
+number of clients can be connected at once. Handlers may return a value or a
+``concurrent.futures.Future`` (e.g. work marshalled onto the Tk thread); the
+loop keeps serving other connections while a future is pending.
+"""
+from __future__ import annotations
+import json
+import os
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from . import storage
+
+COMMANDS = ("show", "add-task", "complete", "balance", "quit", "profile")
+
+MAX_FRAME = 1 << 20  # 1 MiB; commands are tiny
+_HEADER = struct.Struct(">I")
+
+Handler = Callable[[Dict[str, Any]], Any]
+
+
+class InstanceNotRunning(ConnectionError):
+    """No primary instance is listening."""
+
+
+def _lock_path() -> Path:
+    return storage.APP_DIR / "instance.lock"
+
+
+def _sock_path() -> Path:
+    return storage.APP_DIR / "instance.sock"
+
+
+def _port_path() -> Path:
+    return storage.APP_DIR / "instance.port"
+
+
+def _use_unix_socket() -> bool:
+    return hasattr(socket, "AF_UNIX") and sys.platform != "win32"
+
+
+# -------- Lock --------
+
+class InstanceLock:
+    """Non-blocking exclusive lock on a file; held until release() or exit."""
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path or _lock_path()
+        self._fh = None
+
+    def acquire(self) -> bool:
+        storage.ensure_dirs()
+        fh = open(self.path, "a+b")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        # Record the owner for diagnostics (the lock itself is what matters)
+        try:
+            fh.seek(0)
+            fh.truncate()
+            fh.write(str(os.getpid()).encode("ascii"))
+            fh.flush()
+        except OSError:
+            pass
+        self._fh = fh
+        return True
+
+    def release(self) -> None:
+        fh, self._fh = self._fh, None
+        if fh is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        except OSError:
+            pass
+        finally:
+            fh.close()
+
+
+# -------- Framing --------
+
+def encode_frame(obj: Any) -> bytes:
+    body = json.dumps(obj).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed mid-frame")
+        buf += chunk
+    return bytes(buf)
+
+
+def _read_frame(sock: socket.socket) -> Any:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > MAX_FRAME:
+        raise ValueError(f"Frame too large: {size} bytes")
+    return json.loads(_recv_exact(sock, size).decode("utf-8"))
+
+
+# -------- Server --------
+
+class _Conn:
+    __slots__ = ("sock", "inbuf", "outbuf", "pending", "closing")
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.pending = 0  # futures still outstanding
+        self.closing = False
+
+
+class CommandServer:
+    """Selector-driven command server for the primary instance."""
+
+    def __init__(self, handlers: Optional[Dict[str, Handler]] = None) -> None:
+        self.handlers: Dict[str, Handler] = dict(handlers or {})
+        self._sel = selectors.DefaultSelector()
+        self._listener: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._ready: list[tuple[_Conn, dict]] = []  # responses produced off-loop
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+    def register(self, cmd: str, handler: Handler) -> None:
+        self.handlers[cmd] = handler
+
+    def start(self) -> bool:
+        """Bind the channel and start the loop thread. False if binding failed."""
+        storage.ensure_dirs()
+        try:
+            self._listener = self._bind()
+        except OSError:
+            return False
+        self._listener.setblocking(False)
+        self._sel.register(self._listener, selectors.EVENT_READ, "accept")
+        self._sel.register(self._wake_r, selectors.EVENT_READ, "wake")
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="instance-ipc", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        self._running = False
+        self._wake()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        for key in list(self._sel.get_map().values()):
+            try:
+                key.fileobj.close()
+            except Exception:
+                pass
+        self._sel.close()
+        try:
+            self._wake_w.close()
+        except Exception:
+            pass
+        if _use_unix_socket():
+            _sock_path().unlink(missing_ok=True)
+        else:
+            _port_path().unlink(missing_ok=True)
+
+    def _bind(self) -> socket.socket:
+        if _use_unix_socket():
+            path = _sock_path()
+            # We hold the instance lock, so any existing socket file is stale
+            path.unlink(missing_ok=True)
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.bind(str(path))
+            try:
+                os.chmod(path, 0o600)
+            except OSError:
+                pass
+        else:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.bind(("127.0.0.1", 0))
+            _port_path().write_text(str(s.getsockname()[1]), encoding="ascii")
+        s.listen(16)
+        return s
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _loop(self) -> None:
+        while self._running:
+            try:
+                events = self._sel.select(timeout=1.0)
+            except OSError:
+                break
+            for key, mask in events:
+                if key.data == "accept":
+                    self._accept()
+                elif key.data == "wake":
+                    self._drain_wake()
+                else:
+                    conn: _Conn = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._on_readable(conn)
+                    if mask & selectors.EVENT_WRITE and not conn.closing:
+                        self._on_writable(conn)
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            sock.setblocking(False)
+            self._sel.register(sock, selectors.EVENT_READ, _Conn(sock))
+
+    def _drain_wake(self) -> None:
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            return
+        with self._lock:
+            ready, self._ready = self._ready, []
+        for conn, response in ready:
+            conn.pending -= 1
+            if not conn.closing:
+                self._queue(conn, response)
+
+    def _on_readable(self, conn: _Conn) -> None:
+        try:
+            data = conn.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close(conn)
+            return
+        conn.inbuf += data
+        while len(conn.inbuf) >= _HEADER.size:
+            (size,) = _HEADER.unpack_from(conn.inbuf)
+            if size > MAX_FRAME:
+                self._close(conn)
+                return
+            if len(conn.inbuf) < _HEADER.size + size:
+                break
+            body = bytes(conn.inbuf[_HEADER.size:_HEADER.size + size])
+            del conn.inbuf[:_HEADER.size + size]
+            self._dispatch(conn, body)
+
+    def _dispatch(self, conn: _Conn, body: bytes) -> None:
+        try:
+            req = json.loads(body.decode("utf-8"))
+            cmd = req.get("cmd")
+            args = req.get("args") or {}
+            handler = self.handlers.get(cmd)
+            if handler is None:
+                raise KeyError(f"Unknown command: {cmd}")
+            result = handler(args)
+        except Exception as e:
+            self._queue(conn, _error(e))
+            return
+        if isinstance(result, Future):
+            conn.pending += 1
+            result.add_done_callback(lambda fut, c=conn: self._complete_later(c, fut))
+        else:
+            self._queue(conn, {"ok": True, "result": result})
+
+    def _complete_later(self, conn: _Conn, fut: Future) -> None:
+        # May run on any thread: hand the response back to the loop
+        try:
+            response = {"ok": True, "result": fut.result()}
+        except Exception as e:
+            response = _error(e)
+        with self._lock:
+            self._ready.append((conn, response))
+        self._wake()
+
+    def _queue(self, conn: _Conn, response: dict) -> None:
+        try:
+            conn.outbuf += encode_frame(response)
+        except (TypeError, ValueError) as e:
+            conn.outbuf += encode_frame(_error(e))
+        self._on_writable(conn)
+
+    def _on_writable(self, conn: _Conn) -> None:
+        try:
+            sent = conn.sock.send(conn.outbuf)
+            del conn.outbuf[:sent]
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self._close(conn)
+            return
+        mask = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.outbuf else 0)
+        try:
+            self._sel.modify(conn.sock, mask, conn)
+        except (KeyError, ValueError):
+            pass
+
+    def _close(self, conn: _Conn) -> None:
+        conn.closing = True
+        try:
+            self._sel.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+
+
+def _error(e: BaseException) -> dict:
+    return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+# -------- Client --------
+
+def _connect(timeout: float) -> socket.socket:
+    if _use_unix_socket():
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(timeout)
+        s.connect(str(_sock_path()))
+        return s
+    try:
+        port = int(_port_path().read_text(encoding="ascii").strip())
+    except (OSError, ValueError):
+        raise ConnectionRefusedError("No instance port file")
+    return socket.create_connection(("127.0.0.1", port), timeout=timeout)
+
+
+def send_command(cmd: str, args: Optional[Dict[str, Any]] = None,
+                 timeout: float = 2.0, wait: float = 0.0) -> Any:
+    """
+    Send one command to the running instance and return its result.
+    `wait` retries the connection for that many seconds (useful right after
+    the primary starts). Raises InstanceNotRunning or RuntimeError on failure.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            s = _connect(timeout)
+            break
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            if time.monotonic() >= deadline:
+                raise InstanceNotRunning(str(e)) from e
+            time.sleep(0.05)
+    with s:
+        s.settimeout(timeout)
+        s.sendall(encode_frame({"cmd": cmd, "args": args or {}}))
+        resp = _read_frame(s)
+    if not resp.get("ok"):
+        raise RuntimeError(resp.get("error", "command failed"))
+    return resp.get("result")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """`python -m app.single_instance <command> ...` — drive the running app."""
+    import argparse
+    parser = argparse.ArgumentParser(prog="app.single_instance",
+                                     description="Send a command to the running Todo Gamble app")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("show")
+    sub.add_parser("balance")
+    sub.add_parser("quit")
+    p = sub.add_parser("add-task")
+    p.add_argument("description")
+    p.add_argument("buy_in", type=float)
+    p.add_argument("payout", type=float)
+    p = sub.add_parser("complete")
+    p.add_argument("task_id")
+    p = sub.add_parser("profile", help="capture a cProfile/tracemalloc report")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--seconds", type=float)
+    g.add_argument("--ticks", type=int)
+    p = sub.add_parser("settings", help="show settings, or change them with --set KEY=VALUE")
+    p.add_argument("--set", action="append", metavar="KEY=VALUE")
+    ns = parser.parse_args(argv)
+
+    args = {k: v for k, v in vars(ns).items() if k != "cmd" and v is not None}
+    if ns.cmd == "settings" and ns.set:
+        from .settings import coerce
+        if not all("=" in kv for kv in ns.set):
+            parser.error("--set takes KEY=VALUE")
+        args["set"] = {k: coerce(v) for k, v in (kv.split("=", 1) for kv in ns.set)}
+    try:
+        result = send_command(ns.cmd, args)
+    except InstanceNotRunning:
+        print("Todo Gamble is not running.", file=sys.stderr)
+        return 2
+    except ConnectionError as e:
+        print(f"Todo Gamble closed the connection ({e}).", file=sys.stderr)
+        return 1
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
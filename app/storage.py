@@ -1,137 +1,472 @@
 from __future__ import annotations
 import json
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import List, Tuple, Dict, Any
-from datetime import datetime, timezone
+from typing import List, Tuple, Dict, Any, Callable, Iterator, Optional, Union
+from datetime import datetime, timedelta
 import os
 
 from .models import Task
+from . import metrics
+from . import clock
+from .linescan import LineScanner
 
-APP_DIR = Path.home() / ".todo_gamble_app"
-TASKS_PATH = APP_DIR / "tasks.json"
-LEDGER_PATH = APP_DIR / "ledger.txt"  # JSONL lines
-HISTORY_PATH = APP_DIR / "history.jsonl"  # JSONL lines
-SETTINGS_PATH = APP_DIR / "settings.json"
+HISTORY_ARCHIVE_WEEKS = 12  # archived segments kept
+
+
+# ---------- Storage contexts (one per data directory) ----------
+class StorageContext:
+    """
+    One data directory: its paths, a lock for writers of the directory
+    (app.journal), and the per-directory objects other modules keep
+    (dedup/op-log indexes, ...), created on first use by obj(). Every
+    function here works on the active context: use(ctx) for the current
+    thread/task, else the process default (set_app_dir).
+    """
+
+    def __init__(self, root: os.PathLike | str) -> None:
+        self.root = Path(root).expanduser()
+        self.tasks_path = self.root / "tasks.json"
+        self.ledger_path = self.root / "ledger.txt"  # JSONL lines
+        self.history_path = self.root / "history.jsonl"  # JSONL lines
+        self.settings_path = self.root / "settings.json"
+        self.history_archive_dir = self.root / "history_archive"  # weekly history-YYYYMMDD.jsonl segments
+        self.lock = threading.RLock()
+        self.cipher = None  # app.encryption.LineCipher once an encrypted directory is unlocked
+        self._objects: Dict[str, Any] = {}
+        self._objects_lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"StorageContext({str(self.root)!r})"
+
+    def obj(self, name: str, factory: Callable[[Path], Any]) -> Any:
+        """The context's `name` object, built with factory(root) on first use."""
+        with self._objects_lock:
+            o = self._objects.get(name)
+            if o is None:
+                o = self._objects[name] = factory(self.root)
+            return o
+
+    def approx_bytes(self) -> int:
+        """Rough memory held by the context's objects (those that report it)."""
+        with self._objects_lock:
+            objs = list(self._objects.values())
+        return sum(o.approx_bytes() for o in objs if hasattr(o, "approx_bytes"))
+
+    def drop_objects(self) -> None:
+        """Forget cached objects; they are rebuilt from disk on next use."""
+        with self._objects_lock:
+            self._objects.clear()
+
+    def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """fn(*args, **kwargs) with this context active."""
+        with use(self):
+            return fn(*args, **kwargs)
+
+
+_default = StorageContext(Path.home() / ".todo_gamble_app")
+_active: ContextVar[Optional[StorageContext]] = ContextVar("storage_context", default=None)
+
+
+def current() -> StorageContext:
+    return _active.get() or _default
+
+
+@contextmanager
+def use(ctx: StorageContext) -> Iterator[StorageContext]:
+    """Make `ctx` the active context for the current thread (or asyncio task)."""
+    token = _active.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _active.reset(token)
+
+
+def set_app_dir(path: os.PathLike | str) -> None:
+    """Point the default context at another data directory (CLI --data-dir, benchmarks)."""
+    global _default
+    _default = StorageContext(path)
+
+
+# storage.APP_DIR, storage.LEDGER_PATH, ... resolve against the active context
+_CONTEXT_ATTRS = {
+    "APP_DIR": "root", "TASKS_PATH": "tasks_path", "LEDGER_PATH": "ledger_path",
+    "HISTORY_PATH": "history_path", "SETTINGS_PATH": "settings_path",
+    "HISTORY_ARCHIVE_DIR": "history_archive_dir",
+}
+
+
+def __getattr__(name: str) -> Any:
+    attr = _CONTEXT_ATTRS.get(name)
+    if attr is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(current(), attr)
+
+
+# ---------- Data lines (plain JSON, or sealed by app.encryption) ----------
+SEALED_PREFIX = "~"
+
+
+def encrypted() -> bool:
+    """True when the active directory is unlocked and writes sealed lines."""
+    return current().cipher is not None
+
+
+def dumps_line(obj: Any, **kwargs) -> str:
+    """One data-file line (no newline): json.dumps(obj), sealed in an encrypted directory."""
+    text = json.dumps(obj, **kwargs)
+    cipher = current().cipher
+    return text if cipher is None else cipher.seal(text)
+
+
+def parse_line(line: str | bytes) -> Any:
+    """json.loads for a data-file line, plain or sealed. Raises ValueError."""
+    if line[:1] in (SEALED_PREFIX, b"~"):
+        cipher = current().cipher
+        if cipher is None:
+            raise ValueError("sealed line, but the data directory is locked")
+        line = cipher.open(line)
+    return json.loads(line)
 
 
 def ensure_dirs() -> None:
-    APP_DIR.mkdir(parents=True, exist_ok=True)
+    current().root.mkdir(parents=True, exist_ok=True)
 
 
 def now_iso() -> str:
-    return datetime.now(timezone.utc).astimezone().isoformat()
+    return clock.now_aware().isoformat()
 
-# -------- Settings --------
-DEFAULT_SETTINGS = {
-    "creation_window": {"start": "11:00", "end": "12:00"},  # local time HH:MM
-}
 
+def fsync_path(path: Path) -> None:
+    """fsync a file (or, on POSIX, a directory) if it exists."""
+    if path.is_dir() and os.name == "nt":
+        return  # directories can't be opened for fsync on Windows
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: Path, text: str, durable: bool = True) -> None:
+    """Replace `path` via a temp file; durable=True fsyncs the data and the rename."""
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write(text)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    tmp.replace(path)
+    if durable:
+        fsync_path(path.parent)
+
+# -------- Settings --------
+# The schema, validation and change detection live in app.settings; these
+# keep the plain-dict view for callers that edit settings.json as a whole.
 def load_settings() -> Dict[str, Any]:
+    from . import settings
     ensure_dirs()
-    if not SETTINGS_PATH.exists():
-        save_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS.copy()
-    try:
-        data = json.loads(SETTINGS_PATH.read_text(encoding="utf-8"))
-        # Merge defaults
-        merged = DEFAULT_SETTINGS.copy()
-        merged.update(data)
-        return merged
-    except Exception:
-        return DEFAULT_SETTINGS.copy()
+    return settings.store().get().to_dict()
 
 
-def save_settings(settings: Dict[str, Any]) -> None:
+def save_settings(data: Dict[str, Any]) -> None:
+    """Validate and write `data`; raises settings.SettingsError (nothing written)."""
+    from . import settings
     ensure_dirs()
-    tmp = SETTINGS_PATH.with_suffix(".tmp")
-    tmp.write_text(json.dumps(settings, indent=2), encoding="utf-8")
-    tmp.replace(SETTINGS_PATH)
+    settings.store().save(settings.parse(data, strict=True)[0])
 
 # -------- Tasks --------
 
+@metrics.timed("storage.load_tasks")
 def load_tasks() -> List[Task]:
+    ctx = current()
     ensure_dirs()
-    if not TASKS_PATH.exists():
+    if not ctx.tasks_path.exists():
         return []
     try:
-        data = json.loads(TASKS_PATH.read_text(encoding="utf-8"))
+        text = ctx.tasks_path.read_text(encoding="utf-8")
+        metrics.add_bytes("storage.load_tasks", read=len(text))
+        data = parse_line(text.strip())
         return [Task.from_dict(x) for x in data]
     except Exception:
         return []
 
 
-def save_tasks(tasks: List[Task]) -> None:
+@metrics.timed("storage.save_tasks")
+def save_tasks(tasks: List[Task], durable: bool = True) -> None:
+    """durable=False skips the fsyncs (the journal replays tasks.json after a crash)."""
     ensure_dirs()
-    tmp = TASKS_PATH.with_suffix(".tmp")
-    tmp.write_text(json.dumps([t.to_dict() for t in tasks], indent=2), encoding="utf-8")
-    tmp.replace(TASKS_PATH)
+    text = dumps_line([t.to_dict() for t in tasks], indent=2)
+    metrics.add_bytes("storage.save_tasks", written=len(text))
+    atomic_write(current().tasks_path, text, durable)
+
+
+def parse_task_specs(text: str, fmt: str | None = None) -> List[Dict[str, Any]]:
+    """
+    Task specs ({description, buy_in, payout}) for a bulk import.
+    fmt is "csv" or "json" (a JSON array or one object per line); when None
+    it is guessed from the first character. CSV needs a header row naming
+    the three columns; other columns are ignored. Raises ValueError.
+    """
+    if not text.strip():
+        return []
+    if fmt is None:
+        fmt = "json" if text.lstrip()[0] in "[{" else "csv"
+    if fmt == "csv":
+        import csv, io
+        reader = csv.DictReader(io.StringIO(text))
+        fields = {(f or "").strip().lower(): f for f in reader.fieldnames or []}
+        missing = [k for k in ("description", "buy_in", "payout") if k not in fields]
+        if missing:
+            raise ValueError(f"CSV header is missing: {', '.join(missing)}")
+        return [{k: row.get(fields[k]) for k in ("description", "buy_in", "payout")}
+                for row in reader if any((v or "").strip() for v in row.values() if isinstance(v, str))]
+    if fmt != "json":
+        raise ValueError(f"Unknown import format: {fmt}")
+    if text.lstrip().startswith("["):
+        data = json.loads(text)
+        if not isinstance(data, list):
+            raise ValueError("Expected a JSON array")
+    else:
+        data = []
+        for n, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                data.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"line {n}: {e}")
+    for n, obj in enumerate(data, start=1):
+        if not isinstance(obj, dict):
+            raise ValueError(f"record {n} is not an object")
+    return data
 
 # -------- Ledger & History --------
 
 def append_ledger_entry(entry: dict) -> float:
-    ensure_dirs()
+    return append_ledger_entries([entry])[-1]["balance"]
+
+
+def format_ledger_entries(entries: List[dict]) -> List[dict]:
+    """Stamp entries with `ts` and running `balance` (from the current ledger) without writing."""
     balance = compute_balance()
-    amount = float(entry.get("amount", 0.0))
-    entry = {**entry, "ts": now_iso()}
-    new_balance = balance + amount
-    entry["balance"] = round(new_balance, 2)
-    with LEDGER_PATH.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(entry) + "\n")
-    return new_balance
+    ts = now_iso()
+    written = []
+    for entry in entries:
+        balance += float(entry.get("amount", 0.0))
+        written.append({**entry, "ts": ts, "balance": round(balance, 2)})
+    return written
+
+
+def format_history_entries(entries: List[dict]) -> List[dict]:
+    ts = now_iso()
+    return [{**e, "ts": ts} for e in entries]
+
+
+def jsonl_text(rows: List[dict]) -> str:
+    return "".join(dumps_line(r) + "\n" for r in rows)
+
+
+@metrics.timed("storage.append_ledger_entries")
+def append_ledger_entries(entries: List[dict]) -> List[dict]:
+    """
+    Append several ledger entries with one balance read and one write.
+    Returns the lines as written (with `ts` and running `balance`).
+    Not journaled; AppState writes through app.journal instead.
+    """
+    ensure_dirs()
+    written = format_ledger_entries(entries)
+    if written:
+        text = jsonl_text(written)
+        metrics.add_bytes("storage.append_ledger_entries", written=len(text))
+        with current().ledger_path.open("a", encoding="utf-8") as f:
+            f.write(text)
+    return written
 
 
 def append_history(entry: dict) -> None:
+    append_history_entries([entry])
+
+
+@metrics.timed("storage.append_history_entries")
+def append_history_entries(entries: List[dict]) -> List[dict]:
+    """Append several history rows in one write; returns them as written (not journaled)."""
     ensure_dirs()
-    entry = {**entry, "ts": now_iso()}
-    with HISTORY_PATH.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(entry) + "\n")
+    written = format_history_entries(entries)
+    if written:
+        text = jsonl_text(written)
+        metrics.add_bytes("storage.append_history_entries", written=len(text))
+        with current().history_path.open("a", encoding="utf-8") as f:
+            f.write(text)
+    return written
 
 
+@metrics.timed("storage.read_history")
 def read_history(max_lines: int = 500) -> List[dict]:
-    if not HISTORY_PATH.exists():
+    ctx = current()
+    if not ctx.history_path.exists():
         return []
-    lines = HISTORY_PATH.read_text(encoding="utf-8").splitlines()[-max_lines:]
+    with LineScanner(ctx.history_path) as sc:
+        lines = sc.tail(max_lines)
+    metrics.add_bytes("storage.read_history", read=sum(len(ln) + 1 for ln in lines))
     out = []
     for ln in lines:
         try:
-            out.append(json.loads(ln))
+            out.append(parse_line(ln))
         except Exception:
             continue
     return out
 
 
-def purge_history_if_monday() -> bool:
-    # Purge when today is Monday (0 = Monday)
-    if datetime.now().weekday() == 0 and HISTORY_PATH.exists():
+@metrics.timed("storage.read_history_page")
+def read_history_page(before: int | None = None, limit: int = 50) -> Tuple[List[dict], int | None]:
+    """
+    Newest-first page of history rows that end before byte offset `before`
+    (None = end of file). Returns (rows, cursor); pass cursor as `before`
+    for the next, older page. cursor is None once the start is reached.
+    """
+    ctx = current()
+    if not ctx.history_path.exists():
+        return [], None
+    rows: List[dict] = []
+    cursor: int | None = None
+    with LineScanner(ctx.history_path) as sc:
+        end = sc.size if before is None else max(0, min(before, sc.size))
+        start = end
+        for start, ln in sc.reverse(end):
+            try:
+                rows.append(parse_line(ln))
+            except Exception:
+                continue
+            if len(rows) >= limit:
+                cursor = start if start > 0 else None
+                break
+    metrics.add_bytes("storage.read_history_page", read=end - start)
+    return rows, cursor
+
+
+@metrics.timed("storage.read_ledger_since")
+def read_ledger_since(offset: int) -> Tuple[List[dict], int]:
+    """
+    Ledger entries from byte `offset` to the last complete line, plus the
+    offset after them. If the ledger shrank (compaction/purge) reading
+    restarts at 0, so a returned offset below `offset` means "reset".
+    """
+    ctx = current()
+    if not ctx.ledger_path.exists():
+        return [], 0
+    with ctx.ledger_path.open("rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if offset > size:
+            offset = 0
+        f.seek(offset)
+        data = f.read(size - offset)
+    metrics.add_bytes("storage.read_ledger_since", read=len(data))
+    end = data.rfind(b"\n") + 1  # ignore a partially written last line
+    out = []
+    for ln in data[:end].splitlines():
+        if not ln.strip():
+            continue
         try:
-            HISTORY_PATH.unlink()
-            return True
+            out.append(parse_line(ln))
         except Exception:
+            continue
+    return out, offset + end
+
+
+def history_segments() -> List[Path]:
+    """Archived history segments (oldest first) followed by the live history file."""
+    ctx = current()
+    segs = sorted(ctx.history_archive_dir.glob("history-*.jsonl")) if ctx.history_archive_dir.exists() else []
+    if ctx.history_path.exists():
+        segs.append(ctx.history_path)
+    return segs
+
+
+def _checkpoint_journal() -> None:
+    """
+    Settle the write-ahead journal before a wholesale rewrite invalidates its
+    offsets. Callers hold ctx.lock from here until the rewrite is done, so no
+    commit can journal offsets into the file that is about to be replaced.
+    """
+    from . import journal
+    journal.checkpoint()
+
+
+def archive_history(keep_weeks: int = HISTORY_ARCHIVE_WEEKS) -> Path | None:
+    """
+    Move history.jsonl into history_archive/ as history-YYYYMMDD.jsonl
+    (clearing the History tab while keeping rows searchable), then drop
+    segments beyond `keep_weeks`. Returns the archived path, if any.
+    """
+    ctx = current()
+    with ctx.lock:
+        if not ctx.history_path.exists():
+            return None
+        _checkpoint_journal()
+        ctx.history_archive_dir.mkdir(parents=True, exist_ok=True)
+        target = ctx.history_archive_dir / f"history-{clock.now().strftime('%Y%m%d')}.jsonl"
+        if target.exists():
+            # Second archive on the same day: append (keeps one segment per day)
+            with ctx.history_path.open("rb") as src, target.open("ab") as dst:
+                dst.write(src.read())
+            ctx.history_path.unlink()
+        else:
+            ctx.history_path.replace(target)
+        archived = sorted(ctx.history_archive_dir.glob("history-*.jsonl"))
+        for old in archived[:-keep_weeks] if keep_weeks > 0 else archived:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+        return target
+
+
+@metrics.timed("storage.purge_history_if_monday")
+def purge_history_if_monday() -> bool:
+    # Purge (archive) once when today is Monday (0 = Monday)
+    ctx = current()
+    now = clock.now()
+    if now.weekday() != 0 or not ctx.history_path.exists():
+        return False
+    marker = ctx.history_archive_dir / ".last_purge"
+    today = now.strftime("%Y-%m-%d")
+    try:
+        if marker.exists() and marker.read_text(encoding="ascii").strip() == today:
             return False
-    return False
+        archive_history()
+        marker.write_text(today, encoding="ascii")
+        return True
+    except Exception:
+        return False
 
 
+@metrics.timed("storage.compute_balance")
 def compute_balance() -> float:
-    if not LEDGER_PATH.exists():
+    ctx = current()
+    if not ctx.ledger_path.exists():
         return 0.0
     try:
-        *_, last = LEDGER_PATH.read_text(encoding="utf-8").splitlines()
-        if last.strip():
-            import json as _json
-            bal = float(_json.loads(last).get("balance", 0.0))
-            return bal
-    except Exception:
-        pass
-    total = 0.0
-    try:
-        with LEDGER_PATH.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
+        with LineScanner(ctx.ledger_path) as sc:
+            # Each line carries the running balance, so only the tail is needed
+            last = sc.last_line()
+            metrics.add_bytes("storage.compute_balance", read=len(last))
+            try:
+                if last.strip():
+                    return float(parse_line(last).get("balance", 0.0))
+            except Exception:
+                pass
+            total = 0.0
+            for _, line in sc.lines(decode=True):
                 try:
-                    obj = json.loads(line)
-                    total += float(obj.get("amount", 0.0))
+                    total += float(parse_line(line).get("amount", 0.0))
                 except Exception:
                     continue
     except Exception:
@@ -139,8 +474,6 @@ def compute_balance() -> float:
     return round(total, 2)
 
 
-    from datetime import datetime, timezone, timedelta
-
 def _parse_ts(iso: str) -> datetime | None:
     try:
         return datetime.fromisoformat(iso)
@@ -151,6 +484,7 @@ def _parse_ts(iso: str) -> datetime | None:
         except Exception:
             return None
 
+@metrics.timed("storage.compact_ledger")
 def compact_ledger(retain_days: int = 30) -> int:
     """
     Keep only the last `retain_days` of entries. If older entries exist,
@@ -158,94 +492,317 @@ def compact_ledger(retain_days: int = 30) -> int:
     cutoff, then append all lines newer than cutoff.
     Returns number of lines written after compaction.
     """
-    ensure_dirs()
-    if not LEDGER_PATH.exists():
-        return 0
+    ctx = current()
+    with ctx.lock:
+        ensure_dirs()
+        if not ctx.ledger_path.exists():
+            return 0
+        _checkpoint_journal()
+
+        now = clock.now_aware()
+        cutoff = now - timedelta(days=retain_days)
+
+        # Partition entries by ts; newer lines are kept verbatim
+        older_total = 0.0
+        n_lines = 0
+        newer_lines: list[str] = []
+        with LineScanner(ctx.ledger_path) as sc:
+            metrics.add_bytes("storage.compact_ledger", read=sc.size)
+            for _, ln in sc.lines(decode=True):
+                n_lines += 1
+                try:
+                    obj = parse_line(ln)
+                except Exception:
+                    continue
+                ts = _parse_ts(obj.get("ts", "")) or now
+                amt = float(obj.get("amount", 0.0))
+                if ts < cutoff:
+                    if obj.get("type") == "snapshot":
+                        # an earlier compaction/purge: its balance is the carry-forward
+                        older_total = float(obj.get("balance", 0.0))
+                    else:
+                        older_total += amt
+                else:
+                    newer_lines.append(ln.strip())
+        if not n_lines:
+            return 0
+
+        # If nothing to compact, bail
+        if not newer_lines and older_total == 0.0:
+            return n_lines
+
+        # Build snapshot + rewrite file atomically
+        tmp = ctx.ledger_path.with_suffix(".tmp")
+        balance_before = 0.0
+        # Compute the balance at cutoff = sum(older_total)
+        balance_before = round(older_total, 2)
+
+        # Write a snapshot that encodes the carry-forward balance
+        snapshot = {
+            "ts": now_iso(),
+            "type": "snapshot",
+            "description": f"Carry-forward balance after compacting to last {retain_days} days",
+            "amount": 0.0,
+            "balance": balance_before
+        }
+        out_lines = [dumps_line(snapshot)] + newer_lines
 
-    now = datetime.now(timezone.utc).astimezone()
-    cutoff = now - timedelta(days=retain_days)
+        data = ("\n".join(out_lines) + "\n").encode("utf-8")
+        metrics.add_bytes("storage.compact_ledger", written=len(data))
+        tmp.write_bytes(data)
+        tmp.replace(ctx.ledger_path)
+        _sync_columns()
+        return len(out_lines)
 
-    lines = LEDGER_PATH.read_text(encoding="utf-8").splitlines()
-    if not lines:
-        return 0
 
-    # Partition entries by ts
-    older_total = 0.0
-    newer_lines: list[str] = []
-    for ln in lines:
-        ln = ln.strip()
-        if not ln:
-            continue
-        try:
-            obj = json.loads(ln)
-        except Exception:
+def _sync_columns() -> None:
+    """Rebuild the columnar sidecar after the ledger was rewritten (best effort)."""
+    try:
+        from . import columnar
+        columnar.sync()
+    except Exception:
+        pass
+
+
+Balance = Union[float, Tuple[float, float]]  # see _check_balance
+
+
+def _verify_range(path: str, start: int, end: int) -> Dict[str, Any]:
+    """
+    verify_ledger() map step. Lines are checked against the previous line's
+    balance; lines before the first known balance in the range are returned
+    as `head` for the reduce step, which knows the balance coming in.
+    """
+    part: Dict[str, Any] = {"lines": 0, "newlines": 0, "head": [], "errors": [], "prev": None}
+    prev: Balance | None = None
+    anchored = False  # a line agreed with the one before it (or a snapshot was seen)
+    with LineScanner(path) as sc:
+        no, last, nxt = 1, start, -1
+        for off, line in sc.lines(start, end, decode=True):
+            # Physical line numbers; count newlines only after skipped blank/non-ASCII lines
+            no += 1 if off == nxt else sc.slice(last, off).count(b"\n")
+            last, nxt = off, off + len(line) + 1
+            part["lines"] += 1
+            try:
+                obj = parse_line(line)
+                amount = float(obj.get("amount", 0.0))
+                stored = obj.get("balance")
+                stored = None if stored is None else float(stored)
+            except Exception as e:
+                part["errors"].append((no, f"unparseable: {e}"))
+                continue
+            if obj.get("type") == "snapshot":
+                prev, anchored = stored or 0.0, True
+            elif not anchored and (prev is None or stored is None or abs(stored - (prev + amount)) > 0.005):
+                # Can't tell yet which of these is wrong; the reduce step knows the incoming balance
+                part["head"].append((no, amount, stored))
+                prev = stored
+            else:
+                anchored = True
+                prev = _check_balance(part["errors"], no, prev, amount, stored)
+        part["newlines"] = no - 1 + sc.slice(last, end).count(b"\n")
+    part["prev"] = prev if anchored else None
+    return part
+
+
+def _check_balance(errors: list, no: int, prev: Balance, amount: float, stored: float | None) -> Balance:
+    """
+    Record a mismatch for one line; returns what the next line builds on.
+    After a mismatch that is (stored, expected): the bad line's balance or
+    its amount was wrong, and the next line matches one of the two, so a
+    single bad line is reported once.
+    """
+    candidates = prev if isinstance(prev, tuple) else (prev,)
+    if stored is None:
+        errors.append((no, "missing balance"))
+        return candidates[0] + amount
+    for base in candidates:
+        if abs(stored - (base + amount)) <= 0.005:
+            return stored
+    expected = candidates[0] + amount
+    errors.append((no, f"balance {stored:.2f} != expected {expected:.2f}"))
+    return (stored, expected)
+
+
+def _settled(balance: Balance) -> float:
+    return balance[0] if isinstance(balance, tuple) else balance
+
+
+@metrics.timed("storage.verify_ledger")
+def verify_ledger(workers: int | None = None) -> Dict[str, Any]:
+    """
+    Check that every ledger line parses and that each `balance` equals the
+    previous line's balance plus `amount` (snapshots reset the total).
+    Large ledgers are checked in parallel (see app.scan).
+    Returns {'lines', 'balance', 'errors': [{'line', 'error'}, ...]}.
+    """
+    ctx = current()
+    from . import scan
+    result: Dict[str, Any] = {"lines": 0, "balance": 0.0, "errors": []}
+    if not ctx.ledger_path.exists():
+        return result
+    metrics.add_bytes("storage.verify_ledger", read=ctx.ledger_path.stat().st_size)
+    balance = 0.0
+    base = 0  # newlines before the current range
+    errors: list = []
+    for part in scan.map_ranges(_verify_range, [ctx.ledger_path], workers):
+        result["lines"] += part["lines"]
+        for no, amount, stored in part["head"]:
+            balance = _check_balance(errors, base + no, balance, amount, stored)
+        errors.extend((base + no, msg) for no, msg in part["errors"])
+        if part["prev"] is not None:
+            balance = part["prev"]
+        base += part["newlines"]
+    errors.sort(key=lambda e: e[0])
+    result["errors"] = [{"line": no, "error": msg} for no, msg in errors]
+    result["balance"] = round(_settled(balance), 2)
+    return result
+
+
+# -------- Bulk scans (app.scan map steps) --------
+HISTORY_CSV_HEADER = ["ts", "event", "description", "buy_in", "payout"]
+
+
+def _export_range(fmt: str, events: Tuple[str, ...] | None, path: str, start: int, end: int) -> List[str]:
+    """export_history() map step: one formatted line per matching row."""
+    from .scan import iter_range
+    out: List[str] = []
+    if fmt == "csv":
+        import csv
+        w = csv.writer(_LineSink(out))
+    for _, obj in iter_range(path, start, end):
+        if not isinstance(obj, dict) or (events and obj.get("event") not in events):
             continue
-        ts = _parse_ts(obj.get("ts", "")) or now
-        amt = float(obj.get("amount", 0.0))
-        if ts < cutoff:
-            older_total += amt
+        if fmt == "csv":
+            w.writerow([
+                obj.get("ts", ""),
+                obj.get("event", ""),
+                obj.get("description", ""),
+                f"{float(obj.get('buy_in', 0.0)):.2f}",
+                f"{float(obj.get('payout', 0.0)):.2f}",
+            ])
         else:
-            newer_lines.append(json.dumps(obj))
-
-    # If nothing to compact, bail
-    if not newer_lines and older_total == 0.0:
-        return len(lines)
-
-    # Build snapshot + rewrite file atomically
-    tmp = LEDGER_PATH.with_suffix(".tmp")
-    balance_before = 0.0
-    # Compute the balance at cutoff = sum(older_total)
-    balance_before = round(older_total, 2)
-
-    # Write a snapshot that encodes the carry-forward balance
-    snapshot = {
-        "ts": now_iso(),
-        "type": "snapshot",
-        "description": f"Carry-forward balance after compacting to last {retain_days} days",
-        "amount": 0.0,
-        "balance": balance_before
-    }
-    out_lines = [json.dumps(snapshot)] + newer_lines
-
-    tmp.write_text("\n".join(out_lines) + "\n", encoding="utf-8")
-    tmp.replace(LEDGER_PATH)
-    return len(out_lines)
+            out.append(json.dumps(obj) + "\n")
+    return out
+
 
+class _LineSink:
+    """csv.writer target that collects each written row."""
+
+    def __init__(self, lines: List[str]) -> None:
+        self.write = lines.append
+
+
+@metrics.timed("storage.export_history")
+def export_history(out, fmt: str = "csv", events: List[str] | None = None,
+                   limit: int | None = None, workers: int | None = None) -> int:
+    """
+    Write all retained history (archived segments + live file) to the text
+    stream `out` as 'csv' or 'jsonl', optionally only some events and only
+    the newest `limit` rows. Returns the number of rows written.
+    """
+    import functools
+    from . import scan
+    fn = functools.partial(_export_range, fmt, tuple(events) if events else None)
+    lines: List[str] = []
+    for part in scan.map_ranges(fn, history_segments(), workers):
+        lines.extend(part)
+    if limit is not None:
+        lines = lines[-limit:] if limit > 0 else []
+    if fmt == "csv":
+        import csv
+        csv.writer(out).writerow(HISTORY_CSV_HEADER)
+    out.writelines(lines)
+    return len(lines)
+
+
+def _rollup_range(path: str, start: int, end: int) -> Dict[str, Dict[str, Any]]:
+    """ledger_daily_rollup() map step."""
+    from .scan import iter_range
+    days: Dict[str, Dict[str, Any]] = {}
+    for _, obj in iter_range(path, start, end):
+        day = str(obj.get("ts", ""))[:10]
+        d = days.get(day)
+        if d is None:
+            d = days[day] = {"count": 0, "net": 0.0, "balance": 0.0}
+        if obj.get("type") != "snapshot":
+            d["count"] += 1
+            d["net"] += float(obj.get("amount", 0.0))
+        d["balance"] = float(obj.get("balance", d["balance"]))
+    return days
+
+
+def _merge_rollup(acc: Dict[str, Dict[str, Any]], part: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    for day, d in part.items():
+        a = acc.get(day)
+        if a is None:
+            acc[day] = d
+        else:
+            a["count"] += d["count"]
+            a["net"] += d["net"]
+            a["balance"] = d["balance"]  # later range wins
+    return acc
+
+
+@metrics.timed("storage.ledger_daily_rollup")
+def ledger_daily_rollup(workers: int | None = None) -> Dict[str, Dict[str, Any]]:
+    """Per-day {'count', 'net', 'balance' (end of day)} from the ledger, keyed YYYY-MM-DD."""
+    ctx = current()
+    from . import scan
+    if not ctx.ledger_path.exists():
+        return {}
+    days = scan.map_reduce(_rollup_range, _merge_rollup, {}, [ctx.ledger_path], workers)
+    for d in days.values():
+        d["net"] = round(d["net"], 2)
+        d["balance"] = round(d["balance"], 2)
+    return dict(sorted(days.items()))
+
+
+@metrics.timed("storage.purge_data")
 def purge_data(save_balance: bool = True) -> None:
     """
     Purge storage files to save space.
-    - Always deletes history.jsonl and tasks.json (pending tasks).
+    - Always deletes history (history.jsonl and archived segments) and tasks.json (pending tasks).
     - Ledger:
         * If save_balance=True, replace ledger.txt with a single 'snapshot' line preserving current balance.
         * If save_balance=False, delete ledger.txt (balance resets to $0).
     Settings are untouched.
     """
-    ensure_dirs()
-
-    # Delete history and tasks
-    try:
-        HISTORY_PATH.unlink(missing_ok=True)
-    except Exception:
-        pass
-    try:
-        TASKS_PATH.unlink(missing_ok=True)
-    except Exception:
-        pass
+    ctx = current()
+    with ctx.lock:
+        ensure_dirs()
+        _checkpoint_journal()
 
-    if save_balance:
-        bal = compute_balance()
-        snapshot = {
-            "ts": now_iso(),
-            "type": "snapshot",
-            "description": "Snapshot after purge",
-            "amount": 0.0,
-            "balance": round(bal, 2),
-        }
-        tmp = LEDGER_PATH.with_suffix(".tmp")
-        tmp.write_text(json.dumps(snapshot) + "\n", encoding="utf-8")
-        tmp.replace(LEDGER_PATH)
-    else:
+        # Delete history (live and archived) and tasks
+        try:
+            ctx.history_path.unlink(missing_ok=True)
+        except Exception:
+            pass
+        for seg in ctx.history_archive_dir.glob("history-*.jsonl") if ctx.history_archive_dir.exists() else []:
+            try:
+                seg.unlink()
+            except Exception:
+                pass
         try:
-            LEDGER_PATH.unlink(missing_ok=True)
+            ctx.tasks_path.unlink(missing_ok=True)
         except Exception:
             pass
+
+        if save_balance:
+            bal = compute_balance()
+            snapshot = {
+                "ts": now_iso(),
+                "type": "snapshot",
+                "description": "Snapshot after purge",
+                "amount": 0.0,
+                "balance": round(bal, 2),
+            }
+            tmp = ctx.ledger_path.with_suffix(".tmp")
+            tmp.write_text(dumps_line(snapshot) + "\n", encoding="utf-8")
+            tmp.replace(ctx.ledger_path)
+        else:
+            try:
+                ctx.ledger_path.unlink(missing_ok=True)
+            except Exception:
+                pass
+        _sync_columns()
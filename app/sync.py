@@ -0,0 +1,522 @@
+# =============================
+# File: app/sync.py
+# =============================
+"""
+File-based sync between machines (a shared folder or a zip you carry).
+
+Every local operation in oplog.jsonl (app.oplog) becomes one sync entry:
+its ledger/history rows and the tasks it added or removed, keyed by
+(device id, seq). Entries are exported into segments:
+
+    <device>/<first seq>-<last seq>-<sha256[:16]>.seg.gz
+
+gzip JSON lines (a header, then entries), named by their content hash, so
+the same segment never appears twice and a half-copied file is detected
+and skipped. Segments are written once to APP_DIR/sync/outbox and copied
+to the shared location.
+
+Importing records which seqs of which device have been applied (ranges in
+APP_DIR/sync/state.json), so segments can arrive in any order, repeatedly,
+and via any path; a segment whose range is already covered is skipped
+from its file name alone. Rows keep their original `key`, so a change made
+on both machines (the same task completed twice) is counted once
+(app.dedup). Task additions/removals carry the task's revision; removals
+leave a tombstone so a late "added" can't resurrect a task.
+
+Imports are one AppState operation per segment ("sync_import", not
+exported again); new ledger rows get running balances from the ledger
+tail like any other append, so nothing is replayed.
+
+    sync_folder(state, DIR)   export, copy missing segments to DIR/<device>/,
+                              import other devices' segments, write DIR/<device>/seen.json
+    sync_zip(state, PATH)     import the segments in PATH (if any), then rewrite
+                              it with this device's segments the peer hasn't seen
+
+Ops from before sync was first used are not exported (both copies already
+hold them when the data folder was copied by hand).
+
+Segments never use a device's own data key (app.encryption): peers don't
+have it. Devices that sync together can share a sync passphrase instead.
+Its KDF parameters sit next to the segments (sync-key.json in the folder
+or zip), and entry lines are sealed with it. A device with an encrypted
+data folder refuses to sync until one is set (SyncKeyNeeded), and a
+missing or wrong passphrase stops the whole sync with one SyncKeyError.
+Segments with no sync key stay plain.
+"""
+from __future__ import annotations
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import socket
+import threading
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import storage
+from . import oplog
+from . import metrics
+from . import encryption
+
+FORMAT_VERSION = 1
+SEGMENT_ENTRIES = 2000
+MAX_TOMBSTONES = 50_000
+IMPORT_KIND = "sync_import"
+_SEGMENT_RE = re.compile(r"^(\d{10})-(\d{10})-([0-9a-f]{16})\.seg\.gz$")
+_ROW_DROP = ("ts", "balance")  # recomputed by the importing side
+KEY_NAME = "sync-key.json"  # shared KDF parameters, next to the segments
+SYNC_PASSPHRASE_ENV = "TODO_GAMBLE_SYNC_PASSPHRASE"
+
+Ranges = List[List[int]]
+
+
+class SyncKeyError(RuntimeError):
+    """The sync passphrase is missing, wrong, or differs between devices."""
+
+
+class SyncKeyNeeded(SyncKeyError):
+    """An encrypted data folder can't sync until a shared sync passphrase is set."""
+
+
+def sync_dir() -> Path:
+    return storage.APP_DIR / "sync"
+
+
+def outbox_dir() -> Path:
+    return sync_dir() / "outbox"
+
+
+# ---------- Seq ranges ----------
+def add_range(ranges: Ranges, lo: int, hi: int) -> Ranges:
+    """Merge [lo, hi] into sorted, disjoint `ranges` (returns a new list)."""
+    out: Ranges = []
+    for a, b in sorted([*ranges, [lo, hi]]):
+        if out and a <= out[-1][1] + 1:
+            out[-1][1] = max(out[-1][1], b)
+        else:
+            out.append([a, b])
+    return out
+
+
+def covers(ranges: Ranges, lo: int, hi: int) -> bool:
+    return any(a <= lo and hi <= b for a, b in ranges)
+
+
+def contains(ranges: Ranges, seq: int) -> bool:
+    return covers(ranges, seq, seq)
+
+
+# ---------- State ----------
+class SyncState:
+    """APP_DIR/sync/state.json: this device's id, export cursor and what it has applied."""
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self.device: str = data["device"]
+        self.host: str = data.get("host", "")
+        self.root: str = data.get("root", "")
+        self.seq: int = int(data.get("seq", 0))  # last seq exported
+        self.cursor: Dict[str, Any] = data.get("cursor") or {"offset": 0, "op": None}
+        self.seen: Dict[str, Ranges] = data.get("seen", {})
+        self.tombstones: Dict[str, int] = data.get("tombstones", {})  # task id -> removed revision
+        self.key: Optional[Dict[str, Any]] = data.get("key")  # sync key parameters, once set
+
+    @classmethod
+    def load(cls) -> "SyncState":
+        path = sync_dir() / "state.json"
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") != FORMAT_VERSION:
+                raise ValueError("unknown version")
+            st = cls(data)
+        except (OSError, ValueError, KeyError):
+            return cls._new(seen={})
+        if st.host != socket.gethostname() or st.root != str(storage.APP_DIR):
+            # The data folder was copied here: a new device that already holds
+            # everything the original had exported, and exports from where it stopped
+            seen = dict(st.seen)
+            if st.seq:
+                seen[st.device] = add_range(seen.get(st.device, []), 1, st.seq)
+            new = cls._new(seen=seen, tombstones=st.tombstones, cursor=st.cursor)
+            new.key = st.key
+            return new
+        return st
+
+    @classmethod
+    def _new(cls, seen: Dict[str, Ranges], tombstones: Optional[Dict[str, int]] = None,
+             cursor: Optional[Dict[str, Any]] = None) -> "SyncState":
+        if cursor is None:
+            # First sync here: start exporting from the current end of the op log
+            try:
+                cursor = {"offset": os.path.getsize(oplog.log_path()), "op": None}
+            except OSError:
+                cursor = {"offset": 0, "op": None}
+        return cls({"device": uuid.uuid4().hex[:12], "host": socket.gethostname(),
+                    "root": str(storage.APP_DIR), "seq": 0, "cursor": cursor,
+                    "seen": seen, "tombstones": tombstones or {}})
+
+    def save(self) -> None:
+        if len(self.tombstones) > MAX_TOMBSTONES:
+            self.tombstones = dict(list(self.tombstones.items())[-MAX_TOMBSTONES:])
+        sync_dir().mkdir(parents=True, exist_ok=True)
+        storage.atomic_write(sync_dir() / "state.json", json.dumps({
+            "version": FORMAT_VERSION, "device": self.device, "host": self.host, "root": self.root,
+            "seq": self.seq, "cursor": self.cursor, "seen": self.seen, "tombstones": self.tombstones,
+            "key": self.key,
+        }))
+
+
+# ---------- Sync key ----------
+_ciphers: Dict[str, "encryption.LineCipher"] = {}  # key id -> cipher, for the session
+
+
+def key_id(params: Optional[Dict[str, Any]]) -> Optional[str]:
+    return hashlib.sha256(params["salt"].encode("ascii")).hexdigest()[:12] if params else None
+
+
+def _resolve_key(st: SyncState, shared: Optional[Dict[str, Any]], where: str,
+                 ask: Optional[Callable[[], Optional[str]]],
+                 new_passphrase: Optional[str]) -> Optional["encryption.LineCipher"]:
+    """
+    The cipher for this sync (None = plain), from the key at the sync
+    location (`shared`) or the one this device already uses. Sets st.key.
+    """
+    if shared and st.key and key_id(shared) != key_id(st.key):
+        raise SyncKeyError(f"{where} uses a different sync passphrase than this device. "
+                           "Devices that sync together need the same one.")
+    params = shared or st.key
+    if params is None:
+        if new_passphrase:
+            if len(new_passphrase) < 8:
+                raise ValueError("Use a passphrase of at least 8 characters.")
+            params, cipher = encryption.new_key(new_passphrase)
+            _ciphers[key_id(params)] = cipher
+        elif storage.encrypted():
+            raise SyncKeyNeeded("This data folder is encrypted, so sync needs a passphrase shared "
+                                "by your devices. Set one with `sync PATH --new-passphrase` "
+                                "(File → Sync asks for it).")
+        else:
+            return None
+    elif new_passphrase:
+        raise SyncKeyError(f"{where} already has a sync passphrase.")
+    cipher = _ciphers.get(key_id(params))
+    if cipher is None:
+        passphrase = os.environ.get(SYNC_PASSPHRASE_ENV) or (ask() if ask is not None else None)
+        if not passphrase:
+            raise SyncKeyError(f"{where} is protected by a sync passphrase; "
+                               f"set {SYNC_PASSPHRASE_ENV} or enter it.")
+        try:
+            cipher = encryption.open_key(params, passphrase)
+        except encryption.LockedError:
+            raise SyncKeyError("Wrong sync passphrase.")
+        _ciphers[key_id(params)] = cipher
+    st.key = params
+    return cipher
+
+
+# ---------- Segments ----------
+def _segment_bytes(device: str, entries: List[dict], cipher=None, key: Optional[str] = None) -> bytes:
+    """Header line (plain), then one line per entry, sealed with the sync key `cipher` if any."""
+    head = {"v": FORMAT_VERSION, "device": device, "first": entries[0]["s"], "last": entries[-1]["s"],
+            "key": key}
+    lines = [json.dumps(head, separators=(",", ":"))]
+    for e in entries:
+        text = json.dumps(e, separators=(",", ":"))
+        lines.append(text if cipher is None else cipher.seal(text))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _segment_name(raw: bytes, first: int, last: int) -> str:
+    return f"{first:010d}-{last:010d}-{hashlib.sha256(raw).hexdigest()[:16]}.seg.gz"
+
+
+def parse_segment_name(name: str) -> Optional[Tuple[int, int, str]]:
+    m = _SEGMENT_RE.match(name)
+    return (int(m[1]), int(m[2]), m[3]) if m else None
+
+
+def read_segment(name: str, blob: bytes, cipher=None) -> Tuple[dict, List[dict]]:
+    """
+    (header, entries) of a segment file; `cipher` opens lines sealed with the
+    sync key. ValueError if it is damaged, misnamed or sealed with another key.
+    """
+    parsed = parse_segment_name(name)
+    if parsed is None:
+        raise ValueError(f"not a segment: {name}")
+    try:
+        raw = gzip.decompress(blob)
+    except (OSError, EOFError) as e:
+        raise ValueError(f"{name}: {e}")
+    if hashlib.sha256(raw).hexdigest()[:16] != parsed[2]:
+        raise ValueError(f"{name}: content does not match its name (incomplete copy?)")
+    lines = raw.decode("utf-8").splitlines()
+    head = json.loads(lines[0])
+    if head.get("v") != FORMAT_VERSION:
+        raise ValueError(f"{name}: unsupported segment version {head.get('v')}")
+    entries = []
+    for line in lines[1:]:
+        if not line.startswith(storage.SEALED_PREFIX):
+            if line:
+                entries.append(json.loads(line))
+        elif cipher is None or not _same_key(head, cipher):
+            raise ValueError(f"{name}: sealed with a sync key this device doesn't have")
+        else:
+            entries.append(json.loads(cipher.open(line)))
+    return head, entries
+
+
+def _same_key(head: dict, cipher) -> bool:
+    return any(c is cipher and k == head.get("key") for k, c in _ciphers.items())
+
+
+def _compact_row(row: Optional[dict]) -> Optional[dict]:
+    if row is None:
+        return None
+    out = {k: v for k, v in row.items() if k not in _ROW_DROP}
+    if row.get("ts") and "origin_ts" not in out:
+        out["origin_ts"] = row["ts"]  # when it happened on the device that did it
+    return out
+
+
+def _new_op_records(st: SyncState) -> Iterator[Tuple[dict, int]]:
+    """(op record, offset after it) for op log records past the export cursor."""
+    path = oplog.log_path()
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    offset = int(st.cursor.get("offset", 0))
+    if size < offset:
+        # The log was trimmed: continue after the last exported op (or from the start)
+        offset = 0
+        last = st.cursor.get("op")
+        hit = oplog.index().offsets.get(last) if last else None
+        if hit is not None:
+            with path.open("rb") as f:
+                f.seek(hit)
+                offset = hit + len(f.readline())
+    with path.open("rb") as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+    metrics.add_bytes("sync.export", read=len(data))
+    pos, end = 0, data.rfind(b"\n") + 1
+    while pos < end:
+        nl = data.index(b"\n", pos)
+        try:
+            rec = storage.parse_line(data[pos:nl])
+        except ValueError:
+            rec = None
+        pos = nl + 1
+        if rec is not None:
+            yield rec, offset + pos
+
+
+def _write_segment(st: SyncState, entries: List[dict], cipher) -> Path:
+    raw = _segment_bytes(st.device, entries, cipher, key_id(st.key) if cipher is not None else None)
+    out = outbox_dir() / st.device
+    out.mkdir(parents=True, exist_ok=True)
+    path = out / _segment_name(raw, entries[0]["s"], entries[-1]["s"])
+    blob = gzip.compress(raw, mtime=0)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(blob)
+    tmp.replace(path)
+    metrics.add_bytes("sync.export", written=len(blob))
+    return path
+
+
+@metrics.timed("sync.export")
+def export_segments(st: SyncState, cipher=None) -> List[Path]:
+    """Turn new local ops into outbox segments (sealed with `cipher`, if any). Returns their paths."""
+    entries: List[dict] = []
+    cursor = dict(st.cursor)
+    written: List[Path] = []
+    seq = st.seq
+
+    def flush() -> None:
+        if entries:
+            written.append(_write_segment(st, entries, cipher))
+            entries.clear()
+
+    for rec, after in _new_op_records(st):
+        cursor = {"offset": after, "op": rec.get("op")}
+        if rec.get("kind") == IMPORT_KIND or not rec.get("items"):
+            continue
+        seq += 1
+        entries.append({
+            "s": seq, "op": rec["op"], "kind": rec.get("kind"), "ts": rec.get("ts"),
+            "items": [{"key": it.get("key"), "ledger": _compact_row(it.get("ledger")),
+                       "history": _compact_row(it.get("history")),
+                       "task": it.get("task"), "change": it.get("change")} for it in rec["items"]],
+        })
+        if len(entries) >= SEGMENT_ENTRIES:
+            flush()
+    flush()
+    st.seq, st.cursor = seq, cursor
+    st.save()
+    return written
+
+
+@metrics.timed("sync.import")
+def import_segment(state, st: SyncState, name: str, blob: bytes, cipher=None) -> int:
+    """Apply the unseen entries of one segment. Returns entries applied."""
+    head, entries = read_segment(name, blob, cipher)
+    device = head["device"]
+    if device == st.device:
+        return 0
+    ranges = st.seen.get(device, [])
+    fresh = [e for e in entries if not contains(ranges, int(e["s"]))]
+    if fresh:
+        state.apply_remote(device, fresh, st.tombstones)
+    for e in entries:
+        ranges = add_range(ranges, int(e["s"]), int(e["s"]))
+    st.seen[device] = ranges
+    st.save()  # after the journal commit: a crash in between re-applies, and row keys drop the repeat
+    return len(fresh)
+
+
+def _wanted(st: SyncState, device: str, name: str) -> bool:
+    parsed = parse_segment_name(name)
+    return (parsed is not None and device != st.device
+            and not covers(st.seen.get(device, []), parsed[0], parsed[1]))
+
+
+def _own_segments(st: SyncState) -> List[Path]:
+    out = outbox_dir() / st.device
+    return sorted(p for p in out.glob("*.seg.gz")) if out.exists() else []
+
+
+def _lock():
+    from .single_instance import InstanceLock
+    sync_dir().mkdir(parents=True, exist_ok=True)
+    lock = InstanceLock(sync_dir() / "sync.lock")
+    if not lock.acquire():
+        raise RuntimeError("Another sync is already running.")
+    return lock
+
+
+_local = threading.Lock()
+
+
+def _run(fn, *args) -> Dict[str, Any]:
+    with _local:
+        lock = _lock()
+        try:
+            return fn(*args)
+        finally:
+            lock.release()
+
+
+# ---------- Folder / zip ----------
+def _read_key(text: Optional[str], where: str) -> Optional[Dict[str, Any]]:
+    if text is None:
+        return None
+    try:
+        params = json.loads(text)
+        if not isinstance(params, dict) or not isinstance(params.get("salt"), str):
+            raise ValueError("no salt")
+    except ValueError as e:
+        raise SyncKeyError(f"{where}: {KEY_NAME} is damaged ({e}).")
+    return params
+
+
+def _sync_folder(state, folder: Path, ask, new_passphrase) -> Dict[str, Any]:
+    st = SyncState.load()
+    key_path = folder / KEY_NAME
+    shared = _read_key(key_path.read_text(encoding="utf-8") if key_path.exists() else None, str(folder))
+    cipher = _resolve_key(st, shared, str(folder), ask, new_passphrase)
+    if shared is None and st.key is not None:
+        storage.atomic_write(key_path, json.dumps(st.key))
+    mine = folder / st.device
+    exported = export_segments(st, cipher)
+    mine.mkdir(parents=True, exist_ok=True)
+    uploaded = 0
+    for seg in _own_segments(st):
+        if not (mine / seg.name).exists():
+            tmp = mine / (seg.name + ".tmp")
+            shutil.copyfile(seg, tmp)
+            tmp.replace(mine / seg.name)
+            uploaded += 1
+    applied, skipped, errors = 0, 0, []
+    for dev_dir in sorted(p for p in folder.iterdir() if p.is_dir() and p.name != st.device):
+        for seg in sorted(dev_dir.glob("*.seg.gz")):
+            if not _wanted(st, dev_dir.name, seg.name):
+                skipped += 1
+                continue
+            try:
+                applied += import_segment(state, st, seg.name, seg.read_bytes(), cipher)
+            except ValueError as e:
+                errors.append(str(e))
+    storage.atomic_write(mine / "seen.json", json.dumps({"device": st.device, "seen": st.seen}))
+    return {"device": st.device, "exported": len(exported), "uploaded": uploaded,
+            "applied": applied, "skipped": skipped, "errors": errors}
+
+
+def _sync_zip(state, path: Path, ask, new_passphrase) -> Dict[str, Any]:
+    st = SyncState.load()
+    applied, skipped, errors = 0, 0, []
+    peer_seen: Dict[str, Ranges] = {}
+    text = None
+    if path.exists():
+        with zipfile.ZipFile(path) as zf:
+            if KEY_NAME in zf.namelist():
+                text = zf.read(KEY_NAME).decode("utf-8")
+    cipher = _resolve_key(st, _read_key(text, str(path)), str(path), ask, new_passphrase)
+    if path.exists():
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                device, _, name = info.filename.partition("/")
+                if info.filename == KEY_NAME:
+                    continue
+                if name == "seen.json":
+                    peer_seen = json.loads(zf.read(info)).get("seen", {})
+                elif not _wanted(st, device, name):
+                    skipped += 1
+                else:
+                    try:
+                        applied += import_segment(state, st, name, zf.read(info), cipher)
+                    except ValueError as e:
+                        errors.append(str(e))
+    exported = export_segments(st, cipher)
+    # Hand back only what the peer hasn't applied yet
+    theirs = peer_seen.get(st.device, [])
+    send = [p for p in _own_segments(st)
+            if not covers(theirs, *parse_segment_name(p.name)[:2])]
+    tmp = path.with_name(path.name + ".tmp")
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zf:  # segments are gzipped already
+        for seg in send:
+            zf.write(seg, f"{st.device}/{seg.name}")
+        zf.writestr(f"{st.device}/seen.json", json.dumps({"device": st.device, "seen": st.seen}))
+        if st.key is not None:
+            zf.writestr(KEY_NAME, json.dumps(st.key))
+    tmp.replace(path)
+    return {"device": st.device, "exported": len(exported), "uploaded": len(send),
+            "applied": applied, "skipped": skipped, "errors": errors}
+
+
+def sync(state, target: os.PathLike | str, ask: Optional[Callable[[], Optional[str]]] = None,
+         new_passphrase: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Sync `state`'s data directory with a shared folder or a .zip bundle.
+    Returns {"device", "exported", "uploaded", "applied", "skipped", "errors"}.
+
+    `ask()` returns the sync passphrase when the target has one and neither
+    SYNC_PASSPHRASE_ENV nor this session already supplied it;
+    `new_passphrase` sets one on a target that has none. Raises SyncKeyError
+    (before anything is imported) when the key can't be opened.
+    """
+    path = Path(target).expanduser()
+    with storage.use(state.ctx):
+        if path.suffix.lower() == ".zip":
+            return _run(_sync_zip, state, path, ask, new_passphrase)
+        if not path.is_dir():
+            raise FileNotFoundError(f"Sync folder not found: {path}")
+        return _run(_sync_folder, state, path, ask, new_passphrase)
+
+
+def status() -> Dict[str, Any]:
+    st = SyncState.load()
+    return {"device": st.device, "exported_seq": st.seq, "key": key_id(st.key),
+            "seen": {d: r for d, r in st.seen.items()}}
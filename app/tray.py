@@ -1,77 +1,344 @@
 # app/tray.py
+"""
+System tray icon.
+
+Nothing here imports pystray or PIL at module load: TrayManager.start()
+imports them on the tray thread, so a missing or broken backend only costs
+that thread (on_error tells the app to minimize instead of hiding).
+
+Icon bitmaps are rendered once per size and kept in APP_DIR/cache as raw
+RGBA, keyed by the source icon's mtime (or the fallback drawing's
+version); later starts read the bytes back instead of decoding the ICO or
+drawing. Badges (pending count, balance) are composed by pasting glyphs
+from a GlyphAtlas onto the cached base image, so changing one never
+re-runs PIL text drawing; the last few composed badges are memoized.
+
+update(TraySummary) drives the tooltip, the badge and the menu (balance,
+pending count, time to window end, Complete items for the next due
+tasks). The app pushes a summary after state events and on its minute
+tick, coalesced to one per second; an unchanged summary costs one
+comparison, and the menu items are built from the summary alone.
+"""
 from __future__ import annotations
 import platform
 import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import storage
+from . import metrics
+
+FALLBACK_VERSION = 1  # bump when _draw_fallback changes
+GLYPHS = "0123456789$.,-+k"
+BADGE_CACHE = 32
+BADGE_MAX_CHARS = 5
+BADGE_FILL = (200, 30, 30, 255)
+TOOLTIP_MAX = 127  # Windows truncates notify-icon tips at 128 chars
+MENU_DESC_CHARS = 32
+
+
+def cache_dir() -> Path:
+    return storage.APP_DIR / "cache"
+
 
-import pystray
-from PIL import Image, ImageDraw
+def tray_size() -> int:
+    """Bitmap size handed to the tray backend (Windows shows 16/32 px icons)."""
+    return 32 if platform.system() == "Windows" else 64
 
-def _load_icon(app_root: Path) -> Image.Image:
-    """Try ICO from assets; otherwise draw a simple TG icon."""
+
+# ---------- Icon bitmaps ----------
+def _icon_source(app_root: Path) -> Optional[Path]:
     ico = app_root / "assets" / "icon.ico"
-    if ico.exists():
+    return ico if ico.exists() else None
+
+
+def _cache_key(src: Optional[Path]) -> str:
+    if src is not None:
         try:
-            return Image.open(ico)
-        except Exception:
+            return f"{src.stem}-{src.stat().st_mtime_ns}"
+        except OSError:
             pass
-    # Fallback: simple coin-like circle with TG
+    return f"fallback-v{FALLBACK_VERSION}"
+
+
+def _draw_fallback():
+    """Simple coin-like circle with TG."""
+    from PIL import Image, ImageDraw
     img = Image.new("RGBA", (256, 256), (255, 255, 255, 0))
     d = ImageDraw.Draw(img)
     d.ellipse((16, 16, 240, 240), outline=(0, 0, 0, 255), width=8, fill=(255, 215, 0, 255))
     d.text((100, 110), "TG", fill=(0, 0, 0, 255))
     return img
 
+
+def _render(src: Optional[Path], size: int):
+    from PIL import Image
+    img = None
+    if src is not None:
+        try:
+            with Image.open(src) as im:
+                # Multi-size ICO: start from the smallest frame at least `size` wide
+                fits = sorted(s for s in im.info.get("sizes", ()) if s[0] >= size)
+                if fits:
+                    im.size = fits[0]
+                img = im.convert("RGBA")
+        except Exception:
+            img = None
+    if img is None:
+        img = _draw_fallback()
+    if img.size != (size, size):
+        img = img.resize((size, size), Image.LANCZOS)
+    return img
+
+
+@metrics.timed("tray.load_icon")
+def load_icon(app_root: Path, size: int):
+    """The tray bitmap at `size` px, from APP_DIR/cache when the source is unchanged."""
+    from PIL import Image
+    key = _cache_key(_icon_source(app_root))
+    path = cache_dir() / f"tray-{key}-{size}.rgba"
+    try:
+        data = path.read_bytes()
+        if len(data) == size * size * 4:
+            metrics.add_bytes("tray.icon_cache", read=len(data))
+            return Image.frombytes("RGBA", (size, size), data)
+    except OSError:
+        pass
+    img = _render(_icon_source(app_root), size)
+    try:
+        cache_dir().mkdir(parents=True, exist_ok=True)
+        for old in cache_dir().glob(f"tray-*-{size}.rgba"):
+            if old != path:
+                old.unlink()  # rendered from an older icon
+        data = img.tobytes()
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+        metrics.add_bytes("tray.icon_cache", written=len(data))
+    except OSError:
+        pass  # no cache this time; the bitmap is still good
+    return img
+
+
+# ---------- Badges ----------
+class GlyphAtlas:
+    """GLYPHS rendered once, white on transparent, into one strip; text() pastes from it."""
+
+    def __init__(self, height: int) -> None:
+        from PIL import Image, ImageDraw, ImageFont
+        font = ImageFont.load_default()
+        boxes = {c: font.getbbox(c) for c in GLYPHS}
+        top = min(b[1] for b in boxes.values())
+        gh = max(1, max(b[3] for b in boxes.values()) - top)
+        scale = max(1, round(height / gh))
+        self.height = gh * scale
+        self.slots: Dict[str, Tuple[int, int]] = {}  # char -> (x, width) in the strip
+        tiles = []
+        x = 0
+        for c in GLYPHS:
+            left, _, right, _ = boxes[c]
+            tile = Image.new("RGBA", (max(1, right - left), gh), (0, 0, 0, 0))
+            ImageDraw.Draw(tile).text((-left, -top), c, font=font, fill=(255, 255, 255, 255))
+            if scale > 1:
+                tile = tile.resize((tile.width * scale, self.height), Image.NEAREST)
+            tiles.append(tile)
+            self.slots[c] = (x, tile.width)
+            x += tile.width
+        self.strip = Image.new("RGBA", (x, self.height), (0, 0, 0, 0))
+        for c, tile in zip(GLYPHS, tiles):
+            self.strip.paste(tile, (self.slots[c][0], 0))
+        self.spacing = scale
+
+    def text(self, s: str):
+        from PIL import Image
+        slots = [self.slots[c] for c in s if c in self.slots]
+        width = sum(w for _, w in slots) + self.spacing * max(0, len(slots) - 1)
+        out = Image.new("RGBA", (max(1, width), self.height), (0, 0, 0, 0))
+        x = 0
+        for sx, w in slots:
+            out.paste(self.strip.crop((sx, 0, sx + w, self.height)), (x, 0))
+            x += w + self.spacing
+        return out
+
+
+class BadgeRenderer:
+    """Base icon plus an optional badge in the bottom-right corner."""
+
+    def __init__(self, base) -> None:
+        self.base = base
+        self.size = base.width
+        self.atlas = GlyphAtlas(max(6, self.size // 3))
+        self._memo: "OrderedDict[str, Any]" = OrderedDict()
+
+    @metrics.timed("tray.badge")
+    def badge(self, text: str):
+        text = text[:BADGE_MAX_CHARS]
+        img = self._memo.get(text)
+        if img is not None:
+            self._memo.move_to_end(text)
+            return img
+        from PIL import Image
+        img = self.base.copy()
+        if text:
+            glyphs = self.atlas.text(text)
+            pad = max(1, self.size // 32)
+            if glyphs.width > self.size - 2 * pad:
+                glyphs = glyphs.crop((0, 0, self.size - 2 * pad, glyphs.height))
+            w, h = glyphs.width + 2 * pad, glyphs.height + 2 * pad
+            x, y = self.size - w, self.size - h
+            img.paste(Image.new("RGBA", (w, h), BADGE_FILL), (x, y))
+            img.alpha_composite(glyphs, (x + pad, y + pad))
+        self._memo[text] = img
+        if len(self._memo) > BADGE_CACHE:
+            self._memo.popitem(last=False)
+        return img
+
+
+# ---------- Tray icon ----------
+@dataclass(frozen=True)
+class TraySummary:
+    balance: float
+    pending: int
+    window: str  # e.g. "window ends in 2h 05m"
+    next_tasks: Tuple[Tuple[str, str, float], ...] = ()  # (id, description, payout), soonest due first
+
+    def tooltip(self) -> str:
+        text = f"Todo Gamble — ${self.balance:,.2f} · {self.pending} pending · {self.window}"
+        return text[:TOOLTIP_MAX]
+
+    def badge(self) -> str:
+        return str(self.pending) if self.pending < 1000 else "999+"
+
+
 class TrayManager:
-    def __init__(self, app_root: Path, on_show: Callable[[], None], on_quit: Callable[[], None]):
+    def __init__(self, app_root: Path, on_show: Callable[[], None], on_quit: Callable[[], None],
+                 on_error: Optional[Callable[[], None]] = None,
+                 on_complete: Optional[Callable[[str], None]] = None):
+        self.app_root = app_root
         self.on_show = on_show
         self.on_quit = on_quit
-        self._icon: Optional[pystray.Icon] = None
+        self.on_error = on_error  # the backend failed to load or run (called on the tray thread)
+        self.on_complete = on_complete  # task id picked from the menu (called on the tray thread)
+        self._icon = None  # pystray.Icon, created on the tray thread
+        self._pystray = None  # the module, once imported
+        self._renderer: Optional[BadgeRenderer] = None
+        self._badge = ""
+        self._summary: Optional[TraySummary] = None
+        self._lock = threading.Lock()
         self._thread: Optional[threading.Thread] = None
-
-        image = _load_icon(app_root)
-        self._icon = pystray.Icon(
-            "todo_gamble_tray",
-            image,
-            "Todo Gamble",
-            menu=pystray.Menu(
-                pystray.MenuItem("Show", lambda _: self.on_show()),
-                pystray.MenuItem("Quit", lambda _: self._quit())
-            ),
-        )
         self._started = False
 
     def start(self) -> None:
-        if not self._icon:
-            return
+        """Load the backend and show the icon on a daemon thread."""
         if self._started:
             return
         self._started = True
+        self._thread = threading.Thread(target=self._run, name="tray", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            with metrics.timer("tray.start"):
+                import pystray
+                renderer = BadgeRenderer(load_icon(self.app_root, tray_size()))
+                with self._lock:
+                    image = renderer.badge(self._badge)
+                    self._renderer = renderer
+                    summary = self._summary
+                self._pystray = pystray
+                icon = pystray.Icon(
+                    "todo_gamble_tray",
+                    image,
+                    summary.tooltip() if summary else "Todo Gamble",
+                    menu=pystray.Menu(self._menu_items),  # re-read on update_menu()
+                )
+        except Exception:
+            self._failed()
+            return
+        with self._lock:
+            if not self._started:
+                return  # stopped while loading
+            self._icon = icon
         # macOS: prefer non-blocking run if available
-        if platform.system() == "Darwin" and hasattr(self._icon, "run_detached"):
+        if platform.system() == "Darwin" and hasattr(icon, "run_detached"):
             try:
-                self._icon.run_detached()
+                icon.run_detached()
                 return
             except Exception:
                 pass
-        # Others: run in a daemon thread
-        def run():
-            try:
-                self._icon.run()
-            except Exception:
-                pass
-        self._thread = threading.Thread(target=run, daemon=True)
-        self._thread.start()
+        try:
+            icon.run()
+        except Exception:
+            self._failed()
+
+    def _failed(self) -> None:
+        self._started = False
+        if self.on_error is not None:
+            self.on_error()
+
+    def set_badge(self, text: str) -> None:
+        """Show `text` (e.g. a pending count) on the icon; "" clears it."""
+        with self._lock:
+            if text == self._badge:
+                return
+            self._badge = text
+            icon, renderer = self._icon, self._renderer
+        if icon is None or renderer is None:
+            return  # picked up when the icon is created
+        try:
+            icon.icon = renderer.badge(text)
+        except Exception:
+            pass
+
+    def update(self, summary: TraySummary) -> None:
+        """Show a new summary: tooltip, badge and menu (nothing happens if it is unchanged)."""
+        with self._lock:
+            old, self._summary = self._summary, summary
+            icon = self._icon
+        if summary == old:
+            return
+        self.set_badge(summary.badge())
+        if icon is None:
+            return  # picked up when the icon is created
+        try:
+            icon.title = summary.tooltip()
+            icon.update_menu()
+        except Exception:
+            pass
+
+    def _menu_items(self):
+        """Menu for the current summary (called by the backend on the tray thread)."""
+        item, sep = self._pystray.MenuItem, self._pystray.Menu.SEPARATOR
+        s = self._summary
+        items = []
+        if s is not None:
+            items.append(item(f"Balance ${s.balance:,.2f}", None, enabled=False))
+            items.append(item(f"{s.pending} pending · {s.window}", None, enabled=False))
+            if s.next_tasks and self.on_complete is not None:
+                items.append(sep)
+                for task_id, desc, payout in s.next_tasks:
+                    if len(desc) > MENU_DESC_CHARS:
+                        desc = desc[:MENU_DESC_CHARS - 1] + "…"
+                    items.append(item(f"Complete: {desc} (+${payout:,.2f})", self._complete_action(task_id)))
+            items.append(sep)
+        items.append(item("Show", lambda _: self.on_show(), default=True))
+        items.append(item("Quit", lambda _: self._quit()))
+        return items
+
+    def _complete_action(self, task_id: str):
+        # pystray passes (icon) to one-argument actions; bind the id in a closure
+        return lambda _: self.on_complete(task_id)
 
     def stop(self) -> None:
+        with self._lock:
+            icon, self._started = self._icon, False
         try:
-            if self._icon:
-                self._icon.stop()
+            if icon:
+                icon.stop()
         except Exception:
             pass
-        finally:
-            self._started = False
 
     def _quit(self) -> None:
         # Stop tray, then delegate to app quit
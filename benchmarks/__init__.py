@@ -0,0 +1,8 @@
+"""
+Benchmarks for the storage and AppState hot paths.
+
+    python -m benchmarks --sizes 1k,100k --out results.json
+    python -m benchmarks --sizes 1k,100k --compare baseline.json
+
+See benchmarks/__main__.py for all options.
+"""
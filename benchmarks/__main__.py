@@ -0,0 +1,154 @@
+# =============================
+# File: benchmarks/__main__.py
+# =============================
+"""
+Run the benchmark scenarios and optionally compare against a baseline.
+
+    python -m benchmarks                                  # 1k and 100k rows
+    python -m benchmarks --sizes 1k,100k,1m --repeat 5 --out results.json
+    python -m benchmarks --compare baseline.json --threshold 0.25
+    python -m benchmarks --only compute_balance,read_history
+
+Results are JSON: {"meta": {...}, "results": {"<scenario>@<size>": {...}}}.
+With --compare, the exit code is 1 if any median is slower than the
+baseline by more than --threshold (a fraction; 0.25 = 25%).
+"""
+from __future__ import annotations
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .generators import DATASET_VERSION, parse_size, write_dataset
+from .scenarios import SCENARIOS
+
+
+def _label(size: int) -> str:
+    if size >= 1_000_000 and size % 1_000_000 == 0:
+        return f"{size // 1_000_000}m"
+    if size >= 1_000 and size % 1_000 == 0:
+        return f"{size // 1_000}k"
+    return str(size)
+
+
+def run_benchmarks(sizes: List[int], names: List[str], repeat: int, data_root: Path,
+                   seed: int = 1234, log=print) -> Dict[str, dict]:
+    results: Dict[str, dict] = {}
+    for size in sizes:
+        base = data_root / f"data-{_label(size)}-{seed}-v{DATASET_VERSION}"
+        if not (base / "ledger.txt").exists():
+            t0 = time.perf_counter()
+            write_dataset(base, size, seed)
+            log(f"generated {_label(size)} dataset in {time.perf_counter() - t0:.1f}s")
+        for name in names:
+            sc = SCENARIOS[name]
+            times: List[float] = []
+            ops = 1
+            for _ in range(repeat):
+                work = base
+                if sc.fresh:
+                    work = data_root / "work"
+                    shutil.rmtree(work, ignore_errors=True)
+                    shutil.copytree(base, work)
+                run = sc.setup(work, size)
+                t0 = time.perf_counter()
+                ops = run() or 1
+                times.append(time.perf_counter() - t0)
+            key = f"{name}@{_label(size)}"
+            med = statistics.median(times)
+            results[key] = {
+                "scenario": name,
+                "size": size,
+                "runs": repeat,
+                "ops": ops,
+                "median_s": med,
+                "min_s": min(times),
+                "max_s": max(times),
+                "per_op_us": med / ops * 1e6,
+            }
+            log(f"{key:<34} median {med * 1000:10.2f} ms   per-op {med / ops * 1e6:10.1f} us")
+    return results
+
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Return human-readable regression lines (empty = no regressions)."""
+    regressions = []
+    for key, cur in sorted(current.items()):
+        base = baseline.get(key)
+        if not base or not base.get("median_s"):
+            continue
+        ratio = cur["median_s"] / base["median_s"]
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  REGRESSION"
+            regressions.append(f"{key}: {ratio:.2f}x baseline")
+        print(f"{key:<34} {ratio:6.2f}x baseline{mark}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1k,100k", help="comma-separated row counts (1k, 100k, 1m)")
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--data-root", help="keep generated datasets here (default: temp dir)")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline results JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--list", action="store_true", help="list scenarios and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(SCENARIOS))
+        return 0
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+
+    tmp = None
+    if args.data_root:
+        data_root = Path(args.data_root)
+        data_root.mkdir(parents=True, exist_ok=True)
+    else:
+        tmp = tempfile.TemporaryDirectory(prefix="todo_gamble_bench_")
+        data_root = Path(tmp.name)
+    try:
+        results = run_benchmarks(sizes, names, max(1, args.repeat), data_root, args.seed)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    doc = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline.get("results", {}), args.threshold)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# =============================
+# File: benchmarks/generators.py
+# =============================
+"""
+Synthetic data directories shaped like real ones: tasks.json, ledger.txt
+(JSONL with consistent running balances) and history.jsonl, spread over the
+last year. Output is deterministic for a given (rows, seed).
+"""
+from __future__ import annotations
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+WORDS = (
+    "gym run read write email call groceries laundry study practice piano "
+    "clean kitchen review code budget plan walk dog meditate stretch journal "
+    "cook dinner fix bike water plants pay bills inbox zero report draft"
+).split()
+
+# (ledger type, history event, sign) — weights roughly match real usage
+_EVENTS = [
+    ("payout", "completed", +1, 60),
+    ("forfeit", "forfeited", -1, 25),
+    ("purchase", "purchase", -1, 10),
+    ("delete_penalty", "deleted_penalty", -1, 3),
+    ("refund", "refund", +1, 2),
+]
+
+SETTINGS = {"creation_window": {"start": "00:00", "end": "23:59"}}
+DATASET_VERSION = 2  # bump when the shape changes, so kept --data-root sets are rebuilt
+PENDING_TASKS = 300  # a heavy user's open list; independent of the ledger size
+
+
+def parse_size(s: str) -> int:
+    """'1k' -> 1000, '100k' -> 100000, '1m' -> 1000000."""
+    s = s.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(s[-1:], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+
+def _description(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).capitalize()
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def make_tasks(n: int, rng: random.Random, overdue: bool = False) -> List[dict]:
+    now = datetime.now()
+    due = now - timedelta(hours=1) if overdue else now + timedelta(days=1)
+    return [{
+        "id": _uuid(rng),
+        "description": _description(rng),
+        "buy_in": float(rng.randint(1, 20)),
+        "payout": float(rng.randint(2, 40)),
+        "status": "pending",
+        "due_at": due.isoformat(),
+        "created_at": (now - timedelta(hours=2)).isoformat(),
+    } for _ in range(n)]
+
+
+def write_dataset(root: Path, rows: int, seed: int = 1234, tasks: int | None = None) -> Path:
+    """
+    Create (or overwrite) a data directory with `rows` ledger and history
+    lines and `tasks` pending tasks (default PENDING_TASKS, at most `rows`).
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    (root / "settings.json").write_text(json.dumps(SETTINGS, indent=2), encoding="utf-8")
+    (root / "tasks.json").write_text(
+        json.dumps(make_tasks(min(rows, PENDING_TASKS) if tasks is None else tasks, rng), indent=2), encoding="utf-8")
+
+    kinds = [e[:3] for e in _EVENTS]
+    weights = [e[3] for e in _EVENTS]
+    start = datetime.now().astimezone() - timedelta(days=365)
+    step = timedelta(days=365) / max(rows, 1)
+    balance = 0.0
+    with (root / "ledger.txt").open("w", encoding="utf-8") as led, \
+            (root / "history.jsonl").open("w", encoding="utf-8") as hist:
+        for i in range(rows):
+            ltype, event, sign = rng.choices(kinds, weights)[0]
+            buy_in = float(rng.randint(1, 20))
+            payout = float(rng.randint(2, 40))
+            amount = {"payout": payout, "forfeit": -buy_in,
+                      "delete_penalty": round(-0.5 * buy_in, 2)}.get(ltype, sign * float(rng.randint(1, 50)))
+            balance += amount
+            ts = (start + step * i).isoformat()
+            task_id = _uuid(rng)
+            desc = _description(rng)
+            led.write(json.dumps({"type": ltype, "task_id": task_id, "description": desc,
+                                  "amount": amount, "ts": ts, "balance": round(balance, 2)}) + "\n")
+            hist.write(json.dumps({"event": event, "task_id": task_id, "description": desc,
+                                   "buy_in": buy_in, "payout": amount, "ts": ts}) + "\n")
+    return root
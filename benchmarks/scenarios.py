@@ -0,0 +1,164 @@
+# =============================
+# File: benchmarks/scenarios.py
+# =============================
+"""
+Timed scenarios. Each one is registered with @scenario and has a setup
+function `(data_dir, size) -> run`; only `run()` is timed and it returns the
+number of operations it performed (for per-op figures). Scenarios that
+modify files are marked `fresh=True` and get a private copy of the dataset
+for every repetition.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict
+
+from app import storage
+
+Run = Callable[[], int]
+Setup = Callable[[Path, int], Run]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    setup: Setup
+    fresh: bool = False
+
+
+SCENARIOS: Dict[str, Scenario] = {}
+
+
+def scenario(name: str, fresh: bool = False) -> Callable[[Setup], Setup]:
+    def register(fn: Setup) -> Setup:
+        SCENARIOS[name] = Scenario(name, fn, fresh)
+        return fn
+    return register
+
+
+APPENDS_PER_RUN = 100
+
+
+@scenario("append_ledger_entry", fresh=True)
+def _append_ledger_entry(data: Path, size: int) -> Run:
+    storage.set_app_dir(data)
+
+    def run() -> int:
+        for i in range(APPENDS_PER_RUN):
+            storage.append_ledger_entry({"type": "payout", "description": f"bench {i}", "amount": 1.0})
+        return APPENDS_PER_RUN
+    return run
+
+
+@scenario("journaled_purchase", fresh=True)
+def _journaled_purchase(data: Path, size: int) -> Run:
+    # One journal record (fsynced) per operation; data-file fsyncs are deferred
+    from app.app_state import AppState
+    storage.set_app_dir(data)
+    state = AppState()
+
+    def run() -> int:
+        for i in range(APPENDS_PER_RUN):
+            state.record_purchase(f"bench {i}", 1.0)
+        state.close()
+        return APPENDS_PER_RUN
+    return run
+
+
+@scenario("compute_balance")
+def _compute_balance(data: Path, size: int) -> Run:
+    storage.set_app_dir(data)
+    return lambda: (storage.compute_balance(), 1)[1]
+
+
+@scenario("read_history")
+def _read_history(data: Path, size: int) -> Run:
+    storage.set_app_dir(data)
+    return lambda: (storage.read_history(max_lines=500), 1)[1]
+
+
+@scenario("read_history_page")
+def _read_history_page(data: Path, size: int) -> Run:
+    storage.set_app_dir(data)
+
+    def run() -> int:
+        cursor, pages = None, 0
+        for _ in range(10):
+            _, cursor = storage.read_history_page(cursor, 50)
+            pages += 1
+            if cursor is None:
+                break
+        return pages
+    return run
+
+
+@scenario("compact_ledger", fresh=True)
+def _compact_ledger(data: Path, size: int) -> Run:
+    storage.set_app_dir(data)
+    return lambda: (storage.compact_ledger(retain_days=30), 1)[1]
+
+
+@scenario("verify_ledger")
+def _verify_ledger(data: Path, size: int) -> Run:
+    storage.set_app_dir(data)
+    return lambda: (storage.verify_ledger(), 1)[1]
+
+
+@scenario("forfeit_overdue", fresh=True)
+def _forfeit_overdue(data: Path, size: int) -> Run:
+    from app.app_state import AppState
+    storage.set_app_dir(data)
+    state = AppState()
+    past = (datetime.now() - timedelta(hours=1)).isoformat()
+    for t in state.tasks:
+        t.due_at = past
+    n = len(state.tasks)
+    return lambda: (state.forfeit_overdue(), n)[1]
+
+
+@scenario("load_tasks")
+def _load_tasks(data: Path, size: int) -> Run:
+    storage.set_app_dir(data)
+    return lambda: len(storage.load_tasks())
+
+
+@scenario("save_tasks", fresh=True)
+def _save_tasks(data: Path, size: int) -> Run:
+    storage.set_app_dir(data)
+    tasks = storage.load_tasks()
+    return lambda: (storage.save_tasks(tasks), len(tasks))[1]
+
+
+@scenario("appstate_startup", fresh=True)
+def _appstate_startup(data: Path, size: int) -> Run:
+    from app.app_state import AppState
+    storage.set_app_dir(data)
+    return lambda: (AppState(), 1)[1]
+
+
+
+# ---------- Encrypted directory (app.encryption; needs `cryptography`) ----------
+BENCH_PASSPHRASE = "benchmark passphrase"
+
+
+def _on_encrypted(name: str, base: Setup) -> None:
+    """Register `<name>_encrypted`: the same run on an encrypted copy of the dataset."""
+    def setup(data: Path, size: int) -> Run:
+        from app import encryption
+        run = base(data, size)  # points storage at `data`
+        encryption.enable(BENCH_PASSPHRASE)  # seals the copy and derives the key (not timed)
+        return run
+    SCENARIOS[f"{name}_encrypted"] = Scenario(f"{name}_encrypted", setup, fresh=True)
+
+
+def _register_encrypted() -> None:
+    from app import encryption
+    if not encryption.available():
+        return
+    for name, base in (("append_ledger_entry", _append_ledger_entry), ("read_history", _read_history),
+                       ("read_history_page", _read_history_page), ("verify_ledger", _verify_ledger)):
+        _on_encrypted(name, base)
+
+
+_register_encrypted()
@@ -0,0 +1,300 @@
+# =============================
+# File: benchmarks/simulate.py
+# =============================
+"""
+Drive AppState through simulated days on a ManualClock (app.clock) and
+report throughput, latency percentiles and file growth.
+
+    python -m benchmarks.simulate                         # 4 weeks, 200 tasks/day
+    python -m benchmarks.simulate --days 90 --tasks-per-day 1000 --out sim.json
+    python -m benchmarks.simulate --days 90 --compact-days 30   # weekly compaction
+
+Every simulated day has the app's own schedule: a tick every
+--tick-minutes (settings reload, forfeits, recurring instances, the
+Monday history purge, the columnar sidecar), tasks added inside the
+creation window, completions, purchases, deletes and undos spread over
+the day. The remaining tasks are forfeited when their window ends. The
+clock jumps from event to event, so a month runs in seconds.
+
+Latencies are wall time per AppState call. File sizes are sampled at
+the end of every day (kept per day in --out). Output is deterministic
+for a given seed, apart from task ids and timings.
+"""
+from __future__ import annotations
+import argparse
+import heapq
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app import clock, storage
+from .generators import WORDS
+
+# Data files reported on; directories are summed
+FILES = (
+    ("ledger", "ledger.txt"),
+    ("history", "history.jsonl"),
+    ("history_archive", "history_archive"),
+    ("oplog", "oplog.jsonl"),
+    ("tasks", "tasks.json"),
+    ("journal", "journal.jsonl"),
+    ("dedup_keys", "keys.txt"),
+    ("columns", "columns"),
+)
+PERCENTILES = (50, 90, 99)
+
+
+def _size(path: Path) -> int:
+    if path.is_dir():
+        return sum(_size(p) for p in path.iterdir())
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def file_sizes(root: Path) -> Dict[str, int]:
+    sizes = {name: _size(root / rel) for name, rel in FILES}
+    sizes["total"] = _size(root)
+    return sizes
+
+
+def percentile(sorted_ms: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_ms:
+        return 0.0
+    k = max(0, min(len(sorted_ms) - 1, int(round(p / 100 * len(sorted_ms) + 0.5)) - 1))
+    return sorted_ms[k]
+
+
+class Simulation:
+    def __init__(self, root: Path, start: date, tasks_per_day: int, complete_rate: float,
+                 purchases_per_day: int, deletes_per_day: int, undos_per_day: int,
+                 templates: int, batch: int, tick_minutes: int, compact_days: Optional[int],
+                 window: Tuple[str, str], seed: int) -> None:
+        self.root = root
+        self.rng = random.Random(seed)
+        self.clock = clock.ManualClock(datetime.combine(start, datetime.min.time()))
+        self.tasks_per_day = tasks_per_day
+        self.complete_rate = complete_rate
+        self.purchases_per_day = purchases_per_day
+        self.deletes_per_day = deletes_per_day
+        self.undos_per_day = undos_per_day
+        self.templates = templates
+        self.batch = max(1, batch)
+        self.tick = timedelta(minutes=max(1, tick_minutes))
+        self.compact_days = compact_days
+        self.window = window
+        self.latency: Dict[str, List[float]] = {}
+        self.rejected: Dict[str, int] = {}
+        self.days: List[dict] = []
+        self.state = None
+
+    # ---------- Timing ----------
+    def _timed(self, kind: str, fn: Callable[[], object]) -> object:
+        t0 = time.perf_counter()
+        try:
+            return fn()
+        except (KeyError, ValueError, PermissionError):
+            # e.g. a task forfeited between picking and completing it
+            self.rejected[kind] = self.rejected.get(kind, 0) + 1
+            return None
+        finally:
+            self.latency.setdefault(kind, []).append((time.perf_counter() - t0) * 1000)
+
+    # ---------- Setup ----------
+    def open(self) -> None:
+        from app.app_state import AppState
+        from app.recurring import Template
+        storage.set_app_dir(self.root)
+        with clock.use(self.clock):
+            self.state = self._timed("open", AppState)
+            self.state.set_window_times(*self.window)
+            for i in range(self.templates):
+                rule = self.rng.choice(("daily", "weekdays", "weekends", "mon,wed,fri", "every 3 days"))
+                self.state.templates.add(Template.new(f"{self._words()} (recurring {i})", 2, 3, rule))
+
+    def _words(self) -> str:
+        return " ".join(self.rng.sample(WORDS, 2))
+
+    # ---------- One day ----------
+    def _events(self, day: datetime) -> List[Tuple[datetime, int, str]]:
+        start, end = self.state.window_for(day)
+        window_s = max(60, int((end - start).total_seconds()))
+        events: List[Tuple[datetime, int, str]] = []
+
+        def spread(n: int, kind: str, lo: datetime, span_s: int) -> None:
+            for _ in range(n):
+                events.append((lo + timedelta(seconds=self.rng.randrange(span_s)), len(events), kind))
+
+        t = day
+        while t < day + timedelta(days=1):
+            events.append((t, len(events), "tick"))
+            t += self.tick
+        spread(-(-self.tasks_per_day // self.batch), "add", start, window_s)
+        spread(int(self.tasks_per_day * self.complete_rate), "complete", day, 86400)
+        spread(self.purchases_per_day, "purchase", day, 86400)
+        spread(self.deletes_per_day, "delete", day, 86400)
+        spread(self.undos_per_day, "undo", day, 86400)
+        if self.compact_days and day.weekday() == 6:
+            events.append((day + timedelta(hours=23, minutes=59), len(events), "compact"))
+        heapq.heapify(events)
+        return [heapq.heappop(events) for _ in range(len(events))]
+
+    def _tick(self) -> None:
+        from app import columnar
+        state = self.state
+        state.reload_settings()
+        state.forfeit_overdue()
+        state.materialize_recurring()
+        storage.purge_history_if_monday()
+        columnar.sync()
+
+    def _pending(self) -> Optional[str]:
+        tasks = self.state.tasks
+        return self.rng.choice(tasks).id if tasks else None
+
+    def run_day(self, day: datetime) -> None:
+        state = self.state
+        counts: Dict[str, int] = {}
+        for at, _, kind in self._events(day):
+            self.clock.set(at)
+            counts[kind] = counts.get(kind, 0) + 1
+            if kind == "tick":
+                self._timed("tick", self._tick)
+            elif kind == "add":
+                specs = [{"description": self._words(), "buy_in": self.rng.randint(1, 10),
+                          "payout": self.rng.randint(5, 20)} for _ in range(self.batch)]
+                self._timed("add", lambda: state.add_tasks(specs))
+            elif kind in ("complete", "delete"):
+                task_id = self._pending()
+                if task_id is None:
+                    counts[kind] -= 1
+                    continue
+                fn = state.complete_tasks if kind == "complete" else state.delete_tasks
+                self._timed(kind, lambda: fn([task_id]))
+            elif kind == "purchase":
+                self._timed("purchase", lambda: state.record_purchase(self._words(), self.rng.randint(1, 15)))
+            elif kind == "undo":
+                self._timed("undo", state.undo)
+            elif kind == "compact":
+                self._timed("compact", lambda: storage.compact_ledger(self.compact_days))
+        self.clock.set(day + timedelta(days=1) - timedelta(microseconds=1))
+        self._timed("checkpoint", state.close)
+        self.days.append({"date": day.date().isoformat(), "ops": counts, "pending": len(state.tasks),
+                          "balance": round(state.balance, 2), "sizes": file_sizes(self.root)})
+
+    def run(self, days: int, log=print) -> dict:
+        self.open()
+        initial = file_sizes(self.root)
+        first = self.clock.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        t0 = time.perf_counter()
+        with clock.use(self.clock):
+            for n in range(days):
+                self.run_day(first + timedelta(days=n))
+                d = self.days[-1]
+                log(f"{d['date']}  pending {d['pending']:6d}  balance {d['balance']:12,.2f}  "
+                    f"files {d['sizes']['total'] / 1e6:8.2f} MB")
+            verify = storage.verify_ledger()
+        wall = time.perf_counter() - t0
+        return self.report(days, wall, initial, verify)
+
+    # ---------- Report ----------
+    def report(self, days: int, wall: float, initial: Dict[str, int], verify: dict) -> dict:
+        ops = {k: v for k, v in self.latency.items() if k not in ("open", "tick", "checkpoint")}
+        n_ops = sum(len(v) for v in ops.values())
+        latency = {}
+        for kind, ms in sorted(self.latency.items()):
+            ms = sorted(ms)
+            latency[kind] = {"count": len(ms), "rejected": self.rejected.get(kind, 0),
+                             "mean_ms": sum(ms) / len(ms), "max_ms": ms[-1],
+                             **{f"p{p}_ms": percentile(ms, p) for p in PERCENTILES}}
+        final = self.days[-1]["sizes"] if self.days else initial
+        growth = {name: {"start": initial.get(name, 0), "end": final[name],
+                         "per_day": (final[name] - initial.get(name, 0)) / max(1, days)}
+                  for name in final}
+        return {
+            "days": days,
+            "wall_s": wall,
+            "simulated_days_per_s": days / wall if wall else 0.0,
+            "ops": n_ops,
+            "ops_per_s": n_ops / wall if wall else 0.0,
+            "latency": latency,
+            "growth": growth,
+            "ledger_errors": len(verify.get("errors", [])),
+            "per_day": self.days,
+        }
+
+
+def print_report(rep: dict) -> None:
+    print(f"\n{rep['days']} days in {rep['wall_s']:.1f}s ({rep['simulated_days_per_s']:.1f} days/s), "
+          f"{rep['ops']:,} operations ({rep['ops_per_s']:,.0f} ops/s), "
+          f"ledger errors: {rep['ledger_errors']}")
+    print(f"\n{'operation':<12}{'count':>8}{'rejected':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, s in rep["latency"].items():
+        print(f"{kind:<12}{s['count']:>8}{s['rejected']:>10}{s['p50_ms']:>10.2f}{s['p90_ms']:>10.2f}"
+              f"{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+    print(f"\n{'file':<16}{'start KB':>12}{'end KB':>12}{'KB/day':>10}")
+    for name, g in rep["growth"].items():
+        print(f"{name:<16}{g['start'] / 1024:>12.1f}{g['end'] / 1024:>12.1f}{g['per_day'] / 1024:>10.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.simulate", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2026, 1, 5),
+                        help="first simulated day, YYYY-MM-DD (default: a Monday)")
+    parser.add_argument("--tasks-per-day", type=int, default=200)
+    parser.add_argument("--complete-rate", type=float, default=0.7, help="share of tasks completed")
+    parser.add_argument("--purchases-per-day", type=int, default=10)
+    parser.add_argument("--deletes-per-day", type=int, default=5)
+    parser.add_argument("--undos-per-day", type=int, default=2)
+    parser.add_argument("--templates", type=int, default=5, help="recurring templates")
+    parser.add_argument("--batch", type=int, default=1, help="tasks per add call")
+    parser.add_argument("--tick-minutes", type=int, default=60, help="simulated minutes between ticks")
+    parser.add_argument("--compact-days", type=int, help="compact the ledger to N days every Sunday")
+    parser.add_argument("--window", default="11:00-12:00", help="creation window START-END")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--data-dir", help="keep the simulated data directory here (must not exist)")
+    parser.add_argument("--out", help="write the report (with per-day figures) as JSON")
+    args = parser.parse_args(argv)
+
+    window = tuple(args.window.split("-", 1))
+    if len(window) != 2:
+        parser.error("--window takes START-END, e.g. 11:00-12:00")
+    tmp = None
+    if args.data_dir:
+        root = Path(args.data_dir)
+        if root.exists() and any(root.iterdir()):
+            parser.error(f"{root} is not empty")
+    else:
+        tmp = tempfile.TemporaryDirectory(prefix="todo_gamble_sim_")
+        root = Path(tmp.name)
+    try:
+        sim = Simulation(root, args.start, args.tasks_per_day, args.complete_rate,
+                         args.purchases_per_day, args.deletes_per_day, args.undos_per_day,
+                         args.templates, args.batch, args.tick_minutes, args.compact_days,
+                         window, args.seed)
+        rep = sim.run(args.days)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+    print_report(rep)
+    if args.out:
+        doc = {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "args": {k: str(v) for k, v in vars(args).items()}},
+               "report": rep}
+        Path(args.out).write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import storage  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A fresh data directory, active for the test."""
+    prev = storage.APP_DIR
+    storage.set_app_dir(tmp_path / "data")
+    storage.ensure_dirs()
+    yield storage.APP_DIR
+    storage.set_app_dir(prev)
+
+
+@pytest.fixture
+def ctx(tmp_path):
+    """A fresh data directory as a StorageContext, active for the test."""
+    c = storage.StorageContext(tmp_path / "data")
+    with storage.use(c):
+        storage.ensure_dirs()
+        yield c
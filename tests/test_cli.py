@@ -0,0 +1,14 @@
+import json
+from datetime import datetime, timedelta
+
+from app import cli, storage
+from app.models import Task
+
+
+def test_list_does_not_forfeit_overdue_tasks(data_dir, capsys):
+    due = (datetime.now() - timedelta(days=1)).astimezone().isoformat(timespec="minutes")
+    storage.save_tasks([Task.new("late", 5.0, 10.0, due)])
+    assert cli.main(["--data-dir", str(data_dir), "--json", "list"]) == cli.EXIT_OK
+    assert [t["description"] for t in json.loads(capsys.readouterr().out)] == ["late"]
+    assert [t.description for t in storage.load_tasks()] == ["late"]
+    assert not storage.LEDGER_PATH.exists() or storage.compute_balance() == 0.0
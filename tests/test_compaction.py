@@ -0,0 +1,79 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import cli, storage
+
+
+@pytest.fixture(params=["plain", "encrypted"])
+def ledger_dir(request, data_dir):
+    if request.param == "encrypted":
+        pytest.importorskip("cryptography")
+        from app import encryption
+        encryption.enable("correct horse")
+    return data_dir
+
+
+def _append(amounts):
+    storage.append_ledger_entries([{"type": "payout" if a > 0 else "purchase",
+                                    "description": f"t{i}", "amount": a}
+                                   for i, a in enumerate(amounts)])
+
+
+def _age(rows, days):
+    """Move the first `rows` ledger lines `days` into the past."""
+    path = storage.LEDGER_PATH
+    lines = path.read_text(encoding="utf-8").splitlines()
+    ts = (datetime.now(timezone.utc) - timedelta(days=days)).astimezone().isoformat()
+    for i in range(rows):
+        row = storage.parse_line(lines[i])
+        row["ts"] = ts
+        lines[i] = storage.dumps_line(row)
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _first_row():
+    with storage.LEDGER_PATH.open(encoding="utf-8") as f:
+        return storage.parse_line(f.readline())
+
+
+def test_compaction_keeps_the_balance(ledger_dir):
+    _append([10.0, -3.5, 7.25])
+    _age(3, 40)
+    _append([5.0, -1.0])
+    before = storage.compute_balance()
+    assert storage.compact_ledger(30) == 3
+    assert storage.compute_balance() == before == 17.75
+    assert _first_row()["type"] == "snapshot"
+    result = storage.verify_ledger()
+    assert result["errors"] == []
+    assert result["balance"] == before
+
+
+def test_repeated_compaction_carries_the_snapshot(ledger_dir):
+    _append([10.0, 2.0])
+    _age(2, 80)
+    _append([-4.0])
+    storage.compact_ledger(30)
+    _age(2, 40)  # the snapshot and -4.0
+    _append([1.5])
+    storage.compact_ledger(30)
+    assert storage.compute_balance() == 9.5
+    assert storage.verify_ledger()["errors"] == []
+    assert _first_row()["balance"] == 8.0
+
+
+def test_only_recent_rows(ledger_dir):
+    _append([1.0, 2.0])
+    storage.compact_ledger(30)
+    assert storage.compute_balance() == 3.0
+    assert storage.verify_ledger()["errors"] == []
+
+
+def test_cli_compact_then_verify(data_dir, capsys):
+    _append([10.0, -3.5])
+    _age(1, 40)
+    assert cli.main(["--data-dir", str(data_dir), "--json", "compact", "--days", "30"]) == cli.EXIT_OK
+    assert json.loads(capsys.readouterr().out) == {"lines": 2, "balance": 6.5}
+    assert cli.main(["--data-dir", str(data_dir), "verify"]) == cli.EXIT_OK
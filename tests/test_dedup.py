@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+
+from app import clock, storage
+from app.app_state import AppState
+
+
+@pytest.fixture
+def now(ctx):
+    with clock.use(clock.ManualClock(datetime(2026, 9, 15, 10, 0))) as c:  # a Tuesday
+        yield c
+
+
+def _open(ctx):
+    state = AppState(ctx)
+    state.set_window_times("00:00", "23:59")
+    return state
+
+
+def _ledger_types():
+    return [storage.parse_line(ln)["type"]
+            for ln in storage.LEDGER_PATH.read_text(encoding="utf-8").splitlines()]
+
+
+def test_stale_copies_forfeit_a_task_once(ctx, now):
+    a = _open(ctx)
+    a.add_task("gym", 5, 10)
+    b = _open(ctx)  # a second window on the same folder, with its own task list
+    now.advance(days=2)
+    a.forfeit_overdue()
+    b.forfeit_overdue()
+    assert _ledger_types() == ["forfeit"]
+    assert [r["event"] for r in storage.read_history()] == ["forfeited"]
+    assert storage.compute_balance() == -5.0
+
+
+def test_reverting_a_forfeit_twice_restores_once(ctx, now):
+    state = _open(ctx)
+    state.add_task("gym", 5, 10)
+    now.advance(days=2)
+    state.forfeit_overdue()
+    row = storage.read_history()[-1]
+    state.revert_forfeit(row)
+    state.revert_forfeit(dict(row))  # a double click, or a second window
+    assert _ledger_types() == ["forfeit", "revert_forfeit"]
+    assert [t.description for t in state.tasks] == ["gym"]
+    assert storage.compute_balance() == 0.0
+
+
+def test_retried_purchase_and_refund_are_recorded_once(ctx, now):
+    state = _open(ctx)
+    state.record_purchase("snack", 2, key="req-1")
+    state.record_purchase("snack", 2, key="req-1")
+    row = storage.read_history()[-1]
+    state.revert_purchase("snack", 2, source=row)
+    state.revert_purchase("snack", 2, source=row)
+    assert _ledger_types() == ["purchase", "refund"]
+    assert storage.compute_balance() == 0.0
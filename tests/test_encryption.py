@@ -0,0 +1,89 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from app import encryption, storage  # noqa: E402
+from app.app_state import AppState  # noqa: E402
+
+PASSPHRASE = "correct horse"
+
+
+@pytest.fixture
+def sealed(ctx):
+    """An encrypted data directory holding one task; returns its description."""
+    state = AppState(ctx)
+    state.set_window_times("00:00", "23:59")
+    state.add_task("gym", 5, 10)
+    state.close()
+    encryption.enable(PASSPHRASE)
+    return "gym"
+
+
+def _reopen(ctx):
+    """The tasks as a fresh process sees them: lock, unlock with the passphrase, read."""
+    ctx.cipher = None
+    ctx.drop_objects()
+    encryption.ensure_unlocked(ctx, ask=lambda: PASSPHRASE)
+    return [t.description for t in storage.load_tasks()]
+
+
+def test_data_is_sealed_and_readable(ctx, sealed):
+    assert ctx.tasks_path.read_text(encoding="utf-8").startswith(storage.SEALED_PREFIX)
+    assert (ctx.root / encryption.KEY_FILE).exists() and (ctx.root / encryption.KEY_BACKUP).exists()
+    assert _reopen(ctx) == [sealed]
+
+
+def test_backup_restores_the_key_file(ctx, sealed):
+    (ctx.root / encryption.KEY_FILE).unlink()
+    assert _reopen(ctx) == [sealed]
+    assert (ctx.root / encryption.KEY_FILE).exists()
+
+
+def test_missing_key_file_refuses_to_open(ctx, sealed):
+    (ctx.root / encryption.KEY_FILE).unlink()
+    (ctx.root / encryption.KEY_BACKUP).unlink()
+    with pytest.raises(encryption.KeyFileMissing):
+        _reopen(ctx)
+
+
+def test_wrong_passphrase(ctx, sealed):
+    ctx.cipher = None
+    with pytest.raises(encryption.LockedError):
+        encryption.unlock(ctx, "not the passphrase")
+
+
+def test_disable_leaves_plain_files(ctx, sealed):
+    encryption.disable(PASSPHRASE)
+    assert not (ctx.root / encryption.KEY_FILE).exists()
+    assert not ctx.tasks_path.read_text(encoding="utf-8").startswith(storage.SEALED_PREFIX)
+    ctx.cipher = None
+    assert not encryption.ensure_unlocked(ctx)
+    assert [t.description for t in storage.load_tasks()] == [sealed]
+
+
+def test_settings_edits_keep_the_key_file(ctx, sealed):
+    state = AppState(ctx)
+    state.update_settings({"sync_dir": "/tmp/x", "creation_window.start": "09:00"})
+    state.close()
+    assert _reopen(ctx) == [sealed]
+
+
+def test_corrupt_settings_then_update(ctx, sealed):
+    state = AppState(ctx)
+    ctx.settings_path.write_text('{"sync_dir": ', encoding="utf-8")
+    state.update_settings({"notifications.pre_end_minutes": 5})
+    state.close()
+    assert (ctx.root / "settings.json.bad").exists()
+    assert _reopen(ctx) == [sealed]
+
+
+def test_plain_directory_does_not_load_cryptography(tmp_path):
+    code = ("import sys; from app import cli; cli.main(['--data-dir', sys.argv[1], 'list']); "
+            "print('cryptography' in sys.modules)")
+    out = subprocess.run([sys.executable, "-c", code, str(tmp_path / "data")], capture_output=True,
+                         text=True, check=True, cwd=Path(__file__).resolve().parent.parent).stdout
+    assert out.splitlines()[-1] == "False"
@@ -0,0 +1,18 @@
+from datetime import datetime, timedelta
+
+from app import clock, storage
+from app.history_index import HistoryIndex
+
+
+def test_yesterday_excludes_today(data_dir):
+    start = datetime(2026, 9, 14, 12, 0)
+    with clock.use(clock.ManualClock(start)) as c:
+        for desc in ("monday gym", "tuesday gym", "wednesday gym"):
+            storage.append_history({"event": "completed", "description": desc})
+            c.advance(days=1)
+        idx = HistoryIndex()
+        idx.refresh()
+        today = (start + timedelta(days=2)).date()
+        assert [r["description"] for r in idx.search("gym yesterday", today=today)] == ["tuesday gym"]
+        assert [r["description"] for r in idx.search("gym today", today=today)] == ["wednesday gym"]
+        assert len(idx.search("gym last 2 days", today=today)) == 2
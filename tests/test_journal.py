@@ -0,0 +1,121 @@
+import contextvars
+import json
+import threading
+
+import pytest
+
+from app import dedup, journal, storage
+from app.models import Task
+
+
+def _buy(key, amount=2.0):
+    return {"type": "purchase", "description": "snack", "amount": -amount, "key": key}
+
+
+def _ledger_lines():
+    return storage.LEDGER_PATH.read_text(encoding="utf-8").splitlines()
+
+
+def _race(monkeypatch, path):
+    """Let another writer append to `path` right after the next intent record."""
+    append = journal._append_record
+
+    def racing(rec, sync):
+        out = append(rec, sync)
+        if not rec.get("commit"):
+            with path.open("a", encoding="utf-8") as f:
+                f.write('{"other": "writer"}\n')
+            monkeypatch.setattr(journal, "_append_record", append)
+        return out
+    monkeypatch.setattr(journal, "_append_record", racing)
+
+
+def test_commit_writes_and_records_keys(ctx):
+    journal.commit("purchase", [_buy("k1")], [], None)
+    journal.commit("purchase", [_buy("k1")], [], None)  # a retry
+    assert len(_ledger_lines()) == 1
+    assert dedup.index().seen(["k1"]) == {"k1"}
+
+
+def test_conflict_raises_and_records_no_keys(ctx, monkeypatch):
+    storage.save_tasks([Task.new("a", 1, 2, None)])
+    journal.commit("purchase", [_buy("k0")], [], None)
+    _race(monkeypatch, storage.LEDGER_PATH)
+    with pytest.raises(journal.JournalConflict):
+        journal.commit("purchase", [_buy("k1")], [], [])
+    assert dedup.index().seen(["k1"]) == set()
+    assert [t.description for t in storage.load_tasks()] == ["a"]
+    journal.commit("purchase", [_buy("k1")], [], None)  # the retry is not dropped
+    assert dedup.index().seen(["k1"]) == {"k1"}
+
+
+def test_shared_key_waits_for_both_files(ctx, monkeypatch):
+    journal.commit("history", [], [{"event": "note"}], None)
+    _race(monkeypatch, storage.HISTORY_PATH)
+    with pytest.raises(journal.JournalConflict):
+        journal.commit("forfeit", [_buy("t1:forfeit")], [{"event": "forfeited", "key": "t1:forfeit"}], None)
+    assert len(_ledger_lines()) == 1  # the ledger append landed
+    assert dedup.index().seen(["t1:forfeit"]) == set()
+
+
+def _crash_after_intent(monkeypatch, *args):
+    """commit() as if the process died once the intent record was fsynced."""
+    def crash(rec):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(journal, "_apply", crash)
+    with pytest.raises(KeyboardInterrupt):
+        journal.commit(*args)
+    monkeypatch.undo()
+
+
+def test_recover_applies_an_uncommitted_record(ctx, monkeypatch):
+    _crash_after_intent(monkeypatch, "purchase", [_buy("k1")], [{"event": "purchase", "key": "k1"}],
+                        [Task.new("kept", 1, 2, None)])
+    assert not storage.LEDGER_PATH.exists()
+    assert journal.recover() == {"replayed": 1, "incomplete": 1, "skipped": 0}
+    assert len(_ledger_lines()) == 1
+    assert [t.description for t in storage.load_tasks()] == ["kept"]
+    assert dedup.index().seen(["k1"]) == {"k1"}
+    assert not journal.journal_path().exists()
+
+
+def test_recover_finishes_a_torn_append(ctx, monkeypatch):
+    journal.commit("purchase", [_buy("k0")], [], None)
+    _crash_after_intent(monkeypatch, "purchase", [_buy("k1", 3.0)], [], None)
+    rec = json.loads(journal.journal_path().read_bytes().splitlines()[-1])
+    at, text = rec["ledger"]
+    with storage.LEDGER_PATH.open("ab") as f:
+        f.write(text.encode("utf-8")[:7])  # the crash cut the data write short
+    assert journal.recover()["skipped"] == 0
+    assert storage.compute_balance() == -5.0
+    assert storage.verify_ledger()["errors"] == []
+
+
+def test_recover_ignores_a_torn_intent_record(ctx, monkeypatch):
+    journal.commit("purchase", [_buy("k0")], [], None)
+    _crash_after_intent(monkeypatch, "purchase", [_buy("k1")], [], None)
+    path = journal.journal_path()
+    path.write_bytes(path.read_bytes()[:-20])  # the fsync never completed
+    assert journal.recover()["incomplete"] == 0
+    assert len(_ledger_lines()) == 1
+    assert dedup.index().seen(["k1"]) == set()
+
+
+def test_commit_waits_for_a_rewrite(ctx, monkeypatch):
+    journal.commit("purchase", [_buy("k0")], [], None)
+    checkpoint = journal.checkpoint
+    writers = []
+
+    def checkpoint_then_race():
+        checkpoint()
+        run = contextvars.copy_context().run
+        t = threading.Thread(target=run, args=(journal.commit, "purchase", [_buy("k1")], [], None))
+        t.start()
+        t.join(0.2)
+        writers.append(t)
+    monkeypatch.setattr(journal, "checkpoint", checkpoint_then_race)
+    storage.compact_ledger(30)
+    assert writers[0].is_alive()  # held off until the new ledger is in place
+    writers[0].join(5)
+    assert storage.compute_balance() == -4.0
+    assert storage.verify_ledger()["errors"] == []
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+
+from app import clock, storage
+from app.app_state import AppState
+
+
+@pytest.fixture
+def state(ctx):
+    with clock.use(clock.ManualClock(datetime(2026, 9, 15, 10, 0))):  # a Tuesday
+        s = AppState(ctx)
+        s.set_window_times("00:00", "23:59")
+        yield s
+        s.close()
+
+
+def _pending(state):
+    return [t.description for t in state.tasks]
+
+
+def test_undo_and_redo_a_completion(state):
+    task = state.add_task("gym", 5, 10)
+    state.complete_task(task.id)
+    assert (state.balance, _pending(state)) == (10.0, [])
+    assert state.undo() is not None
+    assert (state.balance, _pending(state)) == (0.0, ["gym"])
+    assert state.tasks[0].id == task.id
+    assert state.redo() is not None
+    assert (state.balance, _pending(state)) == (10.0, [])
+    assert storage.compute_balance() == 10.0
+
+
+def test_undo_walks_back_through_user_actions(state):
+    state.add_task("gym", 5, 10)
+    state.record_purchase("snack", 2)
+    state.undo()
+    assert state.balance == 0.0 and _pending(state) == ["gym"]
+    state.undo()
+    assert _pending(state) == []
+    assert state.undo() is None
+
+
+def test_a_new_action_ends_the_redo_chain(state):
+    state.record_purchase("snack", 2)
+    state.undo()
+    assert state.can_redo()
+    state.record_purchase("coffee", 3)
+    assert not state.can_redo()
+    assert state.redo() is None
+    assert state.balance == -3.0
+
+
+def test_revert_row_once(state):
+    state.record_purchase("snack", 2)
+    state.record_purchase("coffee", 3)
+    snack = next(r for r in storage.read_history() if r["description"] == "snack")
+    assert state.revert_row(snack)
+    assert state.balance == -3.0
+    with pytest.raises(ValueError):
+        state.revert_row(snack)
+    assert state.revert_row({"event": "purchase", "description": "old"}) is False
+    assert storage.verify_ledger()["errors"] == []
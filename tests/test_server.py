@@ -0,0 +1,61 @@
+import http.client
+import json
+import time
+
+import pytest
+
+from app.app_state import AppState
+from app.server import ApiServer, serve_in_thread
+
+
+@pytest.fixture
+def server(data_dir):
+    state = AppState()
+    srv = ApiServer(state, port=0)
+    serve_in_thread(srv)
+    deadline = time.monotonic() + 5
+    while srv._server is None:
+        assert time.monotonic() < deadline, "server did not start"
+        time.sleep(0.01)
+    yield srv
+    srv.stop()
+    state.close()
+
+
+def _call(srv, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", srv.port, timeout=5)
+    try:
+        data = json.dumps(body).encode() if body is not None else None
+        conn.request(method, path, body=data, headers=headers or {})
+        res = conn.getresponse()
+        return res.status, json.loads(res.read() or b"null")
+    finally:
+        conn.close()
+
+
+BUY = {"description": "Snack", "amount": 2}
+JSON = {"Content-Type": "application/json"}
+
+
+def test_write_needs_json_content_type(server):
+    assert _call(server, "POST", "/purchases", BUY)[0] == 415
+    assert _call(server, "POST", "/purchases", BUY, {"Content-Type": "text/plain"})[0] == 415
+    assert _call(server, "DELETE", "/tasks/nope")[0] == 415
+    assert _call(server, "DELETE", "/tasks/nope", headers=JSON)[0] == 404
+    assert _call(server, "POST", "/purchases", BUY, {"Content-Type": "application/json; charset=utf-8"}) \
+        == (201, {"balance": -2.0})
+
+
+def test_foreign_origin_is_refused(server):
+    evil = {**JSON, "Origin": "http://evil.example"}
+    assert _call(server, "POST", "/purchases", BUY, evil)[0] == 403
+    assert _call(server, "GET", "/tasks", headers={"Origin": "null"})[0] == 403
+    own = {**JSON, "Origin": f"http://localhost:{server.port}"}
+    assert _call(server, "POST", "/purchases", BUY, own)[0] == 201
+
+
+def test_unknown_host_is_refused(server):
+    # DNS rebinding: the browser sends the attacker's name as Host
+    assert _call(server, "GET", "/balance", headers={"Host": f"evil.example:{server.port}"})[0] == 403
+    assert _call(server, "GET", "/balance", headers={"Host": f"localhost:{server.port}"})[0] == 200
+    assert _call(server, "GET", "/tasks")[0] == 200
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from app import settings
+
+
+@pytest.fixture
+def store(ctx):
+    return settings.store(ctx)
+
+
+def _on_disk(store):
+    return json.loads(store.path.read_text(encoding="utf-8"))
+
+
+def test_defaults_are_written_once(store):
+    assert store.get() == settings.Settings()
+    assert _on_disk(store)["version"] == settings.SCHEMA_VERSION
+
+
+@pytest.mark.parametrize("name, value", [
+    ("creation_window.start", "25:00"),
+    ("notifications.pre_end_minutes", -5),
+    ("notifications.window_open", "yes"),
+    ("no_such_setting", 1),
+    ("no_such_section.key", 1),
+    ("version", 1),
+])
+def test_invalid_changes_save_nothing(store, name, value):
+    store.get()
+    before = store.path.read_bytes()
+    with pytest.raises(settings.SettingsError) as e:
+        store.update({name: value})
+    assert e.value.field == name
+    assert store.path.read_bytes() == before
+
+
+def test_bad_values_load_as_defaults(store):
+    store.path.write_text(json.dumps({"version": 2, "creation_window": {"start": "9:5", "end": "xx"}}),
+                          encoding="utf-8")
+    win = store.get().creation_window
+    assert (win.start, win.end) == ("09:05", settings.CreationWindow().end)
+    assert len(store.problems) == 1
+
+
+def test_v1_file_is_migrated_and_written_back(store):
+    store.path.write_text(json.dumps({"creation_window": {"start": "9:5", "end": "17:00"}}),
+                          encoding="utf-8")
+    assert store.get().creation_window.start == "09:05"
+    data = _on_disk(store)
+    assert data["version"] == settings.SCHEMA_VERSION
+    assert data["notifications"] == {"window_open": True, "pre_end_minutes": 10}
+
+
+def test_updates_keep_unknown_keys(store):
+    store.get()
+    data = _on_disk(store)
+    store.path.write_text(json.dumps({**data, "custom": {"a": 1}}), encoding="utf-8")
+    store.update({"sync_dir": "/tmp/sync"})
+    data = _on_disk(store)
+    assert data["custom"] == {"a": 1}
+    assert data["sync_dir"] == "/tmp/sync"
+
+
+def test_unreadable_file_keeps_the_last_settings(store, capsys):
+    store.update({"creation_window.start": "08:00", "sync_dir": "/tmp/sync"})
+    store.path.write_text('{"sync_dir": ', encoding="utf-8")
+    assert store.get().creation_window.start == "08:00"
+    assert store.problems and "unreadable" in capsys.readouterr().err
+
+    store.update({"notifications.pre_end_minutes": 5})
+    data = _on_disk(store)
+    assert data["sync_dir"] == "/tmp/sync"
+    assert data["notifications"]["pre_end_minutes"] == 5
+    assert store.path.with_name("settings.json.bad").read_text(encoding="utf-8") == '{"sync_dir": '
@@ -0,0 +1,24 @@
+import contextvars
+import threading
+
+from app import single_instance
+
+
+def test_reply_arrives_when_the_handler_stops_the_server(ctx):
+    server = single_instance.CommandServer()
+
+    def quit_(args):
+        # What App._quit_app does right after the handler returns
+        threading.Thread(target=contextvars.copy_context().run, args=(server.stop,)).start()
+        return None
+    server.register("quit", quit_)
+    assert server.start()
+    assert single_instance.send_command("quit") is None
+
+
+def test_main_reports_a_dropped_connection(ctx, monkeypatch, capsys):
+    def dropped(cmd, args):
+        raise ConnectionError("Connection closed mid-frame")
+    monkeypatch.setattr(single_instance, "send_command", dropped)
+    assert single_instance.main(["quit"]) == 1
+    assert "closed the connection" in capsys.readouterr().err
@@ -0,0 +1,156 @@
+import gzip
+import json
+import shutil
+
+import pytest
+
+from app import storage, sync
+from app.app_state import AppState
+
+
+@pytest.fixture
+def devices(tmp_path, monkeypatch):
+    """open(name) -> AppState on tmp_path/name; all closed at the end."""
+    monkeypatch.delenv(sync.SYNC_PASSPHRASE_ENV, raising=False)
+    monkeypatch.setattr(sync, "_ciphers", {})
+    opened = []
+
+    def open_(name):
+        state = AppState(storage.StorageContext(tmp_path / name))
+        state.set_window_times("00:00", "23:59")
+        opened.append(state)
+        return state
+    yield open_
+    for state in opened:
+        state.close()
+
+
+@pytest.fixture
+def share(tmp_path):
+    (tmp_path / "share").mkdir()
+    return tmp_path / "share"
+
+
+def _tasks(state):
+    return sorted(t.description for t in state.tasks)
+
+
+def _verified_balance(state):
+    with storage.use(state.ctx):
+        result = storage.verify_ledger()
+    assert result["errors"] == []
+    return result["balance"]
+
+
+def _copied(devices, a, tmp_path):
+    """Set up a second device the documented way: copy the data folder once."""
+    a.close()
+    shutil.copytree(tmp_path / "a", tmp_path / "b")
+    return devices("a"), devices("b")
+
+
+@pytest.mark.parametrize("target", ["share", "bundle.zip"])
+def test_two_devices_converge(devices, share, tmp_path, target):
+    path = share if target == "share" else tmp_path / target
+    a = devices("a")
+    gym, read = a.add_task("gym", 5, 10), a.add_task("read", 2, 4)
+    sync.sync(a, path)
+    a, b = _copied(devices, a, tmp_path)
+    a.complete_task(gym.id)
+    a.complete_task(read.id)
+    b.complete_task(gym.id)  # done on both: paid out once
+    b.add_task("code", 1, 3)
+    for state in (a, b, a, b):
+        assert sync.sync(state, path)["errors"] == []
+    assert _tasks(a) == _tasks(b) == ["code"]
+    assert a.balance == b.balance == _verified_balance(a) == _verified_balance(b)
+
+
+def test_resync_applies_nothing(devices, share):
+    a, b = devices("a"), devices("b")
+    sync.sync(a, share)  # exports start at a device's first sync
+    sync.sync(b, share)
+    a.add_task("gym", 5, 10)
+    sync.sync(a, share)
+    assert sync.sync(b, share)["applied"] == 1
+    assert sync.sync(b, share)["applied"] == 0
+    assert sync.sync(a, share)["applied"] == 0
+
+
+def test_damaged_segment_is_skipped_until_complete(devices, share):
+    a, b = devices("a"), devices("b")
+    sync.sync(a, share)
+    sync.sync(b, share)
+    a.add_task("gym", 5, 10)
+    sync.sync(a, share)
+    (seg,) = share.glob("*/*.seg.gz")
+    blob = seg.read_bytes()
+    seg.write_bytes(blob[:len(blob) // 2])  # still being copied
+    assert len(sync.sync(b, share)["errors"]) == 1
+    assert _tasks(b) == []
+    seg.write_bytes(blob)
+    assert sync.sync(b, share)["errors"] == []
+    assert _tasks(b) == ["gym"]
+
+
+def _enable(state, passphrase="data-passphrase"):
+    from app import encryption
+    with storage.use(state.ctx):
+        encryption.enable(passphrase)
+
+
+def test_encrypted_device_needs_a_sync_passphrase(devices, share):
+    pytest.importorskip("cryptography")
+    a, b = devices("a"), devices("b")
+    _enable(a)
+    sync.sync(b, share)
+    with pytest.raises(sync.SyncKeyNeeded):
+        sync.sync(a, share)
+    sync.sync(a, share, new_passphrase="sync-passphrase")
+    assert (share / sync.KEY_NAME).exists()
+    a.add_task("gym", 5, 10)
+    sync.sync(a, share)
+    with storage.use(a.ctx):
+        segments = list((share / sync.status()["device"]).glob("*.seg.gz"))
+    assert segments
+    assert all(b"gym" not in gzip.decompress(seg.read_bytes()) for seg in segments)
+
+    sync._ciphers.clear()  # b is another process
+    with pytest.raises(sync.SyncKeyError):
+        sync.sync(b, share)
+    with pytest.raises(sync.SyncKeyError):
+        sync.sync(b, share, ask=lambda: "wrong passphrase")
+    report = sync.sync(b, share, ask=lambda: "sync-passphrase")
+    assert report["errors"] == [] and report["applied"] == 1
+    assert _tasks(b) == ["gym"]
+
+    b.add_task("read", 2, 4)
+    sync.sync(b, share)
+    assert sync.sync(a, share)["errors"] == []
+    assert _tasks(a) == ["gym", "read"]
+
+
+def test_different_sync_passphrases_are_refused(devices, share, tmp_path):
+    pytest.importorskip("cryptography")
+    a, b = devices("a"), devices("b")
+    sync.sync(a, share, new_passphrase="sync-passphrase")
+    sync.sync(b, tmp_path / "other.zip", new_passphrase="another-passphrase")
+    with pytest.raises(sync.SyncKeyError):
+        sync.sync(b, share)
+
+
+def test_sealed_segment_without_a_key_id_is_damaged(devices, share):
+    pytest.importorskip("cryptography")
+    a = devices("a")
+    sync.sync(a, share, new_passphrase="sync-passphrase")
+    a.add_task("gym", 5, 10)
+    sync.sync(a, share)
+    with storage.use(a.ctx):
+        seg = next((share / sync.status()["device"]).glob("*.seg.gz"))
+    head, *rest = gzip.decompress(seg.read_bytes()).split(b"\n")
+    head = json.loads(head)
+    del head["key"]
+    raw = b"\n".join([json.dumps(head).encode(), *rest])
+    name = sync._segment_name(raw, head["first"], head["last"])
+    with pytest.raises(ValueError, match="sync key"):
+        sync.read_segment(name, gzip.compress(raw), next(iter(sync._ciphers.values())))
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from app import scan, storage
+
+
+def _write_ledger(amounts):
+    storage.append_ledger_entries([{"type": "payout", "description": f"t{i}", "amount": a}
+                                   for i, a in enumerate(amounts)])
+
+
+def _edit_line(no, **changes):
+    path = storage.current().ledger_path
+    lines = path.read_text(encoding="utf-8").splitlines()
+    row = json.loads(lines[no - 1])
+    row.update(changes)
+    lines[no - 1] = json.dumps(row)
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+@pytest.fixture(params=[1, 4], ids=["one-range", "split-ranges"])
+def workers(request, monkeypatch):
+    if request.param > 1:
+        monkeypatch.setattr(scan, "MIN_RANGE_BYTES", 64)  # several ranges, still in-process
+    return request.param
+
+
+def test_clean_ledger(ctx, workers):
+    _write_ledger([5.0] * 20)
+    result = storage.verify_ledger(workers)
+    assert result["errors"] == []
+    assert result["lines"] == 20
+    assert result["balance"] == 100.0
+
+
+@pytest.mark.parametrize("line", [1, 7, 20])
+def test_one_corrupted_balance_is_one_error(ctx, workers, line):
+    _write_ledger([5.0] * 20)
+    _edit_line(line, balance=999.0)
+    errors = storage.verify_ledger(workers)["errors"]
+    assert [e["line"] for e in errors] == [line]
+
+
+def test_one_corrupted_amount_is_one_error(ctx, workers):
+    _write_ledger([5.0] * 20)
+    _edit_line(9, amount=50.0)
+    errors = storage.verify_ledger(workers)["errors"]
+    assert [e["line"] for e in errors] == [9]